@@ -0,0 +1,57 @@
+#! /usr/bin/env python
+"""
+Protein-Ligand Interaction Profiler - Analyze and visualize protein-ligand interactions in PDB files.
+bench_blocks.py - Run time and peak memory of intra-chain analysis with and without blocks of residues.
+
+Usage: python benchmarks/bench_blocks.py [--pdb FILE] [--chain CHAIN] [--blocks N [N ...]]
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from plip.basic import config, logger  # noqa: E402
+from plip.structure.preparation import PDBComplex  # noqa: E402
+
+TEST_PDB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'plip', 'test', 'pdb', '4day.pdb')
+
+
+def characterize(pdb_complex, blocks):
+    """Characterizes the chain with the given number of residues per block, returns duration and peak memory."""
+    config.BLOCKS = blocks
+    tracemalloc.start()
+    start = time.perf_counter()
+    for ligand in pdb_complex.ligands:
+        pdb_complex.characterize_complex(ligand)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    interactions = sum(len(s.all_itypes) for s in pdb_complex.interaction_sets.values())
+    return seconds, peak, interactions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    parser.add_argument('--pdb', default=TEST_PDB, help='PDB file to analyze')
+    parser.add_argument('--chain', default='B', help='Chain to analyze in intra-chain mode')
+    parser.add_argument('--blocks', type=int, nargs='+', default=[1, 4, 16], help='Residues per block to compare')
+    arguments = parser.parse_args()
+
+    logger.get_logger().setLevel('ERROR')
+    config.NOFIXFILE = True
+    config.INTRA = arguments.chain
+    pdb_complex = PDBComplex()
+    pdb_complex.load_pdb(arguments.pdb)
+    print(f'{os.path.basename(arguments.pdb)} (chain {arguments.chain})')
+    for blocks in [None] + arguments.blocks:
+        seconds, peak, interactions = characterize(pdb_complex, blocks)
+        label = f'blocks of {blocks}' if blocks else 'all residues'
+        print(f'  {label}: {seconds:.2f} s, peak {peak / 2 ** 20:.1f} MiB, {interactions} interactions')
+
+
+if __name__ == '__main__':
+    main()
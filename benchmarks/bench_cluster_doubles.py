@@ -0,0 +1,69 @@
+#! /usr/bin/env python
+"""
+Protein-Ligand Interaction Profiler - Analyze and visualize protein-ligand interactions in PDB files.
+bench_cluster_doubles.py - Run time of clustering linked residues into k-mers on synthetic LINK records.
+
+Usage: python benchmarks/bench_cluster_doubles.py [--links N] [--repeat N]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from plip.basic.supplemental import cluster_doubles  # noqa: E402
+
+
+def residue(chain, position):
+    return 'NAG', chain, position
+
+
+def polymer(links):
+    """One long nucleotide-like chain, each residue linked to the next."""
+    return [[residue('A', i), residue('A', i + 1)] for i in range(links)]
+
+
+def glycans(links, size=8):
+    """Many small branched oligosaccharides, each residue linked to a random earlier one of its tree."""
+    doubles = []
+    for start in range(0, links, size - 1):
+        for i in range(1, size):
+            doubles.append([residue('B', start * size + random.randrange(i)), residue('B', start * size + i)])
+    return doubles[:links]
+
+
+def scattered(links):
+    """Links between random residues, listed in random order so that clusters are merged late."""
+    residues = links // 2
+    return [[residue('C', random.randrange(residues)), residue('C', random.randrange(residues))]
+            for _ in range(links)]
+
+
+INPUTS = [('polymer', polymer), ('glycans', glycans), ('scattered', scattered)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    parser.add_argument('--links', type=int, default=10000, help='Links (doubles) per input')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per input')
+    arguments = parser.parse_args()
+
+    random.seed(0)
+    print(f'cluster_doubles ({arguments.links} links, {arguments.repeat} runs)')
+    for label, generate in INPUTS:
+        doubles = generate(arguments.links)
+        times = []
+        for _ in range(arguments.repeat):
+            start = time.perf_counter()
+            clusters = list(cluster_doubles(doubles))
+            times.append(time.perf_counter() - start)
+        print(f'  {label}: {len(clusters)} clusters, min {min(times) * 1000:.1f} ms, '
+              f'median {statistics.median(times) * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
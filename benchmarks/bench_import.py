@@ -0,0 +1,84 @@
+#! /usr/bin/env python
+"""
+Protein-Ligand Interaction Profiler - Analyze and visualize protein-ligand interactions in PDB files.
+bench_import.py - Import time of PLIP's modules and start-up dominated wall time of the command line tool.
+
+Usage: python benchmarks/bench_import.py [--repeat N] [--top N]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PLIPCMD = os.path.join(ROOT, 'plip', 'plipcmd.py')
+SMALL_STRUCTURE = os.path.join(ROOT, 'plip', 'test', 'pdb', '1vsn.pdb')
+
+MODULES = ['plip.plipcmd', 'plip.basic.supplemental', 'plip.structure.preparation', 'plip.exchange.report',
+           'plip.exchange.webservices', 'plip.exchange.xml']
+
+COMMANDS = [('plip --help', [PLIPCMD, '--help']),
+            ('plip -f 1vsn.pdb -t -O', [PLIPCMD, '-f', SMALL_STRUCTURE, '-t', '-O', '-s'])]
+
+
+def environment():
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [ROOT, env.get('PYTHONPATH')]))
+    return env
+
+
+def importtime(module=None):
+    """Returns the cumulative import time of a module and of everything it imports in a fresh interpreter,
+    as list of (cumulative microseconds, module name), slowest first. Without a module, the imports
+    of the interpreter start-up are returned."""
+    code = f'import {module}' if module is not None else 'pass'
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], env=environment(),
+                            capture_output=True, text=True, check=True)
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times.append((int(cumulative), name.strip()))
+    return sorted(times, reverse=True)
+
+
+def walltime(command, repeat):
+    """Returns the wall times of running a command in a fresh interpreter (seconds)."""
+    times = []
+    with tempfile.TemporaryDirectory() as workdir:  # For files written next to the input (e.g. *_protonated.pdb)
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable] + command, env=environment(), cwd=workdir, stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL, check=True)
+            times.append(time.perf_counter() - start)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per command line')
+    parser.add_argument('--top', type=int, default=8, help='Slowest imports listed per module')
+    arguments = parser.parse_args()
+
+    startup = {name for _, name in importtime()}
+    print('Import time (cumulative, fresh interpreter)')
+    for module in MODULES:
+        times = [(cumulative, name) for cumulative, name in importtime(module) if name not in startup]
+        own = dict((name, cumulative) for cumulative, name in times)[module]
+        print(f'  {module}: {own / 1000:.1f} ms')
+        for cumulative, name in [entry for entry in times if entry[1] != module][:arguments.top]:
+            print(f'      {cumulative / 1000:8.1f} ms  {name}')
+
+    print(f'\nWall time ({arguments.repeat} runs)')
+    for label, command in COMMANDS:
+        times = walltime(command, arguments.repeat)
+        print(f'  {label}: min {min(times):.3f} s, median {statistics.median(times):.3f} s')
+
+
+if __name__ == '__main__':
+    main()
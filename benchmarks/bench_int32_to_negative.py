@@ -0,0 +1,100 @@
+#! /usr/bin/env python
+"""
+Protein-Ligand Interaction Profiler - Analyze and visualize protein-ligand interactions in PDB files.
+bench_int32_to_negative.py - Run time of converting residue numbers and its share of ligand extraction.
+
+Usage: python benchmarks/bench_int32_to_negative.py [--pdb FILE] [--calls N]
+"""
+
+import argparse
+import os
+import sys
+import time
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from plip.basic import config, instrumentation, logger  # noqa: E402
+from plip.basic.supplemental import int32_to_negative  # noqa: E402
+from plip.structure import preparation  # noqa: E402
+from plip.structure.preparation import PDBComplex  # noqa: E402
+
+# Polymer ligands with many members, here four DNA strands of 31 nucleotides
+TEST_PDB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'plip', 'test', 'pdb', '1tf6.pdb')
+
+
+def int32_to_negative_dict(int32):
+    """The former implementation, building a lookup table of 1000 numbers on every call."""
+    dct = {}
+    if int32 == 4294967295:
+        return -1
+    for i in range(-1000, -1):
+        dct[int(np.array(i).astype(np.uint32))] = i
+    if int32 in dct:
+        return dct[int32]
+    else:
+        return int32
+
+
+class StageTimes:
+    """Listener collecting the durations of the preparation stages."""
+
+    def __init__(self):
+        self.times = {}
+
+    def stage(self, name, seconds):
+        self.times[name] = self.times.get(name, 0) + seconds
+
+    def event(self, name):
+        pass
+
+    def observe(self, name, value):
+        pass
+
+
+def extraction(pdbfile, conversion):
+    """Loads the structure with the given conversion and returns the number of conversions, the time spent in
+    them and the duration of ligand detection (including extraction)."""
+    calls, spent = 0, 0.0
+
+    def counted(int32):
+        nonlocal calls, spent
+        start = time.perf_counter()
+        try:
+            return conversion(int32)
+        finally:
+            calls += 1
+            spent += time.perf_counter() - start
+
+    listener = StageTimes()
+    preparation.int32_to_negative = counted
+    instrumentation.set_listener(listener)
+    try:
+        PDBComplex().load_pdb(pdbfile)
+    finally:
+        instrumentation.set_listener(None)
+        preparation.int32_to_negative = int32_to_negative
+    return calls, spent, listener.times['ligand_detection']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    parser.add_argument('--pdb', default=TEST_PDB, help='PDB file to analyze')
+    parser.add_argument('--calls', type=int, default=10000, help='Conversions in the microbenchmark')
+    arguments = parser.parse_args()
+
+    logger.get_logger().setLevel('WARNING')
+    config.NOFIXFILE = True
+    numbers = [1, 201, 4294967295, 4294967196]  # Positive residue numbers and -1, -100 read as unsigned
+    for label, conversion in [('closed form', int32_to_negative), ('lookup table', int32_to_negative_dict)]:
+        seconds = timeit.timeit(lambda: [conversion(n) for n in numbers], number=arguments.calls // len(numbers))
+        calls, spent, detection = extraction(arguments.pdb, conversion)
+        print(f'{label}: {seconds / arguments.calls * 1e6:.2f} us per call; '
+              f'{os.path.basename(arguments.pdb)}: {calls} calls, {spent * 1000:.1f} ms '
+              f'of {detection * 1000:.1f} ms ligand detection')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+#! /usr/bin/env python
+"""
+Protein-Ligand Interaction Profiler - Analyze and visualize protein-ligand interactions in PDB files.
+bench_interfaces.py - Run time of the interface mode compared to separate runs for each pair of chains.
+
+Usage: python benchmarks/bench_interfaces.py [--pdb FILE]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from plip.basic import config, logger  # noqa: E402
+from plip.structure.preparation import PDBComplex  # noqa: E402
+
+TEST_PDB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'plip', 'test', 'pdb', '4day.pdb')
+
+
+def separate(pdbfile, chains):
+    """Runs as with one call of PLIP with --chains for each pair of chains, preparing the structure every time."""
+    for receptor in chains:
+        for ligand in chains[chains.index(receptor) + 1:]:
+            config.CHAINS = [[receptor], [ligand]]
+            pdb_complex = PDBComplex()
+            pdb_complex.load_pdb(pdbfile)
+            for lig in pdb_complex.ligands:
+                pdb_complex.characterize_complex(lig)
+    config.CHAINS = None
+    return len(chains) * (len(chains) - 1) // 2
+
+
+def interfaces(pdbfile, chains):
+    """Runs as with one call of PLIP with --interfaces, comparing the chains in blocks of residues."""
+    config.INTERFACES, config.BLOCKS = True, config.INTERFACE_BLOCKS
+    pdb_complex = PDBComplex()
+    pdb_complex.load_pdb(pdbfile)
+    pairs = pdb_complex.interfaces()
+    for receptor, ligand in pairs:
+        pdb_complex.characterize_interface(receptor, ligand)
+    config.INTERFACES, config.BLOCKS = False, None
+    return len(pairs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    parser.add_argument('--pdb', default=TEST_PDB, help='PDB file to analyze')
+    arguments = parser.parse_args()
+
+    logger.get_logger().setLevel('ERROR')
+    config.NOFIXFILE = True
+    config.NOPDBCANMAP = True
+    with open(arguments.pdb) as f:
+        chains = list(dict.fromkeys(line[21] for line in f if line.startswith('ATOM')))
+    print(f'{os.path.basename(arguments.pdb)} (chains {", ".join(chains)})')
+    for label, run in [('separate runs', separate), ('interfaces', interfaces)]:
+        start = time.perf_counter()
+        pairs = run(arguments.pdb, chains)
+        print(f'  {label}: {pairs} pair(s) of chains, {time.perf_counter() - start:.2f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+#! /usr/bin/env python
+"""
+Protein-Ligand Interaction Profiler - Analyze and visualize protein-ligand interactions in PDB files.
+bench_threshold_sweep.py - Run time of a threshold sweep compared to separate runs for each setting.
+
+Usage: python benchmarks/bench_threshold_sweep.py [--pdb FILE] [--settings N]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from plip.basic import config, logger  # noqa: E402
+from plip.structure.preparation import PDBComplex  # noqa: E402
+
+TEST_PDB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'plip', 'test', 'pdb', '1eve.pdb')
+
+
+def sweep_settings(n):
+    """Settings varying the hydrogen bond and hydrophobic contact distances around the standard values."""
+    return [{'HBOND_DIST_MAX': 3.5 + i / max(1, n - 1), 'HYDROPH_DIST_MAX': 3.5 + i / max(1, n - 1)} for i in range(n)]
+
+
+def separate(pdbfile, settings):
+    """Runs as with one call of PLIP for each setting, preparing the structure every time."""
+    for setting in settings:
+        current = {name: getattr(config, name) for name in setting}
+        for name, value in setting.items():
+            setattr(config, name, value)
+        pdb_complex = PDBComplex()
+        pdb_complex.load_pdb(pdbfile)
+        for ligand in pdb_complex.ligands:
+            pdb_complex.characterize_complex(ligand)
+        for name, value in current.items():
+            setattr(config, name, value)
+
+
+def sweep(pdbfile, settings):
+    pdb_complex = PDBComplex()
+    pdb_complex.load_pdb(pdbfile)
+    pdb_complex.sweep_thresholds(settings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    parser.add_argument('--pdb', default=TEST_PDB, help='PDB file to analyze')
+    parser.add_argument('--settings', type=int, default=5, help='Threshold settings in the sweep')
+    arguments = parser.parse_args()
+
+    logger.get_logger().setLevel('WARNING')
+    config.NOFIXFILE = True
+    settings = sweep_settings(arguments.settings)
+    print(f'{os.path.basename(arguments.pdb)} ({arguments.settings} settings)')
+    for label, run in [('separate runs', separate), ('sweep', sweep)]:
+        start = time.perf_counter()
+        run(arguments.pdb, settings)
+        print(f'  {label}: {time.perf_counter() - start:.2f} s')
+
+
+if __name__ == '__main__':
+    main()
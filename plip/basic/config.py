@@ -33,6 +33,19 @@ NOPDBCANMAP = False  # Skip calculation of mapping canonical atom order: PDB ato
 NOHYDRO = False  # Do not add hydrogen bonds (in case already present in the structure)
 MODEL = 1  # The model to be selected for multi-model structures (default = 1).
 CHAINS = None # Define chains for protein-protein interaction detection
+INTERFACES = False  # Detect the interactions at the interfaces of all pairs of chains in contact
+PDB_MIRROR = None  # Local PDB mirror directory (divided layout, e.g. <mirror>/vs/pdb1vsn.ent.gz)
+PDB_CACHE = None  # Directory for caching structures downloaded from the PDB
+PDB_CACHE_SIZE = 1000  # Maximum number of cached structures, least recently used entries are removed first
+PDB_TIMEOUT = 30  # Timeout in seconds for downloads from the PDB
+SNAPSHOT_CACHE = None  # Directory for caching read and protonated structures as binary snapshots, by hash of the input
+SNAPSHOT_CACHE_SIZE = 1000  # Maximum number of cached snapshots, least recently used entries are removed first
+PROTONATED = False  # Write the protonated structure to <name>_protonated.pdb in the output folder
+SNAPSHOT = False  # Save the prepared complex to <name>.plip.npz in the output folder
+SNAPSHOT_SUFFIX = '.plip.npz'  # Input files with this suffix are snapshots of prepared complexes
+SWEEP = None  # Threshold settings (dicts by config name) to analyze each structure with in one run
+BLOCKS = None  # Residues per block to compare chains as ligands (peptide and intra-chain mode) in bounded memory
+INTERFACE_BLOCKS = 2  # Residues per block to compare chains in interface mode, unless set as BLOCKS
 
 
 # Configuration file for Protein-Ligand Interaction Profiler (PLIP)
@@ -0,0 +1,73 @@
+"""
+Protein-Ligand Interaction Profiler - Analyze and visualize protein-ligand interactions in PDB files.
+instrumentation.py - Optional reporting of stage durations and events to a listener (e.g. a metrics collector).
+"""
+
+import time
+from contextlib import nullcontext
+from functools import wraps
+
+# Object with stage(name, seconds), event(name) and observe(name, value) methods, None if nothing is collected
+_listener = None
+_disabled = nullcontext()
+
+
+def set_listener(listener):
+    """Registers the listener receiving stage durations and events. None disables instrumentation."""
+    global _listener
+    _listener = listener
+
+
+class _Stage:
+    __slots__ = ('name', 'listener', 'start')
+
+    def __init__(self, name, listener):
+        self.name = name
+        self.listener = listener
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.listener.stage(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def stage(name):
+    """Context manager reporting the duration of a stage. Does nothing without a listener."""
+    listener = _listener
+    if listener is None:
+        return _disabled
+    return _Stage(name, listener)
+
+
+def timed(name):
+    """Decorator reporting the duration of each call of a function as stage."""
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            listener = _listener
+            if listener is None:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                listener.stage(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def event(name):
+    """Reports an event, e.g. a cache hit."""
+    listener = _listener
+    if listener is not None:
+        listener.event(name)
+
+
+def observe(name, value):
+    """Reports a measured value, e.g. the size of a structure."""
+    listener = _listener
+    if listener is not None:
+        listener.observe(name, value)
@@ -1,10 +1,17 @@
+import atexit
 import itertools
+import math
 import multiprocessing
 from builtins import zip
 from functools import partial
 
 from numpy import asarray
 
+from plip.basic import config
+
+# Pools reused by all parallel functions, created on first use (see get_pool)
+_pools = {}  # worker initializer -> (pool, number of processes)
+
 
 class SubProcessError(Exception):
     def __init__(self, e, exitcode=1):
@@ -14,23 +21,60 @@ class SubProcessError(Exception):
     pass
 
 
+def config_snapshot():
+    """Returns the current settings of the config module, to be applied in worker processes."""
+    return {name: value for name, value in vars(config).items() if name.isupper()}
+
+
 def universal_worker(input_pair):
-    """This is a wrapper function expecting a tiplet of function, single
-       argument, dict of keyword arguments. The provided function is called
-       with the appropriate arguments."""
-    function, arg, kwargs = input_pair
+    """This is a wrapper function expecting a quadruple of function, single
+       argument, dict of keyword arguments and config settings. The settings are
+       applied and the provided function is called with the appropriate arguments."""
+    function, arg, kwargs, settings = input_pair
+    for name, value in settings.items():
+        setattr(config, name, value)
     return function(arg, **kwargs)
 
 
 def pool_args(function, sequence, kwargs):
-    """Return a single iterator of n elements of lists of length 3, given a sequence of len n."""
-    return zip(itertools.repeat(function), sequence, itertools.repeat(kwargs))
+    """Return a single iterator of n elements of lists of length 4, given a sequence of len n."""
+    return zip(itertools.repeat(function), sequence, itertools.repeat(kwargs), itertools.repeat(config_snapshot()))
+
+
+def get_pool(processes, initializer=None):
+    """Returns a pool with at least the given number of processes, whose workers ran the given initializer
+    (e.g. to start PyMOL). Pools are kept alive and reused, so that worker processes are forked and
+    initialized once (with all modules of the parent already imported) instead of for every structure
+    in batch mode. Workers receive the current config with each job."""
+    pool, size = _pools.get(initializer, (None, 0))
+    if pool is None or size < processes:
+        shutdown_pool(initializer)
+        pool = multiprocessing.Pool(processes, initializer=initializer)
+        _pools[initializer] = (pool, processes)
+    return pool
+
 
+def shutdown_pool(initializer=None):
+    """Terminates the shared pool with the given initializer, if any."""
+    pool, _ = _pools.pop(initializer, (None, 0))
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+
+@atexit.register
+def shutdown_pools():
+    """Terminates all shared pools."""
+    for initializer in list(_pools):
+        shutdown_pool(initializer)
 
-def parallel_fn(f):
+
+def parallel_fn(f, initializer=None):
     """Simple wrapper function, returning a parallel version of the given function f.
        The function f must have one argument and may have an arbitray number of
-       keyword arguments. """
+       keyword arguments. The workers of the pool run the initializer (if given) once
+       when they are started. Consecutive elements of the sequence are processed by the
+       same worker, so that per-worker caches (e.g. the loaded structure) are reused."""
 
     def simple_parallel(func, sequence, **args):
         """ f takes an element of sequence as input and the keyword args in **args"""
@@ -40,12 +84,12 @@ def parallel_fn(f):
         else:
             processes = multiprocessing.cpu_count()
 
-        pool = multiprocessing.Pool(processes)  # depends on available cores
+        pool = get_pool(processes, initializer)  # depends on available cores
 
-        result = pool.map_async(universal_worker, pool_args(func, sequence, args))
-        pool.close()
-        pool.join()
-        cleaned = [x for x in result.get() if x is not None]  # getting results
+        sequence = list(sequence)
+        chunksize = max(1, math.ceil(len(sequence) / processes))
+        result = pool.map(universal_worker, pool_args(func, sequence, args), chunksize)
+        cleaned = [x for x in result if x is not None]  # getting results
         cleaned = asarray(cleaned)
         return cleaned
 
@@ -0,0 +1,36 @@
+"""
+Protein-Ligand Interaction Profiler - Analyze and visualize protein-ligand interactions in PDB files.
+preload.py - Imports and initializes PLIP's heavy dependencies once, for processes that fork warm workers.
+Importing this module has the side effect of running warm_up().
+"""
+
+from openbabel import pybel
+
+import lxml.etree  # noqa: F401
+import numpy  # noqa: F401
+
+from plip.exchange.report import StructureReport  # noqa: F401
+from plip.structure.preparation import PDBComplex  # noqa: F401
+
+# Minimal structure triggering the lazily loaded data of OpenBabel (e.g. the space group table read for CRYST1)
+WARM_UP_PDB = """\
+CRYST1   50.000   50.000   50.000  90.00  90.00  90.00 P 21 21 21    4
+ATOM      1  N   GLY A   1       0.000   0.000   0.000  1.00  0.00           N
+ATOM      2  CA  GLY A   1       1.458   0.000   0.000  1.00  0.00           C
+ATOM      3  C   GLY A   1       2.009   1.420   0.000  1.00  0.00           C
+ATOM      4  O   GLY A   1       1.251   2.390   0.000  1.00  0.00           O
+HETATM    5  O   HOH A   2       5.000   5.000   5.000  1.00  0.00           O
+END
+"""
+
+
+def warm_up():
+    """Reads and processes a tiny structure so that OpenBabel loads its data files before the first real one."""
+    pybel.ob.obErrorLog.StopLogging()
+    mol = pybel.readstring('pdb', WARM_UP_PDB)
+    mol.OBMol.PerceiveBondOrders()
+    mol.OBMol.AddPolarHydrogens()
+    mol.write('can')
+
+
+warm_up()
@@ -9,13 +9,13 @@ import zipfile
 from collections import namedtuple
 
 import numpy as np
-from openbabel import pybel
-from openbabel.pybel import Atom
 
 from plip.basic import config, logger
 
 logger = logger.get_logger()
 
+# OpenBabel is imported in the functions using it, so that the helpers are available without loading it
+
 def tmpfile(prefix, direc):
     """Returns the path to a newly created temporary file."""
     return tempfile.mktemp(prefix=prefix, suffix='.pdb', dir=direc)
@@ -39,19 +39,19 @@ def extract_pdbid(string):
 
 def whichrestype(atom):
     """Returns the residue name of an Pybel or OpenBabel atom."""
-    atom = atom if not isinstance(atom, Atom) else atom.OBAtom  # Convert to OpenBabel Atom
+    atom = getattr(atom, 'OBAtom', atom)  # Convert Pybel Atoms to OpenBabel Atoms
     return atom.GetResidue().GetName() if atom.GetResidue() is not None else None
 
 
 def whichresnumber(atom):
     """Returns the residue number of an Pybel or OpenBabel atom (numbering as in original PDB file)."""
-    atom = atom if not isinstance(atom, Atom) else atom.OBAtom  # Convert to OpenBabel Atom
+    atom = getattr(atom, 'OBAtom', atom)  # Convert Pybel Atoms to OpenBabel Atoms
     return atom.GetResidue().GetNum() if atom.GetResidue() is not None else None
 
 
 def whichchain(atom):
     """Returns the residue number of an PyBel or OpenBabel atom."""
-    atom = atom if not isinstance(atom, Atom) else atom.OBAtom  # Convert to OpenBabel Atom
+    atom = getattr(atom, 'OBAtom', atom)  # Convert Pybel Atoms to OpenBabel Atoms
     return atom.GetResidue().GetChain() if atom.GetResidue() is not None else None
 
 
@@ -139,45 +139,60 @@ def projection(pnormal1, ppoint, tpoint):
     return [c1 + c2 for c1, c2 in zip(tpoint, [sb * pn for pn in pnormal])]
 
 
+class UnionFind:
+    """Disjoint sets of hashable elements with path compression and union by size."""
+
+    def __init__(self):
+        self.parent = {}
+        self.size = {}
+
+    def __contains__(self, element):
+        return element in self.parent
+
+    def find(self, element):
+        """Returns the representative of the set containing the element, adding it as a new set if unknown."""
+        parent = self.parent
+        root = parent.get(element, parent)  # The dictionary itself marks unknown elements
+        if root is parent:
+            parent[element] = element
+            self.size[element] = 1
+            return element
+        up = parent[root]
+        while up != root:
+            root, up = up, parent[up]
+        while element != root:  # Path compression
+            parent[element], element = root, parent[element]
+        return root
+
+    def union(self, a, b):
+        """Merges the sets containing a and b and returns the representative of the merged set."""
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return root_a
+        if self.size[root_a] < self.size[root_b]:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.size[root_a] += self.size.pop(root_b)
+        return root_a
+
+    def groups(self):
+        """Returns a dictionary of representatives and the elements of their sets."""
+        groups = {}
+        for element in self.parent:
+            groups.setdefault(self.find(element), []).append(element)
+        return groups
+
+
 def cluster_doubles(double_list):
     """Given a list of doubles, they are clustered if they share one element
     :param double_list: list of doubles
-    :returns : list of clusters (tuples)
+    :returns : list of clusters (tuples), in the order of their first double
     """
-    location = {}  # hashtable of which cluster each element is in
-    clusters = []
-    # Go through each double
-    for t in double_list:
-        a, b = t[0], t[1]
-        # If they both are already in different clusters, merge the clusters
-        if a in location and b in location:
-            if location[a] != location[b]:
-                if location[a] < location[b]:
-                    clusters[location[a]] = clusters[location[a]].union(clusters[location[b]])  # Merge clusters
-                    clusters = clusters[:location[b]] + clusters[location[b] + 1:]
-                else:
-                    clusters[location[b]] = clusters[location[b]].union(clusters[location[a]])  # Merge clusters
-                    clusters = clusters[:location[a]] + clusters[location[a] + 1:]
-                # Rebuild index of locations for each element as they have changed now
-                location = {}
-                for i, cluster in enumerate(clusters):
-                    for c in cluster:
-                        location[c] = i
-        else:
-            # If a is already in a cluster, add b to that cluster
-            if a in location:
-                clusters[location[a]].add(b)
-                location[b] = location[a]
-            # If b is already in a cluster, add a to that cluster
-            if b in location:
-                clusters[location[b]].add(a)
-                location[a] = location[b]
-            # If neither a nor b is in any cluster, create a new one with a and b
-            if not (b in location and a in location):
-                clusters.append(set(t))
-                location[a] = len(clusters) - 1
-                location[b] = len(clusters) - 1
-    return map(tuple, clusters)
+    clusters = UnionFind()
+    for a, b in double_list:
+        clusters.union(a, b)
+    # Groups are listed in order of their first element, which is always from the first double of the cluster
+    return map(tuple, [set(members) for members in clusters.groups().values()])
 
 
 #################
@@ -203,6 +218,57 @@ def create_folder_if_not_exists(folder_path):
         os.makedirs(direc)
 
 
+class DirectoryCache:
+    """Directory of cache files named after their keys, with least-recently-used eviction. Entries are replaced
+    atomically, their modification time is refreshed on every hit (see touch) and used to determine the eviction
+    order. Subclasses set the suffix of the entries and read and write them."""
+
+    suffix = ''
+
+    def __init__(self, path, maxsize=1000):
+        self.path = path
+        self.maxsize = maxsize
+
+    def entry(self, key):
+        return os.path.join(self.path, key + self.suffix)
+
+    @staticmethod
+    def touch(path):
+        """Marks an entry as recently used."""
+        os.utime(path)
+
+    def write(self, key, writer):
+        """Adds an entry, written to a binary file by writer(f), and removes the least recently used entries if
+        the cache is full."""
+        os.makedirs(self.path, exist_ok=True)
+        # Write to a temporary file first so that concurrent readers never see partial entries
+        handle, tmppath = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                writer(f)
+            os.replace(tmppath, self.entry(key))
+        except BaseException:
+            os.remove(tmppath)
+            raise
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for filename in os.listdir(self.path):
+            if filename.endswith(self.suffix):
+                path = os.path.join(self.path, filename)
+                try:
+                    entries.append((os.path.getmtime(path), path))
+                except OSError:  # Removed by another process in the meantime
+                    continue
+        entries.sort()
+        for _, path in entries[:max(0, len(entries) - self.maxsize)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
 def cmd_exists(c):
     return subprocess.call("type " + c, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE) == 0
 
@@ -266,6 +332,7 @@ def nucleotide_linkage(residues):
 def ring_is_planar(ring, r_atoms):
     """Given a set of ring atoms, check if the ring is sufficiently planar
     to be considered aromatic"""
+    from openbabel import pybel
     normals = []
     for a in r_atoms:
         adj = pybel.ob.OBAtomAtomIter(a.OBAtom)
@@ -316,6 +383,7 @@ def sort_members_by_importance(members):
 
 def get_isomorphisms(reference, lig):
     """Get all isomorphisms of the ligand."""
+    from openbabel import pybel
     query = pybel.ob.CompileMoleculeQuery(reference.OBMol)
     mappr = pybel.ob.OBIsomorphismMapper.GetInstance(query)
     if all:
@@ -332,6 +400,7 @@ def get_isomorphisms(reference, lig):
 
 def canonicalize(lig, preserve_bond_order=False):
     """Get the canonical atom order for the ligand."""
+    from openbabel import pybel
     atomorder = None
     # Get canonical atom order
 
@@ -366,19 +435,14 @@ def int32_to_negative(int32):
     """Checks if a suspicious number (e.g. ligand position) is in fact a negative number represented as a
     32 bit integer and returns the actual number.
     """
-    dct = {}
-    if int32 == 4294967295:  # Special case in some structures (note, this is just a workaround)
-        return -1
-    for i in range(-1000, -1):
-        dct[int(np.array(i).astype(np.uint32))] = i
-    if int32 in dct:
-        return dct[int32]
-    else:
-        return int32
+    if 2 ** 31 <= int32 < 2 ** 32:  # Two's complement, e.g. 4294967295 is -1
+        return int32 - 2 ** 32
+    return int32
 
 
 def read_pdb(pdbfname, as_string=False):
     """Reads a given PDB file and returns a Pybel Molecule."""
+    from openbabel import pybel
     pybel.ob.obErrorLog.StopLogging()  # Suppress all OpenBabel warnings
     return readmol(pdbfname, as_string=as_string)
 
@@ -397,6 +461,7 @@ def read(fil):
 def readmol(path, as_string=False):
     """Reads the given molecule file and returns the corresponding Pybel molecule as well as the input file type.
     In contrast to the standard Pybel implementation, the file is closed properly."""
+    from openbabel import pybel
     supported_formats = ['pdb']
     # Fix for Windows-generated files: Remove carriage return characters
     if "\r" in path and as_string:
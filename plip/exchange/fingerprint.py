@@ -0,0 +1,159 @@
+"""
+Protein-Ligand Interaction Profiler - Analyze and visualize protein-ligand interactions in PDB files.
+fingerprint.py - Interaction fingerprints and a similarity index for comparing binding modes.
+"""
+
+import zlib
+
+import numpy as np
+
+from plip.exchange.xml import BSite
+
+# Interaction types as used in the fingerprints and their attribute names in PLInteraction and BSite
+INTERACTION_TYPES = ('hydrophobic', 'hbond', 'waterbridge', 'saltbridge', 'pistacking', 'pication', 'halogen',
+                     'metal')
+PLINTERACTION_ATTRIBUTES = {'hydrophobic': ['hydrophobic_contacts'], 'hbond': ['hbonds_ldon', 'hbonds_pdon'],
+                            'waterbridge': ['water_bridges'], 'saltbridge': ['saltbridge_lneg', 'saltbridge_pneg'],
+                            'pistacking': ['pistacking'], 'pication': ['pication_laro', 'pication_paro'],
+                            'halogen': ['halogen_bonds'], 'metal': ['metal_complexes']}
+BSITE_ATTRIBUTES = {'hydrophobic': ['hydrophobics'], 'hbond': ['hbonds'], 'waterbridge': ['wbridges'],
+                    'saltbridge': ['sbridges'], 'pistacking': ['pi_stacks'], 'pication': ['pi_cations'],
+                    'halogen': ['halogens'], 'metal': ['metal_complexes']}
+
+# Number of set bits for each possible byte value, used if numpy.bitwise_count is not available
+POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def interacting_residues(interactions):
+    """Yields (interaction type, residue number, chain) for all interactions in a PLInteraction or BSite object."""
+    attributes = BSITE_ATTRIBUTES if isinstance(interactions, BSite) else PLINTERACTION_ATTRIBUTES
+    for itype in INTERACTION_TYPES:
+        for attribute in attributes[itype]:
+            for interaction in getattr(interactions, attribute):
+                yield itype, int(interaction.resnr), interaction.reschain
+
+
+def popcount(packed):
+    """Counts the set bits in each row of a 2D array of packed bits (any unsigned integer type)."""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(packed).sum(axis=1, dtype=np.int64)
+    return POPCOUNT_TABLE[packed.view(np.uint8)].sum(axis=1, dtype=np.int64)
+
+
+class FingerprintEncoder:
+    """Encodes the interactions of a binding site as a fixed-length vector over residue x interaction type.
+
+    If a list of residues (residue number, chain) is given, e.g. all residues of a target's binding pocket,
+    each residue and interaction type gets its own position and the layout is
+    [res1_hydrophobic, res1_hbond, ..., res2_hydrophobic, ...]. Interactions with other residues are ignored.
+    Otherwise, residue/type combinations are hashed into nbits positions, which allows comparing complexes
+    without a common residue numbering at the cost of occasional collisions."""
+
+    def __init__(self, residues=None, nbits=2048):
+        if residues is not None:
+            self.positions = {(int(resnr), reschain, itype): i * len(INTERACTION_TYPES) + j
+                              for i, (resnr, reschain) in enumerate(residues)
+                              for j, itype in enumerate(INTERACTION_TYPES)}
+            self.nbits = len(self.positions)
+        else:
+            self.positions = None
+            self.nbits = nbits
+
+    def position(self, itype, resnr, reschain):
+        """Returns the vector position of an interaction type with a residue or None if it is not encoded."""
+        if self.positions is not None:
+            return self.positions.get((resnr, reschain, itype))
+        return zlib.crc32(('%s:%i:%s' % (itype, resnr, reschain)).encode()) % self.nbits
+
+    def counts(self, interactions):
+        """Returns the count fingerprint of a PLInteraction or BSite object."""
+        fingerprint = np.zeros(self.nbits, dtype=np.uint16)
+        for itype, resnr, reschain in interacting_residues(interactions):
+            position = self.position(itype, resnr, reschain)
+            if position is not None:
+                fingerprint[position] += 1
+        return fingerprint
+
+    def bits(self, interactions):
+        """Returns the bit fingerprint of a PLInteraction or BSite object as boolean array."""
+        return self.counts(interactions) > 0
+
+    def packed(self, interactions):
+        """Returns the bit fingerprint of a PLInteraction or BSite object packed into bytes."""
+        return np.packbits(self.bits(interactions))
+
+    def batch(self, interactions, packed=True):
+        """Encodes a sequence of PLInteraction or BSite objects into a 2D array with one fingerprint per row.
+        Rows are packed bit fingerprints by default and count fingerprints otherwise."""
+        fingerprints = np.zeros((len(interactions), self.nbits), dtype=np.uint16)
+        for row, interaction_set in enumerate(interactions):
+            fingerprints[row] = self.counts(interaction_set)
+        return np.packbits(fingerprints > 0, axis=1) if packed else fingerprints
+
+    def encode_complex(self, pdbcomplex):
+        """Returns the packed bit fingerprints of all binding sites in an analyzed PDBComplex, keyed by site."""
+        sites = sorted(pdbcomplex.interaction_sets)
+        fingerprints = self.batch([pdbcomplex.interaction_sets[site] for site in sites])
+        return dict(zip(sites, fingerprints))
+
+
+class SimilarityIndex:
+    """In-memory index of packed bit fingerprints for ranking by Tanimoto similarity.
+    Fingerprints are stored as rows of 64 bit words so that similarities are computed a word at a time."""
+
+    def __init__(self, nbits):
+        self.nbits = nbits
+        self.nbytes = (nbits + 7) // 8
+        self.nwords = (nbits + 63) // 64
+        self.keys = []
+        self.fingerprints = np.zeros((0, self.nwords), dtype=np.uint64)
+        self.bitcounts = np.zeros(0, dtype=np.int64)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def to_words(self, fingerprints):
+        """Converts packed fingerprints (2D uint8 array) to rows of 64 bit words."""
+        words = np.zeros((len(fingerprints), self.nwords * 8), dtype=np.uint8)
+        words[:, :self.nbytes] = fingerprints
+        return words.view(np.uint64)
+
+    def add(self, keys, fingerprints):
+        """Adds packed fingerprints (2D uint8 array, one row per key) to the index."""
+        fingerprints = np.atleast_2d(np.asarray(fingerprints, dtype=np.uint8))
+        if fingerprints.shape != (len(keys), self.nbytes):
+            raise ValueError('expected %i packed fingerprints of %i bytes' % (len(keys), self.nbytes))
+        needed = self.size + len(keys)
+        if needed > len(self.fingerprints):
+            # Grow the storage geometrically to keep repeated additions cheap
+            capacity = max(needed, 2 * len(self.fingerprints))
+            storage = np.zeros((capacity, self.nwords), dtype=np.uint64)
+            storage[:self.size] = self.fingerprints[:self.size]
+            self.fingerprints = storage
+            bitcounts = np.zeros(capacity, dtype=np.int64)
+            bitcounts[:self.size] = self.bitcounts[:self.size]
+            self.bitcounts = bitcounts
+        self.fingerprints[self.size:needed] = self.to_words(fingerprints)
+        self.bitcounts[self.size:needed] = popcount(self.fingerprints[self.size:needed])
+        self.keys.extend(keys)
+        self.size = needed
+
+    def similarities(self, query):
+        """Returns the Tanimoto similarities of a packed query fingerprint to all indexed fingerprints."""
+        query = self.to_words(np.asarray(query, dtype=np.uint8).reshape(1, self.nbytes))
+        common = popcount(self.fingerprints[:self.size] & query)
+        union = self.bitcounts[:self.size] + popcount(query)[0] - common
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(union > 0, common / union, 0.0)
+
+    def search(self, query, top=10, threshold=0.0):
+        """Ranks the indexed fingerprints by similarity to a packed query fingerprint.
+        Returns up to top (key, similarity) pairs with a similarity of at least threshold, most similar first."""
+        similarities = self.similarities(query)
+        top = min(top, self.size)
+        if top == 0:
+            return []
+        best = np.argpartition(-similarities, top - 1)[:top]
+        best = best[np.argsort(-similarities[best], kind='stable')]
+        return [(self.keys[i], float(similarities[i])) for i in best if similarities[i] >= threshold]
@@ -0,0 +1,194 @@
+"""
+Protein-Ligand Interaction Profiler - Analyze and visualize protein-ligand interactions in PDB files.
+index.py - SQLite index over a directory of PLIP XML reports.
+"""
+
+import argparse
+import os
+import sqlite3
+
+from lxml import etree
+
+from plip.basic import logger
+from plip.exchange.xml import iter_bsites
+
+logger = logger.get_logger()
+
+# Interaction types as named by BSite.get_counts, mapped to the BSite attribute holding the interactions
+INTERACTION_TYPES = {'hydrophobics': 'hydrophobics', 'hbonds': 'hbonds', 'wbridges': 'wbridges',
+                     'sbridges': 'sbridges', 'pistacks': 'pi_stacks', 'pications': 'pi_cations',
+                     'halogens': 'halogens', 'metal': 'metal_complexes'}
+COUNT_COLUMNS = ['hydrophobics', 'hbonds', 'wbridges', 'sbridges', 'pistacks', 'pications', 'halogens', 'metal',
+                 'hbond_back', 'hbond_nonback', 'total']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS bsites (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL REFERENCES files(path) ON DELETE CASCADE,
+    pdbid TEXT,
+    bsid TEXT,
+    hetid TEXT,
+    inchikey TEXT,
+    longname TEXT,
+    ligtype TEXT,
+    %s
+);
+CREATE TABLE IF NOT EXISTS interactions (
+    bsite INTEGER NOT NULL REFERENCES bsites(id) ON DELETE CASCADE,
+    type TEXT NOT NULL,
+    resnr INTEGER,
+    restype TEXT,
+    reschain TEXT
+);
+CREATE INDEX IF NOT EXISTS bsites_path ON bsites(path);
+CREATE INDEX IF NOT EXISTS bsites_pdbid ON bsites(pdbid);
+CREATE INDEX IF NOT EXISTS bsites_hetid ON bsites(hetid);
+CREATE INDEX IF NOT EXISTS bsites_inchikey ON bsites(inchikey);
+CREATE INDEX IF NOT EXISTS interactions_residue ON interactions(resnr, restype, reschain, type);
+CREATE INDEX IF NOT EXISTS interactions_bsite ON interactions(bsite);
+""" % ',\n    '.join('%s INTEGER' % column for column in COUNT_COLUMNS)
+
+
+class ReportIndex:
+    """Queryable SQLite index of the binding sites and interactions in a tree of PLIP XML reports.
+    Files are only parsed when they are new or have changed since they were last indexed."""
+
+    def __init__(self, dbpath):
+        self.dbpath = dbpath
+        self.connection = sqlite3.connect(dbpath)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute('PRAGMA foreign_keys = ON')
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @staticmethod
+    def find_reports(directory):
+        """Yields the paths of all XML reports below a directory."""
+        for root, _, files in os.walk(directory):
+            for filename in sorted(files):
+                if filename.endswith('.xml'):
+                    yield os.path.abspath(os.path.join(root, filename))
+
+    def update(self, directory):
+        """Incrementally (re-)indexes all reports below a directory.
+        New and modified files are parsed, files that disappeared are dropped from the index.
+        Each file is indexed in its own transaction, so malformed files are logged and skipped without losing the
+        others (and are parsed again with the next update).
+        Returns the number of added/updated and removed files."""
+        directory = os.path.abspath(directory)
+        known = {row['path']: (row['mtime'], row['size']) for row in
+                 self.connection.execute('SELECT path, mtime, size FROM files')}
+        seen = set()
+        updated = 0
+        for path in self.find_reports(directory):
+            seen.add(path)
+            stat = os.stat(path)
+            if known.get(path) == (stat.st_mtime, stat.st_size):
+                continue
+            try:
+                with self.connection:
+                    self.connection.execute('DELETE FROM files WHERE path = ?', (path,))
+                    self.connection.execute('INSERT INTO files (path, mtime, size) VALUES (?, ?, ?)',
+                                            (path, stat.st_mtime, stat.st_size))
+                    for bsite in iter_bsites(path):
+                        self.add_bsite(path, bsite)
+            except (etree.LxmlError, ValueError) as e:
+                logger.warning(f'skipping malformed report {path}: {e}')
+                continue
+            updated += 1
+        removed = [path for path in known if path not in seen and path.startswith(directory + os.sep)]
+        with self.connection:
+            self.connection.executemany('DELETE FROM files WHERE path = ?', [(path,) for path in removed])
+        return updated, len(removed)
+
+    def add_bsite(self, path, bsite):
+        """Stores a single BSite with its interactions."""
+        columns = ['path', 'pdbid', 'bsid', 'hetid', 'inchikey', 'longname', 'ligtype'] + COUNT_COLUMNS
+        values = [path, bsite.pdbid, bsite.bsid, bsite.hetid, bsite.inchikey, bsite.longname, bsite.ligtype]
+        values += [bsite.counts[column] for column in COUNT_COLUMNS]
+        cursor = self.connection.execute('INSERT INTO bsites (%s) VALUES (%s)' % (
+            ', '.join(columns), ', '.join('?' * len(columns))), values)
+        rows = [(cursor.lastrowid, itype, i.resnr, i.restype, i.reschain)
+                for itype, attribute in INTERACTION_TYPES.items() for i in getattr(bsite, attribute)]
+        self.connection.executemany('INSERT INTO interactions (bsite, type, resnr, restype, reschain) '
+                                    'VALUES (?, ?, ?, ?, ?)', rows)
+
+    def query(self, pdbid=None, bsid=None, hetid=None, inchikey=None, interaction=None, resnr=None, restype=None,
+              reschain=None, **min_counts):
+        """Returns the indexed binding sites matching all given criteria as a list of dictionaries.
+        Residue and interaction type criteria have to be fulfilled by the same interaction, e.g.
+        query(hetid='BEN', interaction='sbridges', restype='ASP', resnr=189) finds salt bridges to ASP189.
+        Additional keyword arguments like hbonds=2 set a minimum for the respective interaction count."""
+        if interaction is not None and interaction not in INTERACTION_TYPES:
+            raise ValueError('unknown interaction type: %s' % interaction)
+        for column in min_counts:
+            if column not in COUNT_COLUMNS:
+                raise ValueError('unknown interaction count: %s' % column)
+        conditions, parameters = [], []
+        for column, value in (('pdbid', pdbid), ('bsid', bsid), ('hetid', hetid), ('inchikey', inchikey)):
+            if value is not None:
+                conditions.append('b.%s = ?' % column)
+                parameters.append(value.upper() if column in ('pdbid', 'hetid') else value)
+        for column, value in sorted(min_counts.items()):
+            conditions.append('b.%s >= ?' % column)
+            parameters.append(value)
+        residue = [(column, value) for column, value in
+                   (('type', interaction), ('resnr', resnr), ('restype', restype), ('reschain', reschain))
+                   if value is not None]
+        if residue:
+            conditions.append('EXISTS (SELECT 1 FROM interactions i WHERE i.bsite = b.id AND %s)' % ' AND '.join(
+                'i.%s = ?' % column for column, _ in residue))
+            parameters += [value.upper() if column == 'restype' else value for column, value in residue]
+        sql = 'SELECT b.* FROM bsites b'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY b.pdbid, b.bsid'
+        return [{key: row[key] for key in row.keys() if key != 'id'}
+                for row in self.connection.execute(sql, parameters)]
+
+    def interactions(self, pdbid, bsid):
+        """Returns the indexed interactions of a binding site as (type, resnr, restype, reschain) tuples."""
+        return [tuple(row) for row in self.connection.execute(
+            'SELECT i.type, i.resnr, i.restype, i.reschain FROM interactions i JOIN bsites b ON i.bsite = b.id '
+            'WHERE b.pdbid = ? AND b.bsid = ? ORDER BY i.rowid', (pdbid.upper(), bsid))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Index a directory of PLIP XML reports and query the index.')
+    parser.add_argument('database', help='path of the SQLite index')
+    parser.add_argument('--update', metavar='DIR', help='(re-)index all XML reports below DIR')
+    parser.add_argument('--pdbid')
+    parser.add_argument('--bsid')
+    parser.add_argument('--hetid')
+    parser.add_argument('--inchikey')
+    parser.add_argument('--interaction', choices=sorted(INTERACTION_TYPES))
+    parser.add_argument('--resnr', type=int)
+    parser.add_argument('--restype')
+    parser.add_argument('--reschain')
+    arguments = parser.parse_args()
+    with ReportIndex(arguments.database) as index:
+        if arguments.update is not None:
+            updated, removed = index.update(arguments.update)
+            print('indexed %i file(s), removed %i file(s)' % (updated, removed))
+            return
+        for match in index.query(pdbid=arguments.pdbid, bsid=arguments.bsid, hetid=arguments.hetid,
+                                 inchikey=arguments.inchikey, interaction=arguments.interaction,
+                                 resnr=arguments.resnr, restype=arguments.restype, reschain=arguments.reschain):
+            print('\t'.join([match['pdbid'], match['bsid'], match['path']]))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,4 @@
+import sys
 import time
 from operator import itemgetter
 
@@ -11,12 +12,15 @@ from plip.structure.preparation import PDBComplex
 class StructureReport:
     """Creates reports (xml or txt) for one structure/"""
 
-    def __init__(self, mol: PDBComplex, outputprefix: str = 'report'):
+    def __init__(self, mol: PDBComplex, outputprefix: str = 'report', bindingsite_reports=None):
+        """Reports the interaction sets of the complex, or the given reports of binding sites (e.g. generated in
+        other processes, see BindingSiteReportData)."""
         self.mol = mol
         self.excluded = self.mol.excluded
         self.xmlreport = self.construct_xml_tree()
-        self.txtreport = self.construct_txt_file()
-        self.get_bindingsite_data()
+        self.txtheader = self.construct_txt_file()
+        self.bindingsite_reports = []
+        self.get_bindingsite_data(bindingsite_reports)
         self.outpath = mol.output_path
         self.outputprefix = outputprefix
 
@@ -76,20 +80,19 @@ class StructureReport:
         textlines.append(f'Analysis was done on model {config.MODEL}.\n')
         return textlines
 
-    def get_bindingsite_data(self):
+    def get_bindingsite_data(self, bindingsite_reports=None):
         """Get the additional data for the binding sites"""
-        for i, site in enumerate(sorted(self.mol.interaction_sets)):
-            s = self.mol.interaction_sets[site]
-            bindingsite = BindingSiteReport(s).generate_xml()
+        if bindingsite_reports is None:
+            bindingsite_reports = [BindingSiteReport(self.mol.interaction_sets[site])
+                                   for site in sorted(self.mol.interaction_sets)]
+        for i, bsreport in enumerate(bindingsite_reports):
+            self.bindingsite_reports.append(bsreport)
+            bindingsite = bsreport.generate_xml()
             bindingsite.set('id', str(i + 1))
             bindingsite.set('has_interactions', 'False')
             self.xmlreport.insert(i + 1, bindingsite)
-            for itype in BindingSiteReport(s).generate_txt():
-                self.txtreport.append(itype)
-            if not s.no_interactions:
+            if not bsreport.no_interactions:
                 bindingsite.set('has_interactions', 'True')
-            else:
-                self.txtreport.append('No interactions detected.')
 
     def write_xml(self, as_string=False):
         """Write the XML report"""
@@ -104,10 +107,17 @@ class StructureReport:
         """Write the TXT report"""
         if not as_string:
             with open('{}/{}.txt'.format(self.outpath, self.outputprefix), 'w') as f:
-                [f.write(textline + '\n') for textline in self.txtreport]
+                self.write_txt_stream(f)
         else:
-            output = '\n'.join(self.txtreport)
-            print(output)
+            self.write_txt_stream(sys.stdout)
+
+    def write_txt_stream(self, f):
+        """Write the TXT report section by section to an open text stream"""
+        f.writelines(textline + '\n' for textline in self.txtheader)
+        for bsreport in self.bindingsite_reports:
+            bsreport.write_txt(f)
+            if bsreport.no_interactions:
+                f.write('No interactions detected.\n')
 
 
 class BindingSiteReport:
@@ -132,6 +142,7 @@ class BindingSiteReport:
         self.pdbid = self.complex.pdbid.upper()
         self.lig_members = self.complex.lig_members
         self.interacting_chains = self.complex.interacting_chains
+        self.no_interactions = self.complex.no_interactions
 
         ############################
         # HYDROPHOBIC INTERACTIONS #
@@ -312,55 +323,36 @@ class BindingSiteReport:
     @staticmethod
     def rst_table(array):
         """Given an array, the function formats and returns and table in rST format."""
-        # Determine cell width for each column
-        cell_dict = {}
-        for i, row in enumerate(array):
-            for j, val in enumerate(row):
-                if j not in cell_dict:
-                    cell_dict[j] = []
-                cell_dict[j].append(val)
-        for item in cell_dict:
-            cell_dict[item] = max([len(x) for x in cell_dict[item]]) + 1  # Contains adapted width for each column
-
-        # Format top line
-        num_cols = len(array[0])
-        form = '+'
-        for col in range(num_cols):
-            form += (cell_dict[col] + 1) * '-'
-            form += '+'
-        form += '\n'
-
-        # Format values
+        return ''.join(BindingSiteReport.rst_table_lines(array))
+
+    @staticmethod
+    def rst_table_lines(array):
+        """Yields the lines of an rST table for the given array. Column widths are determined in one pass."""
+        widths = [max(len(val) for val in column) + 1 for column in zip(*array)]
+        separator = {sign: '+' + '+'.join((width + 1) * sign for width in widths) + '+\n' for sign in '-='}
+        yield separator['-']
         for i, row in enumerate(array):
-            form += '| '
-            for j, val in enumerate(row):
-                cell_width = cell_dict[j]
-                form += str(val) + (cell_width - len(val)) * ' ' + '| '
-            form.rstrip()
-            form += '\n'
-
-            # Seperation lines
-            form += '+'
-            if i == 0:
-                sign = '='
-            else:
-                sign = '-'
-            for col in range(num_cols):
-                form += (cell_dict[col] + 1) * sign
-                form += '+'
-            form += '\n'
-        return form
+            yield '| ' + ''.join(str(val).ljust(width) + '| ' for val, width in zip(row, widths)) + '\n'
+            yield separator['=' if i == 0 else '-']
 
     def generate_txt(self):
         """Generates an flat text report for a single binding site"""
+        return list(self.txt_lines())
+
+    def write_txt(self, f):
+        """Writes the flat text report for a single binding site to an open text stream"""
+        for textline in self.txt_lines():
+            f.write(textline)
+            f.write('\n')
 
-        txt = []
+    def txt_lines(self):
+        """Yields the lines of the flat text report for a single binding site. Tables are yielded as one block."""
         titletext = '%s (%s) - %s' % (self.bsid, self.longname, self.ligtype)
-        txt.append(titletext)
+        yield titletext
         for i, member in enumerate(self.lig_members[1:]):
-            txt.append('  + %s' % ":".join(str(element) for element in member))
-        txt.append("-" * len(titletext))
-        txt.append("Interacting chain(s): %s\n" % ','.join([chain for chain in self.interacting_chains]))
+            yield '  + %s' % ":".join(str(element) for element in member)
+        yield "-" * len(titletext)
+        yield "Interacting chain(s): %s\n" % ','.join([chain for chain in self.interacting_chains])
         for section in [['Hydrophobic Interactions', self.hydrophobic_features, self.hydrophobic_info],
                         ['Hydrogen Bonds', self.hbond_features, self.hbond_info],
                         ['Water Bridges', self.waterbridge_features, self.waterbridge_info],
@@ -374,7 +366,7 @@ class BindingSiteReport:
             interaction_information = sorted(interaction_information, key=itemgetter(0, 2, -2))
             if not len(interaction_information) == 0:
 
-                txt.append('\n**%s**' % iname)
+                yield '\n**%s**' % iname
                 table = [features, ]
                 for single_contact in interaction_information:
                     values = []
@@ -386,9 +378,8 @@ class BindingSiteReport:
                         else:
                             values.append(str(x))
                     table.append(values)
-                txt.append(self.rst_table(table))
-        txt.append('\n')
-        return txt
+                yield self.rst_table(table)
+        yield '\n'
 
     def generate_xml(self):
         """Generates an XML-formatted report for a single binding site"""
@@ -512,3 +503,28 @@ class BindingSiteReport:
             smiles_to_pdb.text = ''
 
         return report
+
+
+class BindingSiteReportData:
+    """Contains the generated XML and TXT reports of one binding site, e.g. to collect them from other processes
+    (see StructureReport). Can be pickled"""
+
+    def __init__(self, site, bsreport):
+        self.site = site
+        report = bsreport.generate_xml()
+        self.xml = et.tostring(report)
+        # Empty texts are written as <tag></tag>, but read as missing texts (<tag/>)
+        self.empty = [report.getroottree().getpath(element) for element in report.iter() if element.text == '']
+        self.txt = bsreport.generate_txt()
+        self.no_interactions = bsreport.no_interactions
+
+    def generate_xml(self):
+        report = et.fromstring(self.xml)
+        for path in self.empty:
+            report.getroottree().xpath(path)[0].text = ''
+        return report
+
+    def write_txt(self, f):
+        for textline in self.txt:
+            f.write(textline)
+            f.write('\n')
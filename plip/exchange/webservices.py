@@ -1,18 +1,32 @@
-import sys
-from urllib.error import HTTPError
-from urllib.request import urlopen
+import gzip
+import os
+import re
+from urllib.error import HTTPError, URLError
 
-import lxml.etree as et
-
-from plip.basic import logger
+from plip.basic import config, logger
+from plip.basic.instrumentation import event
+from plip.basic.supplemental import DirectoryCache
 
 logger = logger.get_logger()
 
 
+class PDBFetchError(Exception):
+    """Raised if a structure is not available from any of the configured sources."""
+    pass
+
+
+def is_pdbid(pdbid):
+    """Checks if a string is a PDB ID (four alphanumeric characters), e.g. before it is used in paths"""
+    return re.fullmatch('[0-9a-z]{4}', pdbid.lower()) is not None
+
+
 def check_pdb_status(pdbid):
     """Returns the status and up-to-date entry in the PDB for a given PDB ID"""
+    from urllib.request import urlopen
+
+    import lxml.etree as et
     url = 'http://www.rcsb.org/pdb/rest/idStatus?structureId=%s' % pdbid
-    xmlf = urlopen(url)
+    xmlf = urlopen(url, timeout=config.PDB_TIMEOUT)
     xml = et.parse(xmlf)
     xmlf.close()
     status = None
@@ -24,32 +38,119 @@ def check_pdb_status(pdbid):
     return [status, current_pdbid.lower()]
 
 
-def fetch_pdb(pdbid):
-    """Get the newest entry from the RCSB server for the given PDB ID. Exits with '1' if PDB ID is invalid."""
-    pdbid = pdbid.lower()
-    # logger.info(f'checking status of PDB-ID {pdbid}')
-    # @todo re-implement state check with ew RCSB API, see https://www.rcsb.org/news?year=2020&article=5eb18ccfd62245129947212a&feature=true
-    # state, current_entry = check_pdb_status(pdbid)  # Get state and current PDB ID
-    #
-    # if state == 'OBSOLETE':
-    #     logger.info(f'entry is obsolete, getting {current_entry} instead')
-    # elif state == 'CURRENT':
-    #     logger.info('entry is up-to-date')
-    # elif state == 'UNKNOWN':
-    #     logger.error('invalid PDB-ID (entry does not exist on PDB server)')
-    #     sys.exit(1)
-    logger.info('downloading file from PDB')
-    # get URL for current entry
-    # @todo needs update to react properly on response codes of RCSB servers
-    pdburl = f'https://files.rcsb.org/download/{pdbid}.pdb'
-    try:
-        pdbfile = urlopen(pdburl).read().decode()
+def read_structure(path):
+    """Reads a (gzip-compressed) structure file as text."""
+    if path.endswith('.gz'):
+        with gzip.open(path, 'rt') as f:
+            return f.read()
+    with open(path) as f:
+        return f.read()
+
+
+class LocalMirror:
+    """Structure source reading from a local copy of the PDB in the divided layout of the wwPDB archive,
+    i.e. <mirror>/vs/pdb1vsn.ent.gz. Uncompressed files and <pdbid>.pdb(.gz) file names are accepted as well."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def candidates(self, pdbid):
+        folder = os.path.join(self.path, pdbid[1:3])
+        for filename in ('pdb%s.ent.gz' % pdbid, '%s.pdb.gz' % pdbid, 'pdb%s.ent' % pdbid, '%s.pdb' % pdbid):
+            yield os.path.join(folder, filename)
+
+    def get(self, pdbid):
+        """Returns the structure as text or None if it is not part of the mirror."""
+        for path in self.candidates(pdbid):
+            if os.path.isfile(path):
+                logger.info(f'reading {pdbid} from local mirror')
+                event('pdb_mirror_hit')
+                return read_structure(path)
+        return None
+
+
+class DownloadCache(DirectoryCache):
+    """On-disk cache of structures with least-recently-used eviction (see DirectoryCache). Entries are stored
+    gzip-compressed."""
+
+    suffix = '.pdb.gz'
+
+    def get(self, pdbid):
+        """Returns the cached structure as text or None on a cache miss."""
+        path = self.entry(pdbid)
+        try:
+            pdbfile = read_structure(path)
+        except (OSError, EOFError):
+            event('pdb_cache_miss')
+            return None
+        event('pdb_cache_hit')
+        self.touch(path)
+        logger.info(f'reading {pdbid} from download cache')
+        return pdbfile
+
+    def put(self, pdbid, pdbfile):
+        """Adds a structure to the cache and removes the least recently used entries if the cache is full."""
+        def writer(f):
+            with gzip.GzipFile(fileobj=f, mode='wb') as g:
+                g.write(pdbfile.encode())
+        self.write(pdbid, writer)
+
+
+class RCSBDownload:
+    """Structure source downloading from the RCSB PDB."""
+
+    def __init__(self, timeout=30):
+        self.timeout = timeout
+
+    def get(self, pdbid):
+        """Returns the structure as text. Raises PDBFetchError if there is no file in PDB format."""
+        from urllib.request import urlopen  # Only needed (and loaded) for downloads
+        logger.info('downloading file from PDB')
+        event('pdb_download')
+        # @todo needs update to react properly on response codes of RCSB servers
+        pdburl = f'https://files.rcsb.org/download/{pdbid}.pdb'
+        try:
+            pdbfile = urlopen(pdburl, timeout=self.timeout).read().decode()
+        except HTTPError as e:
+            raise PDBFetchError(f'no file in PDB format available from wwPDB for the given PDB ID {pdbid}') from e
+        except (URLError, OSError) as e:
+            raise PDBFetchError(f'could not download {pdbid} from the PDB: {e}') from e
         # If no PDB file is available, a text is now shown with "We're sorry, but ..."
         # Could previously be distinguished by an HTTP error
         if 'sorry' in pdbfile:
-            logger.error('no file in PDB format available from wwPDB for the given PDB ID.')
-            sys.exit(1)
-    except HTTPError:
-        logger.error('no file in PDB format available from wwPDB for the given PDB ID')
-        sys.exit(1)
-    return [pdbfile, pdbid]
+            raise PDBFetchError(f'no file in PDB format available from wwPDB for the given PDB ID {pdbid}')
+        return pdbfile
+
+
+def structure_sources():
+    """Returns the structure sources as configured, in the order in which they are queried."""
+    sources = []
+    if config.PDB_MIRROR is not None:
+        sources.append(LocalMirror(config.PDB_MIRROR))
+    if config.PDB_CACHE is not None:
+        sources.append(DownloadCache(config.PDB_CACHE, config.PDB_CACHE_SIZE))
+    sources.append(RCSBDownload(config.PDB_TIMEOUT))
+    return sources
+
+
+def fetch_pdb(pdbid, sources=None):
+    """Get the newest entry for the given PDB ID from the first structure source that has it.
+    By default, a local mirror and the download cache are tried before the RCSB server (see structure_sources).
+    Structures found after a DownloadCache in the list of sources are added to that cache.
+    Raises PDBFetchError if the PDB ID is invalid or the structure is not available."""
+    pdbid = pdbid.lower()
+    if not is_pdbid(pdbid):
+        raise PDBFetchError(f'invalid PDB ID {pdbid!r}')
+    # @todo re-implement state check with ew RCSB API, see https://www.rcsb.org/news?year=2020&article=5eb18ccfd62245129947212a&feature=true
+    if sources is None:
+        sources = structure_sources()
+    caches = []
+    for source in sources:
+        pdbfile = source.get(pdbid)
+        if pdbfile is not None:
+            for cache in caches:
+                cache.put(pdbid, pdbfile)
+            return [pdbfile, pdbid]
+        if isinstance(source, DownloadCache):
+            caches.append(source)
+    raise PDBFetchError(f'structure {pdbid} is not available from any structure source')
@@ -1,3 +1,5 @@
+from collections.abc import Mapping
+
 from lxml import etree
 
 
@@ -10,8 +12,45 @@ class XMLStorage:
         found = tree.xpath('%s/text()' % location)
         if not found:
             return None
-        else:
-            data = found[0]
+        return XMLStorage.convert(found[0], force_string)
+
+    @staticmethod
+    def getchildren(tree):
+        """Maps the tags of all direct children of an element to the elements in a single pass.
+        The first child wins for repeated tags, as with the XPath queries in getdata."""
+        children = {}
+        for child in tree:
+            if child.tag not in children:
+                children[child.tag] = child
+        return children
+
+    @staticmethod
+    def getfield(children, tag, force_string=False):
+        """Gets XML data from a child element in a mapping created by getchildren and handles types."""
+        child = children.get(tag)
+        if child is None or not child.text:
+            return None
+        return XMLStorage.convert(child.text, force_string)
+
+    @staticmethod
+    def getfieldcoordinates(children, tag):
+        """Gets coordinates from a child element in a mapping created by getchildren"""
+        child = children.get(tag)
+        if child is None:
+            return tuple()
+        return tuple(float(coo.text) for coo in child if coo.text)
+
+    @staticmethod
+    def getfieldlist(children, tag):
+        """Gets a list of atom indices from a child element in a mapping created by getchildren"""
+        child = children.get(tag)
+        if child is None:
+            return []
+        return [int(idx.text) for idx in child.iterchildren('idx')]
+
+    @staticmethod
+    def convert(data, force_string=False):
+        """Converts the text of an element to bool, int or float where possible."""
         if force_string:
             return data
         if data == 'True':
@@ -37,140 +76,146 @@ class XMLStorage:
 class Interaction(XMLStorage):
     """Stores information on a specific interaction type"""
 
-    def __init__(self, interaction_part):
+    def __init__(self, interaction_part, fields=None):
         self.id = interaction_part.get('id')
-        self.resnr = self.getdata(interaction_part, 'resnr')
-        self.restype = self.getdata(interaction_part, 'restype', force_string=True)
-        self.reschain = self.getdata(interaction_part, 'reschain', force_string=True)
-        self.resnr_lig = self.getdata(interaction_part, 'resnr_lig')
-        self.restype_lig = self.getdata(interaction_part, 'restype_lig', force_string=True)
-        self.reschain_lig = self.getdata(interaction_part, 'reschain_lig', force_string=True)
-        self.ligcoo = self.getcoordinates(interaction_part, 'ligcoo')
-        self.protcoo = self.getcoordinates(interaction_part, 'protcoo')
+        if fields is None:
+            fields = self.getchildren(interaction_part)
+        self.resnr = self.getfield(fields, 'resnr')
+        self.restype = self.getfield(fields, 'restype', force_string=True)
+        self.reschain = self.getfield(fields, 'reschain', force_string=True)
+        self.resnr_lig = self.getfield(fields, 'resnr_lig')
+        self.restype_lig = self.getfield(fields, 'restype_lig', force_string=True)
+        self.reschain_lig = self.getfield(fields, 'reschain_lig', force_string=True)
+        self.ligcoo = self.getfieldcoordinates(fields, 'ligcoo')
+        self.protcoo = self.getfieldcoordinates(fields, 'protcoo')
 
 
 class HydrophobicInteraction(Interaction):
     """Stores information on a hydrophobic interaction"""
 
     def __init__(self, hydrophobic_part):
-        Interaction.__init__(self, hydrophobic_part)
-        self.dist = self.getdata(hydrophobic_part, 'dist')
-        self.ligcarbonidx = self.getdata(hydrophobic_part, 'ligcarbonidx')
-        self.protcarbonidx = self.getdata(hydrophobic_part, 'protcarbonidx')
+        fields = self.getchildren(hydrophobic_part)
+        Interaction.__init__(self, hydrophobic_part, fields)
+        self.dist = self.getfield(fields, 'dist')
+        self.ligcarbonidx = self.getfield(fields, 'ligcarbonidx')
+        self.protcarbonidx = self.getfield(fields, 'protcarbonidx')
 
 
 class HydrogenBond(Interaction):
     """Stores information on a hydrogen bond interaction"""
 
     def __init__(self, hbond_part):
-        Interaction.__init__(self, hbond_part)
-        self.sidechain = self.getdata(hbond_part, 'sidechain')
-        self.dist_h_a = self.getdata(hbond_part, 'dist_h-a')
-        self.dist_d_a = self.getdata(hbond_part, 'dist_d-a')
+        fields = self.getchildren(hbond_part)
+        Interaction.__init__(self, hbond_part, fields)
+        self.sidechain = self.getfield(fields, 'sidechain')
+        self.dist_h_a = self.getfield(fields, 'dist_h-a')
+        self.dist_d_a = self.getfield(fields, 'dist_d-a')
         self.dist = self.dist_d_a
 
-        self.don_angle = self.getdata(hbond_part, 'don_angle')
-        self.protisdon = self.getdata(hbond_part, 'protisdon')
-        self.donoridx = self.getdata(hbond_part, 'donoridx')
-        self.acceptoridx = self.getdata(hbond_part, 'acceptoridx')
-        self.donortype = self.getdata(hbond_part, 'donortype', force_string=True)
-        self.acceptortype = self.getdata(hbond_part, 'acceptortype', force_string=True)
+        self.don_angle = self.getfield(fields, 'don_angle')
+        self.protisdon = self.getfield(fields, 'protisdon')
+        self.donoridx = self.getfield(fields, 'donoridx')
+        self.acceptoridx = self.getfield(fields, 'acceptoridx')
+        self.donortype = self.getfield(fields, 'donortype', force_string=True)
+        self.acceptortype = self.getfield(fields, 'acceptortype', force_string=True)
 
 
 class WaterBridge(Interaction):
     """Stores information on a water bridge interaction"""
 
     def __init__(self, wbridge_part):
-        Interaction.__init__(self, wbridge_part)
-        self.dist_a_w = self.getdata(wbridge_part, 'dist_a-w')
-        self.dist_d_w = self.getdata(wbridge_part, 'dist_d-w')
-        self.don_angle = self.getdata(wbridge_part, 'don_angle')
-        self.water_angle = self.getdata(wbridge_part, 'water_angle')
-        self.protisdon = self.getdata(wbridge_part, 'protisdon')
+        fields = self.getchildren(wbridge_part)
+        Interaction.__init__(self, wbridge_part, fields)
+        self.dist_a_w = self.getfield(fields, 'dist_a-w')
+        self.dist_d_w = self.getfield(fields, 'dist_d-w')
+        self.don_angle = self.getfield(fields, 'don_angle')
+        self.water_angle = self.getfield(fields, 'water_angle')
+        self.protisdon = self.getfield(fields, 'protisdon')
         self.dist = self.dist_a_w if self.protisdon else self.dist_d_w
 
-        self.donor_idx = self.getdata(wbridge_part, 'donor_idx')
-        self.acceptor_idx = self.getdata(wbridge_part, 'acceptor_idx')
-        self.donortype = self.getdata(wbridge_part, 'donortype', force_string=True)
-        self.acceptortype = self.getdata(wbridge_part, 'acceptortype', force_string=True)
-        self.water_idx = self.getdata(wbridge_part, 'water_idx')
-        self.watercoo = self.getcoordinates(wbridge_part, 'watercoo')
+        self.donor_idx = self.getfield(fields, 'donor_idx')
+        self.acceptor_idx = self.getfield(fields, 'acceptor_idx')
+        self.donortype = self.getfield(fields, 'donortype', force_string=True)
+        self.acceptortype = self.getfield(fields, 'acceptortype', force_string=True)
+        self.water_idx = self.getfield(fields, 'water_idx')
+        self.watercoo = self.getfieldcoordinates(fields, 'watercoo')
 
 
 class SaltBridge(Interaction):
     """Stores information on a salt bridge interaction"""
 
     def __init__(self, sbridge_part):
-        Interaction.__init__(self, sbridge_part)
-        self.dist = self.getdata(sbridge_part, 'dist')
-        self.protispos = self.getdata(sbridge_part, 'protispos')
-        self.lig_group = self.getdata(sbridge_part, 'lig_group', force_string=True)
-        self.lig_idx_list = [int(tagpart.text) for tagpart in
-                             sbridge_part.xpath('lig_idx_list/idx')]
-        self.prot_idx_list = [int(tagpart.text) for tagpart in
-                              sbridge_part.xpath('prot_idx_list/idx')]
+        fields = self.getchildren(sbridge_part)
+        Interaction.__init__(self, sbridge_part, fields)
+        self.dist = self.getfield(fields, 'dist')
+        self.protispos = self.getfield(fields, 'protispos')
+        self.lig_group = self.getfield(fields, 'lig_group', force_string=True)
+        self.lig_idx_list = self.getfieldlist(fields, 'lig_idx_list')
+        self.prot_idx_list = self.getfieldlist(fields, 'prot_idx_list')
 
 
 class PiStacking(Interaction):
     """Stores information on a pi stacking interaction"""
 
     def __init__(self, pistack_part):
-        Interaction.__init__(self, pistack_part)
-        self.centdist = self.getdata(pistack_part, 'centdist')
+        fields = self.getchildren(pistack_part)
+        Interaction.__init__(self, pistack_part, fields)
+        self.centdist = self.getfield(fields, 'centdist')
         self.dist = self.centdist
-        self.angle = self.getdata(pistack_part, 'angle')
-        self.offset = self.getdata(pistack_part, 'offset')
-        self.type = self.getdata(pistack_part, 'type')
-        self.lig_idx_list = [int(tagpart.text) for tagpart in
-                             pistack_part.xpath('lig_idx_list/idx')]
-        self.prot_idx_list = [int(tagpart.text) for tagpart in
-                              pistack_part.xpath('prot_idx_list/idx')]
+        self.angle = self.getfield(fields, 'angle')
+        self.offset = self.getfield(fields, 'offset')
+        self.type = self.getfield(fields, 'type')
+        self.lig_idx_list = self.getfieldlist(fields, 'lig_idx_list')
+        self.prot_idx_list = self.getfieldlist(fields, 'prot_idx_list')
 
 
 class PiCation(Interaction):
     """Stores information on a pi cation interaction"""
 
     def __init__(self, pication_part):
-        Interaction.__init__(self, pication_part)
-        self.dist = self.getdata(pication_part, 'dist')
-        self.offset = self.getdata(pication_part, 'offset')
-        self.protcharged = self.getdata(pication_part, 'protcharged')
-        self.lig_group = self.getdata(pication_part, 'lig_group')
-        self.lig_idx_list = [int(tag.text) for tag in pication_part.xpath('.//lig_idx_list/idx')]
+        fields = self.getchildren(pication_part)
+        Interaction.__init__(self, pication_part, fields)
+        self.dist = self.getfield(fields, 'dist')
+        self.offset = self.getfield(fields, 'offset')
+        self.protcharged = self.getfield(fields, 'protcharged')
+        self.lig_group = self.getfield(fields, 'lig_group')
+        self.lig_idx_list = self.getfieldlist(fields, 'lig_idx_list')
 
 
 class HalogenBond(Interaction):
     """Stores information on a halogen bond interaction"""
 
     def __init__(self, halogen_part):
-        Interaction.__init__(self, halogen_part)
-        self.dist = self.getdata(halogen_part, 'dist')
-        self.don_angle = self.getdata(halogen_part, 'don_angle')
-        self.acc_angle = self.getdata(halogen_part, 'acc_angle')
-        self.donortype = self.getdata(halogen_part, 'donortype', force_string=True)
-        self.acceptortype = self.getdata(halogen_part, 'acceptortype', force_string=True)
-        self.don_idx = self.getdata(halogen_part, 'don_idx')
-        self.acc_idx = self.getdata(halogen_part, 'acc_idx')
-        self.sidechain = self.getdata(halogen_part, 'sidechain')
+        fields = self.getchildren(halogen_part)
+        Interaction.__init__(self, halogen_part, fields)
+        self.dist = self.getfield(fields, 'dist')
+        self.don_angle = self.getfield(fields, 'don_angle')
+        self.acc_angle = self.getfield(fields, 'acc_angle')
+        self.donortype = self.getfield(fields, 'donortype', force_string=True)
+        self.acceptortype = self.getfield(fields, 'acceptortype', force_string=True)
+        self.don_idx = self.getfield(fields, 'don_idx')
+        self.acc_idx = self.getfield(fields, 'acc_idx')
+        self.sidechain = self.getfield(fields, 'sidechain')
 
 
 class MetalComplex(Interaction):
     """Stores information on a metal complexe interaction"""
 
     def __init__(self, metalcomplex_part):
-        Interaction.__init__(self, metalcomplex_part)
-        self.metal_idx = self.getdata(metalcomplex_part, 'metal_idx')
-        self.metal_type = self.getdata(metalcomplex_part, 'metal_type', force_string=True)
-        self.target_idx = self.getdata(metalcomplex_part, 'target_idx')
-        self.target_type = self.getdata(metalcomplex_part, 'target_type', force_string=True)
-        self.coordination = self.getdata(metalcomplex_part, 'coordination')
-        self.dist = self.getdata(metalcomplex_part, 'dist')
-        self.location = self.getdata(metalcomplex_part, 'location', force_string=True)
-        self.rms = self.getdata(metalcomplex_part, 'rms')
-        self.geometry = self.getdata(metalcomplex_part, 'geometry', force_string=True)
-        self.complexnum = self.getdata(metalcomplex_part, 'complexnum')
-        self.targetcoo = self.getcoordinates(metalcomplex_part, 'targetcoo')
-        self.metalcoo = self.getcoordinates(metalcomplex_part, 'metalcoo')
+        fields = self.getchildren(metalcomplex_part)
+        Interaction.__init__(self, metalcomplex_part, fields)
+        self.metal_idx = self.getfield(fields, 'metal_idx')
+        self.metal_type = self.getfield(fields, 'metal_type', force_string=True)
+        self.target_idx = self.getfield(fields, 'target_idx')
+        self.target_type = self.getfield(fields, 'target_type', force_string=True)
+        self.coordination = self.getfield(fields, 'coordination')
+        self.dist = self.getfield(fields, 'dist')
+        self.location = self.getfield(fields, 'location', force_string=True)
+        self.rms = self.getfield(fields, 'rms')
+        self.geometry = self.getfield(fields, 'geometry', force_string=True)
+        self.complexnum = self.getfield(fields, 'complexnum')
+        self.targetcoo = self.getfieldcoordinates(fields, 'targetcoo')
+        self.metalcoo = self.getfieldcoordinates(fields, 'metalcoo')
 
 
 class BSite(XMLStorage):
@@ -179,39 +224,42 @@ class BSite(XMLStorage):
     def __init__(self, bindingsite, pdbid):
         self.bindingsite = bindingsite
         self.pdbid = pdbid
-        self.bsid = ":".join(bindingsite.xpath('identifiers/*/text()')[2:5])
+        self.bsid = self.get_bsid(bindingsite)
         self.uniqueid = ":".join([self.pdbid, self.bsid])
-        self.hetid = self.getdata(bindingsite, 'identifiers/hetid', force_string=True)
-        self.longname = self.getdata(bindingsite, 'identifiers/longname', force_string=True)
-        self.ligtype = self.getdata(bindingsite, 'identifiers/ligtype', force_string=True)
-        self.smiles = self.getdata(bindingsite, 'identifiers/smiles', force_string=True)
-        self.inchikey = self.getdata(bindingsite, 'identifiers/inchikey', force_string=True)
-        self.position = self.getdata(bindingsite, 'identifiers/position')
-        self.chain = self.getdata(bindingsite, 'identifiers/chain', force_string=True)
+        sections = self.getchildren(bindingsite)
+        identifiers = self.getchildren(sections['identifiers'])
+        self.hetid = self.getfield(identifiers, 'hetid', force_string=True)
+        self.longname = self.getfield(identifiers, 'longname', force_string=True)
+        self.ligtype = self.getfield(identifiers, 'ligtype', force_string=True)
+        self.smiles = self.getfield(identifiers, 'smiles', force_string=True)
+        self.inchikey = self.getfield(identifiers, 'inchikey', force_string=True)
+        self.position = self.getfield(identifiers, 'position')
+        self.chain = self.getfield(identifiers, 'chain', force_string=True)
 
         # Information on binding site members
         self.members = []
-        for member in bindingsite.xpath('identifiers/members/member'):
-            self.members += member.xpath('text()')
+        if 'members' in identifiers:
+            self.members = [member.text for member in identifiers['members'].iterchildren('member') if member.text]
 
-        self.composite = self.getdata(bindingsite, 'identifiers/composite')
+        self.composite = self.getfield(identifiers, 'composite')
 
         # Ligand Properties
-        self.heavy_atoms = self.getdata(bindingsite, 'lig_properties/num_heavy_atoms')
-        self.hbd = self.getdata(bindingsite, 'lig_properties/num_hbd')
-        self.unpaired_hbd = self.getdata(bindingsite, 'lig_properties/num_unpaired_hbd')
-        self.hba = self.getdata(bindingsite, 'lig_properties/num_hba')
-        self.unpaired_hba = self.getdata(bindingsite, 'lig_properties/num_unpaired_hba')
-        self.hal = self.getdata(bindingsite, 'lig_properties/num_hal')
-        self.unpaired_hal = self.getdata(bindingsite, 'lig_properties/num_unpaired_hal')
-        self.molweight = self.getdata(bindingsite, 'lig_properties/molweight')
-        self.logp = self.getdata(bindingsite, 'lig_properties/logp')
-        self.rotatable_bonds = self.getdata(bindingsite, 'lig_properties/num_rotatable_bonds')
-        self.rings = self.getdata(bindingsite, 'lig_properties/num_aromatic_rings')
+        properties = self.getchildren(sections['lig_properties'])
+        self.heavy_atoms = self.getfield(properties, 'num_heavy_atoms')
+        self.hbd = self.getfield(properties, 'num_hbd')
+        self.unpaired_hbd = self.getfield(properties, 'num_unpaired_hbd')
+        self.hba = self.getfield(properties, 'num_hba')
+        self.unpaired_hba = self.getfield(properties, 'num_unpaired_hba')
+        self.hal = self.getfield(properties, 'num_hal')
+        self.unpaired_hal = self.getfield(properties, 'num_unpaired_hal')
+        self.molweight = self.getfield(properties, 'molweight')
+        self.logp = self.getfield(properties, 'logp')
+        self.rotatable_bonds = self.getfield(properties, 'num_rotatable_bonds')
+        self.rings = self.getfield(properties, 'num_aromatic_rings')
 
         # Binding Site residues
         self.bs_res = []
-        for tagpart in bindingsite.xpath('bs_residues/bs_residue'):
+        for tagpart in sections['bs_residues'].iterchildren('bs_residue'):
             resnumber, reschain = tagpart.text[:-1], tagpart.text[-1]
             aa, contact, min_dist = tagpart.get('aa'), tagpart.get('contact'), tagpart.get('min_dist')
             new_bs_res = {'resnr': int(resnumber), 'reschain': reschain, 'aa': aa,
@@ -219,37 +267,51 @@ class BSite(XMLStorage):
             self.bs_res.append(new_bs_res)
 
         # Interacting chains
-        self.interacting_chains = []
-        for chain in bindingsite.xpath('interacting_chains/interacting_chain'):
-            self.interacting_chains += chain.xpath('text()')
+        self.interacting_chains = [chain.text for chain in
+                                   sections['interacting_chains'].iterchildren('interacting_chain') if chain.text]
 
         # Interactions
-        interactions = bindingsite.xpath('interactions')[0]
-        self.hydrophobics = [HydrophobicInteraction(x) for x in
-                             interactions.xpath('hydrophobic_interactions/hydrophobic_interaction')]
-        self.hbonds = [HydrogenBond(x) for x in interactions.xpath('hydrogen_bonds/hydrogen_bond')]
-        self.wbridges = [WaterBridge(x) for x in interactions.xpath('water_bridges/water_bridge')]
-        self.sbridges = [SaltBridge(x) for x in interactions.xpath('salt_bridges/salt_bridge')]
-        self.pi_stacks = [PiStacking(x) for x in interactions.xpath('pi_stacks/pi_stack')]
-        self.pi_cations = [PiCation(x) for x in interactions.xpath('pi_cation_interactions/pi_cation_interaction')]
-        self.halogens = [HalogenBond(x) for x in interactions.xpath('halogen_bonds/halogen_bond')]
-        self.metal_complexes = [MetalComplex(x) for x in interactions.xpath('metal_complexes/metal_complex')]
+        interactions = self.getchildren(sections['interactions'])
+
+        def parse_interactions(group, element_name, interaction_class):
+            if group not in interactions:
+                return []
+            return [interaction_class(x) for x in interactions[group].iterchildren(element_name)]
+
+        self.hydrophobics = parse_interactions('hydrophobic_interactions', 'hydrophobic_interaction',
+                                               HydrophobicInteraction)
+        self.hbonds = parse_interactions('hydrogen_bonds', 'hydrogen_bond', HydrogenBond)
+        self.wbridges = parse_interactions('water_bridges', 'water_bridge', WaterBridge)
+        self.sbridges = parse_interactions('salt_bridges', 'salt_bridge', SaltBridge)
+        self.pi_stacks = parse_interactions('pi_stacks', 'pi_stack', PiStacking)
+        self.pi_cations = parse_interactions('pi_cation_interactions', 'pi_cation_interaction', PiCation)
+        self.halogens = parse_interactions('halogen_bonds', 'halogen_bond', HalogenBond)
+        self.metal_complexes = parse_interactions('metal_complexes', 'metal_complex', MetalComplex)
         self.num_contacts = len(self.hydrophobics) + len(self.hbonds) + len(self.wbridges) + len(self.sbridges) + \
                             len(self.pi_stacks) + len(self.pi_cations) + len(self.halogens) + len(self.metal_complexes)
         self.has_interactions = self.num_contacts > 0
 
-        self.get_atom_mapping()
+        self.get_atom_mapping(sections.get('mappings'))
         self.counts = self.get_counts()
 
-    def get_atom_mapping(self):
+    @staticmethod
+    def get_bsid(bindingsite):
+        """Returns the binding site identifier (HETID:CHAIN:POSITION) without parsing the full binding site."""
+        identifiers = bindingsite.find('identifiers')
+        return ":".join([child.text for child in identifiers if child.text][2:5])
+
+    def get_atom_mapping(self, mappings=None):
         """Parses the ligand atom mapping."""
         # Atom mappings
-        smiles_to_pdb_mapping = self.bindingsite.xpath('mappings/smiles_to_pdb/text()')
+        if mappings is None:
+            mappings = self.bindingsite.find('mappings')
+        smiles_to_pdb = mappings.find('smiles_to_pdb') if mappings is not None else None
+        smiles_to_pdb_mapping = smiles_to_pdb.text if smiles_to_pdb is not None else None
         if not smiles_to_pdb_mapping:
             self.mappings = {'smiles_to_pdb': None, 'pdb_to_smiles': None}
         else:
             smiles_to_pdb_mapping = {int(y[0]): int(y[1]) for y in [x.split(':')
-                                                                    for x in smiles_to_pdb_mapping[0].split(',')]}
+                                                                    for x in smiles_to_pdb_mapping.split(',')]}
             self.mappings = {'smiles_to_pdb': smiles_to_pdb_mapping}
             self.mappings['pdb_to_smiles'] = {v: k for k, v in self.mappings['smiles_to_pdb'].items()}
 
@@ -267,6 +329,27 @@ class BSite(XMLStorage):
         return counts
 
 
+class BSiteCollection(Mapping):
+    """Dictionary-like collection of the binding sites in a PLIP XML file, keyed by binding site identifier.
+    Binding sites are only parsed into BSite objects when they are accessed for the first time."""
+
+    def __init__(self, bindingsites, pdbid):
+        self.pdbid = pdbid
+        self.elements = {BSite.get_bsid(bs): bs for bs in bindingsites}
+        self.parsed = {}
+
+    def __getitem__(self, bsid):
+        if bsid not in self.parsed:
+            self.parsed[bsid] = BSite(self.elements[bsid], self.pdbid)
+        return self.parsed[bsid]
+
+    def __iter__(self):
+        return iter(self.elements)
+
+    def __len__(self):
+        return len(self.elements)
+
+
 class PlipXML(XMLStorage):
     """Parses and stores all information from a PLIP XML file."""
 
@@ -274,17 +357,47 @@ class PlipXML(XMLStorage):
         self.load_data(xmlfile)
 
         # Parse general information
-        self.version = self.getdata(self.doc, '/report/plipversion/')
-        self.pdbid = self.getdata(self.doc, '/report/pdbid', force_string=True)
-        self.filetype = self.getdata(self.doc, '/report/filetype')
-        self.fixed = self.getdata(self.doc, '/report/pdbfixes/')
-        self.filename = self.getdata(self.doc, '/report/filename')
-        self.excluded = self.doc.xpath('/report/excluded_ligands/excluded_ligand/text()')
-
-        # Parse binding site information
-        self.bsites = {BSite(bs, self.pdbid).bsid: BSite(bs, self.pdbid) for bs in self.doc.xpath('//bindingsite')}
+        general = self.getchildren(self.doc.getroot())
+        self.version = self.getfield(general, 'plipversion')
+        self.pdbid = self.getfield(general, 'pdbid', force_string=True)
+        self.filetype = self.getfield(general, 'filetype')
+        self.fixed = self.getfield(general, 'pdbfixes')
+        self.filename = self.getfield(general, 'filename')
+        self.excluded = []
+        if 'excluded_ligands' in general:
+            self.excluded = [e.text for e in general['excluded_ligands'].iterchildren('excluded_ligand') if e.text]
+
+        # Binding sites are parsed on first access
+        self.bsites = BSiteCollection(self.doc.getroot().iterchildren('bindingsite'), self.pdbid)
         self.num_bsites = len(self.bsites)
 
     def load_data(self, xmlfile):
         """Loads/parses an XML file and saves it as a tree if successful."""
         self.doc = etree.parse(xmlfile)
+
+
+def iter_bsites(xmlfiles):
+    """Streams all binding sites from one or several PLIP XML files (paths or file objects) as BSite objects.
+    Each file is parsed incrementally in a single pass. Binding site elements are detached from the document once
+    read, so whole documents are never held in memory. PLIP writes the PDB ID after the binding sites, so the
+    (detached) binding sites of a file are only kept until it is read."""
+    if isinstance(xmlfiles, str):
+        xmlfiles = [xmlfiles]
+    for xmlfile in xmlfiles:
+        pdbid, pending = None, []
+        for _, element in etree.iterparse(xmlfile, events=('end',), tag=('bindingsite', 'pdbid')):
+            if element.tag == 'pdbid':
+                if element.getparent().getparent() is None:  # Not the PDB ID of a binding site
+                    pdbid = element.text
+                    for bindingsite in pending:
+                        yield BSite(bindingsite, pdbid)
+                    pending = []
+                continue
+            # Detach the finished binding site from the tree to keep the partial document small
+            element.getparent().remove(element)
+            if pdbid is None:
+                pending.append(element)
+            else:
+                yield BSite(element, pdbid)
+        for bindingsite in pending:  # No PDB ID in the file
+            yield BSite(bindingsite, pdbid)
@@ -1,15 +1,21 @@
-from fastapi import FastAPI, HTTPException, Path as FastAPIPath, File, UploadFile, Form
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi import FastAPI, HTTPException, Path as FastAPIPath, File, UploadFile, Form, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from typing import Optional, List
 import logging
 import sys
 from pathlib import Path
-import io
 import json
-from zipfile import ZipFile
+import mimetypes
+import zlib
 
-from plip.plip_task import process_task, get_task_status, list_tasks
+from plip.plip_task import process_task, get_task_status, list_tasks, new_task_id, save_upload
+from plip.plip_task import scheduler, cancel_task, QueueFullError, start_workers, stop_workers, remove_task_storage
+from plip import plip_metrics as metrics
+from plip.plip_task import get_task_info, wait_for_task, wait_for_task_update, FINISHED_STATES
+from plip.plip_download import ARCHIVE_FORMATS, list_artifacts, artifacts_etag, etag_matches, accepts_gzip
+from plip.plip_download import parse_range, iter_file, iter_gzip, iter_archive
+from plip.exchange.webservices import is_pdbid
 
 # Configure logging
 logging.basicConfig(
@@ -27,6 +33,20 @@ logging.getLogger("urllib3").setLevel(logging.WARNING)
 
 app = FastAPI()
 
+@app.on_event("startup")
+async def startup():
+    # Collect stage durations and events of the analysis code run in the API process, only when serving
+    metrics.enable()
+    # Fork the analysis workers (with OpenBabel loaded) before the first request instead of on demand
+    await start_workers()
+
+@app.on_event("shutdown")
+def shutdown():
+    stop_workers()
+
+# Upper bound for long-polling requests and interval of SSE keep-alive comments (seconds)
+MAX_WAIT = 60
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=['*'],
@@ -35,6 +55,11 @@ app.add_middleware(
     allow_headers=['*']
 )
 
+@app.get('/metrics')
+def get_metrics():
+    """Task, queue, analysis stage and cache metrics in the Prometheus text format"""
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get('/ping')
 def ping():
     """Health check endpoint"""
@@ -42,41 +67,61 @@ def ping():
 
 @app.post('/inference')
 async def inference(
+    request: Request,
     file: UploadFile | None = File(None),
     body: str = Form(default="{}")
 ):
-    """Start PLIP analysis and return task ID"""
+    """Start PLIP analysis and return task ID.
+    Answers 429 with Retry-After if the task queue is full. Tasks are queued per client
+    (X-Client-ID header or client address) in the lane given by "priority" in the body
+    ("interactive" or "batch") or estimated from the size of the structure."""
     try:
         logger.info("Received inference request")
 
+        # Reject early, before an upload is stored
+        scheduler.check_admission()
+
         # Create request data with default output formats
         request_data = {
             "output_format": ["xml", "txt"]
         }
 
+        try:
+            body_data = json.loads(body)
+        except json.JSONDecodeError:
+            body_data = {}
+        if body_data.get('priority'):
+            request_data["priority"] = body_data['priority']
+
+        task_id = new_task_id()
+
         # Handle file upload or file content from body
         if file:
-            content = await file.read()
-            request_data["file_content"] = content.decode()
+            # Streamed to disk instead of being held in memory, gzip-compressed files are accepted
+            try:
+                request_data["input_file"] = await save_upload(task_id, file)
+            except (ValueError, zlib.error) as e:
+                remove_task_storage(task_id)
+                raise HTTPException(status_code=400, detail=f"Invalid upload: {e}")
         else:
             # Parse body for PDB ID or file content
-            try:
-                body_data = json.loads(body)
-                if 'file_content' in body_data:
-                    request_data["file_content"] = body_data['file_content']
-                elif 'pdb_id' in body_data:
-                    request_data["pdb_id"] = body_data['pdb_id']
-            except json.JSONDecodeError:
-                pass
+            if 'file_content' in body_data:
+                request_data["file_content"] = body_data['file_content']
+            elif 'pdb_id' in body_data:
+                # Used in paths of the structure sources
+                if not isinstance(body_data['pdb_id'], str) or not is_pdbid(body_data['pdb_id']):
+                    raise HTTPException(status_code=400, detail="pdb_id must be a PDB ID of four letters and digits")
+                request_data["pdb_id"] = body_data['pdb_id']
 
         # Validate input
-        if "file_content" not in request_data and "pdb_id" not in request_data:
+        if not any(key in request_data for key in ("input_file", "file_content", "pdb_id")):
             raise HTTPException(
                 status_code=400,
                 detail="Either file or pdb_id in body must be provided"
             )
 
-        task_id = await process_task(request_data)
+        client = request.headers.get("x-client-id") or (request.client.host if request.client else "default")
+        task_id = await process_task(request_data, task_id, client)
         logger.info(f"Created task: {task_id}")
 
         return JSONResponse(
@@ -84,26 +129,95 @@ async def inference(
             content={'task_id': task_id}
         )
 
+    except QueueFullError as e:
+        return JSONResponse(
+            status_code=429,
+            content={"error": str(e)},
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error submitting inference task: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get('/task_status/{task_id}')
-async def check_task_status(task_id: str):
-    """Get status of a specific task"""
-    status = await get_task_status(task_id)
+async def check_task_status(task_id: str, wait: Optional[float] = Query(None, ge=0, le=MAX_WAIT)):
+    """Get status of a specific task; with ?wait=<seconds>, return as soon as the task is finished"""
+    if wait:
+        status = await wait_for_task(task_id, wait)
+    else:
+        status = await get_task_status(task_id)
     if status == "not_found":
         raise HTTPException(status_code=404, detail="Task not found")
     return status
 
+@app.get('/task_progress/{task_id}')
+async def check_task_progress(
+    task_id: str,
+    wait: Optional[float] = Query(None, ge=0, le=MAX_WAIT),
+    version: int = Query(-1)
+):
+    """Get status and progress (stage, ligand i of n) of a task.
+    With ?wait=<seconds>, return as soon as the task has changed after the given version."""
+    if wait:
+        info = await wait_for_task_update(task_id, version, wait)
+    else:
+        info = get_task_info(task_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return info
+
+@app.get('/task_events/{task_id}')
+async def task_events(task_id: str):
+    """Stream status transitions and progress of a task as Server-Sent Events until it is finished"""
+    info = get_task_info(task_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    async def events(info):
+        yield f"event: progress\ndata: {json.dumps(info)}\n\n"
+        while info["status"] not in FINISHED_STATES:
+            update = await wait_for_task_update(task_id, info["version"], MAX_WAIT)
+            if update is None:
+                return
+            if update["version"] == info["version"]:
+                yield ": keep-alive\n\n"
+                continue
+            info = update
+            yield f"event: progress\ndata: {json.dumps(info)}\n\n"
+
+    return StreamingResponse(
+        events(info),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
+
 @app.get('/tasks')
 def get_tasks():
     """List all tasks"""
     return JSONResponse(status_code=200, content=list_tasks())
 
+@app.delete('/tasks/{task_id}')
+async def delete_task(task_id: str):
+    """Cancel a queued or running task"""
+    if await get_task_status(task_id) == "not_found":
+        raise HTTPException(status_code=404, detail="Task not found")
+    if not cancel_task(task_id):
+        raise HTTPException(status_code=409, detail="Task already finished")
+    return JSONResponse(status_code=202, content=get_task_info(task_id))
+
 @app.get('/download/{task_id}')
-async def download_results(task_id: str = FastAPIPath(...)):
-    """Download task results as txt file"""
+async def download_results(
+    request: Request,
+    task_id: str = FastAPIPath(...),
+    artifact: Optional[List[str]] = Query(None),
+    format: Optional[str] = Query(None)
+):
+    """Download task results.
+    Without format, a single artifact (default: report.txt) is served with Range, ETag and gzip support.
+    With format=zip|tar|tar.gz, all artifacts matching the artifact names/glob patterns (default: all)
+    are streamed as archive."""
     status = await get_task_status(task_id)
     if status == "not_found":
         return JSONResponse(
@@ -117,25 +231,91 @@ async def download_results(task_id: str = FastAPIPath(...)):
             status_code=400
         )
 
+    if format is not None and format not in ARCHIVE_FORMATS:
+        return JSONResponse(
+            content={"error": f"Unknown format, use one of {', '.join(ARCHIVE_FORMATS)}"},
+            status_code=400
+        )
+
     task_dir = Path("storage") / task_id
-    txt_file = task_dir / f"report.txt"  # Assuming the txt file is named report.txt
-    
-    if not txt_file.exists():
-        logger.error(f"Text report not found for task {task_id}")
+    if format is not None:
+        return archive_response(request, task_id, list_artifacts(task_dir, artifact), format)
+
+    if artifact is not None and len(artifact) != 1:
+        return JSONResponse(
+            content={"error": "Select a single artifact or an archive format"},
+            status_code=400
+        )
+    name = artifact[0] if artifact else "report.txt"
+    matches = [path for path in list_artifacts(task_dir) if path.name == name]
+    if not matches:
+        logger.error(f"Artifact {name} not found for task {task_id}")
         return JSONResponse(
-            content={"error": "Text report not found"},
+            content={"error": f"Artifact {name} not found"},
             status_code=404
         )
+    filename = f"plip_report_{task_id}.txt" if name == "report.txt" else f"{task_id}_{name}"
+    return file_response(request, matches[0], filename)
 
-    with open(txt_file, 'rb') as f:
-        content = f.read()
-
+def archive_response(request: Request, task_id: str, paths: List[Path], archive_format: str):
+    """Stream the given artifacts as archive, honoring If-None-Match"""
+    if not paths:
+        return JSONResponse(
+            content={"error": "No matching artifacts"},
+            status_code=404
+        )
+    etag = artifacts_etag(paths, archive_format)
+    headers = {"ETag": etag}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    media_types = {"zip": "application/zip", "tar": "application/x-tar", "tar.gz": "application/gzip"}
+    headers["Content-Disposition"] = f"attachment; filename=plip_results_{task_id}.{archive_format}"
     return StreamingResponse(
-        io.BytesIO(content),
-        media_type="text/plain",
-        headers={"Content-Disposition": f"attachment; filename=plip_report_{task_id}.txt"}
+        iter_archive(paths, archive_format),
+        media_type=media_types[archive_format],
+        headers=headers
     )
 
+def file_response(request: Request, path: Path, filename: str):
+    """Stream a single artifact, honoring If-None-Match, Range/If-Range and Accept-Encoding"""
+    size = path.stat().st_size
+    etag = artifacts_etag([path])
+    media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    ranged = bool(range_header) and (if_range is None or if_range == etag)
+    # Ranges refer to the identity representation, other requests get the gzip one if accepted.
+    # The representation is chosen first, as the compressed one has its own ETag.
+    gzipped = not ranged and accepts_gzip(request.headers.get("accept-encoding"))
+    headers = {
+        "ETag": artifacts_etag([path], "gzip") if gzipped else etag,
+        "Accept-Ranges": "bytes",
+        "Vary": "Accept-Encoding",
+        "Content-Disposition": f"attachment; filename={filename}"
+    }
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    if ranged:
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+        if byte_range is not None:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            headers["Content-Length"] = str(end - start + 1)
+            return StreamingResponse(iter_file(path, start, end), status_code=206,
+                                     media_type=media_type, headers=headers)
+
+    if gzipped:
+        headers["Content-Encoding"] = "gzip"
+        return StreamingResponse(iter_gzip(iter_file(path)), media_type=media_type, headers=headers)
+
+    headers["Content-Length"] = str(size)
+    return StreamingResponse(iter_file(path), media_type=media_type, headers=headers)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="127.0.0.1", port=8000)
@@ -0,0 +1,164 @@
+import fnmatch
+import hashlib
+import tarfile
+import time
+import zipfile
+import zlib
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+# Size of the chunks in which artifacts are read and streamed (bytes)
+CHUNK_SIZE = 1 << 16
+
+ARCHIVE_FORMATS = ("zip", "tar", "tar.gz")
+
+def list_artifacts(task_dir: Path, patterns: Optional[List[str]] = None) -> List[Path]:
+    """List the result files of a task, optionally only those matching any of the given names/glob patterns"""
+    if not task_dir.is_dir():
+        return []
+    artifacts = sorted(path for path in task_dir.iterdir() if path.is_file())
+    if patterns is None:
+        return artifacts
+    return [path for path in artifacts if any(fnmatch.fnmatchcase(path.name, pattern) for pattern in patterns)]
+
+def artifacts_etag(paths: Iterable[Path], variant: str = "") -> str:
+    """Strong ETag derived from names, sizes and modification times of the given files"""
+    digest = hashlib.sha1(variant.encode())
+    for path in paths:
+        stat = path.stat()
+        digest.update(f"{path.name}\0{stat.st_size}\0{stat.st_mtime_ns}\0".encode())
+    return f'"{digest.hexdigest()}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header against an ETag"""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    """Check whether an Accept-Encoding header allows gzip"""
+    for coding in (accept_encoding or "").split(","):
+        name, _, params = coding.strip().partition(";")
+        if name.strip().lower() in ("gzip", "*"):
+            q = params.strip()
+            if not q.startswith("q="):
+                return True
+            try:
+                return float(q[2:]) > 0
+            except ValueError:
+                # Unparsable weights are treated as q=0
+                return False
+    return False
+
+def parse_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single byte range (bytes=a-b, bytes=a- or bytes=-n) into inclusive (start, end).
+    Returns None for headers that are ignored (other units, several ranges),
+    raises ValueError for unsatisfiable ranges."""
+    unit, _, ranges = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+    first, _, last = ranges.strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            start, end = max(0, size - int(last)), size - 1
+    except ValueError:
+        return None
+    end = min(end, size - 1)
+    if start > end or start >= size:
+        raise ValueError(f"Unsatisfiable range {range_header} for {size} bytes")
+    return start, end
+
+def iter_file(path: Path, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+    """Read a file (or the inclusive byte range start..end of it) in chunks"""
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = None if end is None else end - start + 1
+        while remaining is None or remaining > 0:
+            chunk = f.read(CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+def iter_gzip(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Gzip-compress a stream of chunks"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+def iter_tar(paths: List[Path]) -> Iterator[bytes]:
+    """Stream files as an uncompressed tar archive, one member header and data chunk at a time"""
+    written = 0
+    for path in paths:
+        stat = path.stat()
+        info = tarfile.TarInfo(path.name)
+        info.size = stat.st_size
+        info.mtime = int(stat.st_mtime)
+        info.mode = 0o644
+        header = info.tobuf(tarfile.DEFAULT_FORMAT, "utf-8", "surrogateescape")
+        yield header
+        written += len(header)
+        size = 0
+        for chunk in iter_file(path, 0, stat.st_size - 1):
+            size += len(chunk)
+            yield chunk
+        padding = b"\0" * (-size % tarfile.BLOCKSIZE)
+        if padding:
+            yield padding
+        written += size + len(padding)
+    # End of archive marker, padded to a full record as written by tarfile
+    written += 2 * tarfile.BLOCKSIZE
+    yield b"\0" * (2 * tarfile.BLOCKSIZE + (-written % tarfile.RECORDSIZE))
+
+class _ChunkSink:
+    """Write-only, unseekable file object collecting what ZipFile writes until it is drained"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+def iter_zip(paths: List[Path]) -> Iterator[bytes]:
+    """Stream files as a deflate-compressed zip archive without buffering whole members"""
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for path in paths:
+            stat = path.stat()
+            info = zipfile.ZipInfo(path.name, date_time=time.localtime(stat.st_mtime)[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with archive.open(info, "w", force_zip64=stat.st_size >= zipfile.ZIP64_LIMIT) as member:
+                for chunk in iter_file(path):
+                    member.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            yield sink.drain()
+    yield sink.drain()
+
+def iter_archive(paths: List[Path], archive_format: str) -> Iterator[bytes]:
+    """Stream files as zip, tar or tar.gz archive"""
+    if archive_format == "zip":
+        return iter_zip(paths)
+    elif archive_format == "tar":
+        return iter_tar(paths)
+    elif archive_format == "tar.gz":
+        return iter_gzip(iter_tar(paths))
+    raise ValueError(f"Unknown archive format {archive_format}")
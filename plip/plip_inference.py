@@ -1,11 +1,12 @@
 from pathlib import Path
-from typing import List
+from typing import Callable, List, Optional
 import contextlib
 import os
 
 from plip.structure.preparation import PDBComplex
 from plip.exchange.report import StructureReport
 from plip.basic import config
+from plip.basic.instrumentation import observe, stage
 from plip.exchange.webservices import fetch_pdb
 
 class PLIPInference:
@@ -15,6 +16,17 @@ class PLIPInference:
         self.output_dir.mkdir(parents=True, exist_ok=True)
 
     async def run(self, pdb_file: str, output_format: List[str] = ["xml", "txt"]):
+        self.analyze(pdb_file, output_format)
+
+    def analyze(
+        self,
+        pdb_file: str,
+        output_format: List[str] = ["xml", "txt"],
+        progress: Optional[Callable[..., None]] = None
+    ):
+        """Run the analysis; progress(stage, current, total) is called when a new stage or ligand starts"""
+        if progress is None:
+            progress = lambda stage, current=0, total=0: None
         try:
             error_file = Path(self.output_dir) / "debug.log"
             with open(error_file, "w") as f:
@@ -26,6 +38,7 @@ class PLIPInference:
             with open(error_file, "a") as f:
                 f.write(f"Config set - XML: {config.XML}, TXT: {config.TXT}\n")
 
+            progress("loading")
             complex = PDBComplex()
             complex.output_path = str(self.output_dir)
 
@@ -40,25 +53,29 @@ class PLIPInference:
 
             with open(error_file, "a") as f:
                 f.write(f"Found {len(complex.ligands)} ligands\n")
+            observe('structure_atoms', len(complex.atoms))
+            observe('structure_ligands', len(complex.ligands))
 
             for i, ligand in enumerate(complex.ligands, 1):
+                progress("analyzing", i, len(complex.ligands))
                 try:
                     complex.characterize_complex(ligand)
-                    report = StructureReport(complex)
+                    with stage('report'):
+                        report = StructureReport(complex)
 
-                    base_name = f"{ligand.hetid}_{ligand.chain}_{ligand.position}"
+                        base_name = f"{ligand.hetid}_{ligand.chain}_{ligand.position}"
 
-                    if config.XML:
-                        xml_path = self.output_dir / f"{base_name}.xml"
-                        with open(error_file, "a") as f:
-                            f.write(f"Writing XML to {xml_path}\n")
-                        report.write_xml(as_string=False)
+                        if config.XML:
+                            xml_path = self.output_dir / f"{base_name}.xml"
+                            with open(error_file, "a") as f:
+                                f.write(f"Writing XML to {xml_path}\n")
+                            report.write_xml(as_string=False)
 
-                    if config.TXT:
-                        txt_path = self.output_dir / f"{base_name}.txt"
-                        with open(error_file, "a") as f:
-                            f.write(f"Writing TXT to {txt_path}\n")
-                        report.write_txt(as_string=False)
+                        if config.TXT:
+                            txt_path = self.output_dir / f"{base_name}.txt"
+                            with open(error_file, "a") as f:
+                                f.write(f"Writing TXT to {txt_path}\n")
+                            report.write_txt(as_string=False)
 
                     with open(error_file, "a") as f:
                         f.write(f"Processed ligand {i}\n")
@@ -82,3 +99,10 @@ class PLIPInference:
         config.XML = "xml" in output_format
         config.TXT = "txt" in output_format
         config.OUTPATH = str(self.output_dir)
+        # Structures for PDB IDs are read from a local mirror and/or cache if configured
+        config.PDB_MIRROR = os.environ.get("PLIP_PDB_MIRROR", config.PDB_MIRROR)
+        config.PDB_CACHE = os.environ.get("PLIP_PDB_CACHE", config.PDB_CACHE)
+        # Prepared structures are reused across tasks with identical input if a snapshot cache is configured
+        config.SNAPSHOT_CACHE = os.environ.get("PLIP_SNAPSHOT_CACHE", config.SNAPSHOT_CACHE)
+        # The protonated structure is part of the task results (<input>_protonated.pdb)
+        config.PROTONATED = True
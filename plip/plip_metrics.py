@@ -0,0 +1,164 @@
+import bisect
+import math
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+from plip.basic import instrumentation
+
+# Metrics are updated from the event loop and the inference thread
+_lock = threading.Lock()
+
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+ATOM_BUCKETS = (500, 1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000)
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class Metric:
+    """Base class of metrics with optional labels"""
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labels)
+        registry.append(self)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        super().__init__(name, documentation, labels)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        with _lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def collect(self) -> List[str]:
+        with _lock:
+            values = sorted(self.values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+                                for labels, value in values]
+
+class Gauge(Metric):
+    """Gauge whose value is computed by a callback at collection time"""
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, callback, labels: Iterable[str] = ()):
+        super().__init__(name, documentation, labels)
+        self.callback = callback  # returns {labels tuple: value}
+
+    def collect(self) -> List[str]:
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+                                for labels, value in sorted(self.callback().items())]
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: Iterable[float] = DURATION_BUCKETS,
+                 labels: Iterable[str] = ()):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        self.values: Dict[Tuple[str, ...], list] = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            state = self.values.get(labels)
+            if state is None:
+                state = self.values[labels] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def collect(self) -> List[str]:
+        with _lock:
+            values = sorted((labels, list(state)) for labels, state in self.values.items())
+        lines = self.header()
+        for labels, state in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), state[:-2] + [state[-1] - sum(state[:-2])]):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {state[-1]}")
+        return lines
+
+registry: List[Metric] = []
+
+def render() -> str:
+    """Render all metrics in the Prometheus text exposition format"""
+    return "\n".join(line for metric in registry for line in metric.collect()) + "\n"
+
+# Task lifecycle
+TASKS_SUBMITTED = Counter("plip_tasks_submitted_total", "Tasks accepted into the queue", ["lane"])
+TASKS_REJECTED = Counter("plip_tasks_rejected_total", "Submissions rejected because the queue was full")
+TASKS_FINISHED = Counter("plip_tasks_finished_total", "Finished tasks by final status", ["status"])
+QUEUE_WAIT = Histogram("plip_queue_wait_seconds", "Time tasks spent in the queue", labels=["lane"])
+TASK_DURATION = Histogram("plip_task_duration_seconds", "Run time of tasks from start to final status",
+                          labels=["status"])
+
+# Analysis
+STAGE_DURATION = Histogram("plip_stage_duration_seconds", "Duration of analysis stages", labels=["stage"])
+STRUCTURE_ATOMS = Histogram("plip_structure_atoms", "Atoms per analyzed structure", ATOM_BUCKETS)
+STRUCTURE_LIGANDS = Histogram("plip_structure_ligands", "Ligands per analyzed structure", COUNT_BUCKETS)
+EVENTS = Counter("plip_events_total", "Structure source events (mirror/cache hits, cache misses, downloads)",
+                 ["event"])
+
+# Measurements reported by name through instrumentation.observe
+_OBSERVED = {"structure_atoms": STRUCTURE_ATOMS, "structure_ligands": STRUCTURE_LIGANDS}
+
+# Workers
+WORKER_BUSY = Counter("plip_worker_busy_seconds_total",
+                      "Time workers spent running tasks; divide its rate by plip_workers for the utilization")
+WORKERS_RECYCLED = Counter("plip_workers_recycled_total",
+                           "Worker processes replaced, by reason (killed after timeout/oom/cancel/error, max tasks)",
+                           ["reason"])
+
+class _Collector:
+    """Receives stage durations, events and measurements from PLIP's instrumentation hooks,
+    directly or forwarded from worker processes"""
+
+    @staticmethod
+    def stage(name: str, seconds: float):
+        STAGE_DURATION.observe(seconds, name)
+
+    @staticmethod
+    def event(name: str):
+        EVENTS.inc(name)
+
+    @staticmethod
+    def observe(name: str, value: float):
+        histogram = _OBSERVED.get(name)
+        if histogram is not None:
+            histogram.observe(value)
+
+collector = _Collector()
+
+def enable():
+    """Start collecting stage durations and events from the analysis code"""
+    instrumentation.set_listener(collector)
+
+def register_scheduler(scheduler):
+    """Export queue depth, running tasks and worker count of a scheduler as gauges"""
+    Gauge("plip_queue_depth", "Tasks waiting in the queue",
+          lambda: {(lane,): sum(len(queue) for queue in clients.values())
+                   for lane, clients in scheduler.lanes.items()}, ["lane"])
+    Gauge("plip_tasks_running", "Tasks currently running", lambda: {(): len(scheduler.running)})
+    Gauge("plip_workers", "Number of inference workers", lambda: {(): scheduler.workers})
+    Gauge("plip_queue_capacity", "Maximum number of queued tasks", lambda: {(): scheduler.max_queued})
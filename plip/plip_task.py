@@ -1,59 +1,309 @@
 import asyncio
+import math
 import os
+import shutil
+import zlib
+import time
 import uuid
 import logging
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict
+from typing import Dict, NamedTuple, Optional
 
-from plip.plip_inference import PLIPInference
+from plip import plip_metrics as metrics
+from plip.plip_worker import TaskCancelled, TaskOutOfMemory, TaskTimeout, WorkerPool
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
 # Task storage
 tasks: Dict[str, str] = {}  # task_id -> status string
+task_progress: Dict[str, dict] = {}  # task_id -> current stage and ligand i of n
+task_versions: Dict[str, int] = {}  # task_id -> number of updates, lets clients wait for the next one
+task_updates: Dict[str, asyncio.Event] = {}  # task_id -> event set on every update
 
-async def process_task(request_data: dict) -> str:
-    """Create and manage task for PLIP analysis"""
-    task_id = str(uuid.uuid4())
-    tasks[task_id] = "queued"
+FINISHED_STATES = ("completed", "failed", "cancelled", "timeout", "oom")
 
-    # Start inference in background
-    asyncio.create_task(
-        run_inference_task(task_id, request_data)
-    )
+# Admission control: at most this many tasks wait in the queue, further submissions get 429
+MAX_QUEUED_TASKS = int(os.environ.get("PLIP_MAX_QUEUED_TASKS", 1000))
+# Structures with at most this many atoms are scheduled in the interactive lane, ahead of batch jobs
+SMALL_STRUCTURE_ATOMS = int(os.environ.get("PLIP_SMALL_STRUCTURE_ATOMS", 10000))
+# Priority lanes, highest priority first
+LANES = ("interactive", "batch")
 
+# Uploads are copied to the task's storage in chunks of this size (bytes)
+UPLOAD_CHUNK_SIZE = 1 << 20
+GZIP_MAGIC = b"\x1f\x8b"
+
+# Analyses run in warm worker processes (PLIP keeps its settings in module globals), which are killed
+# when a task exceeds the limits of plip_worker. Each one is supervised by a thread, off the event loop.
+# The workers are started with the API (see start_workers) and reused across tasks.
+INFERENCE_WORKERS = int(os.environ.get("PLIP_WORKERS", 1))
+inference_executor = ThreadPoolExecutor(max_workers=INFERENCE_WORKERS, thread_name_prefix="plip-inference")
+worker_pool = WorkerPool(INFERENCE_WORKERS, on_recycle=metrics.WORKERS_RECYCLED.inc)
+
+class QueueFullError(Exception):
+    """Raised when a task is submitted while the queue is full"""
+    def __init__(self, retry_after: int):
+        self.retry_after = retry_after
+        super().__init__(f"Task queue is full, retry after {retry_after} seconds")
+
+class QueuedTask(NamedTuple):
+    """Task waiting in a lane of the scheduler"""
+    lane: str
+    client: str
+    request_data: dict
+    enqueued: float  # time.monotonic() of the submission
+
+class TaskScheduler:
+    """Bounded queue of tasks with priority lanes and round-robin between clients within a lane"""
+
+    def __init__(self, max_queued: int = MAX_QUEUED_TASKS, workers: int = INFERENCE_WORKERS):
+        self.max_queued = max_queued
+        self.workers = workers
+        self.lanes = {lane: OrderedDict() for lane in LANES}  # lane -> client -> queued task IDs
+        self.queued: Dict[str, QueuedTask] = {}
+        self.running = set()
+        self.cancelled = set()  # running tasks whose workers are to be killed
+        self.mean_duration = 10.0  # moving average of task durations (seconds), used for Retry-After
+        self.wakeup: Optional[asyncio.Event] = None
+        self.worker_tasks = []
+
+    def retry_after(self) -> int:
+        """Estimated seconds until a slot in the queue is available"""
+        return max(1, math.ceil(self.mean_duration * (len(self.queued) - self.max_queued + 1) / self.workers))
+
+    def check_admission(self):
+        """Raise QueueFullError if no further task can be queued"""
+        if len(self.queued) >= self.max_queued:
+            metrics.TASKS_REJECTED.inc()
+            raise QueueFullError(self.retry_after())
+
+    def submit(self, task_id: str, request_data: dict, client: str, lane: str):
+        self.check_admission()
+        self.queued[task_id] = QueuedTask(lane, client, request_data, time.monotonic())
+        self.lanes[lane].setdefault(client, deque()).append(task_id)
+        metrics.TASKS_SUBMITTED.inc(lane)
+        update_task(task_id, "queued", stage="queued", lane=lane)
+        self.ensure_workers()
+        self.wakeup.set()
+
+    def ensure_workers(self):
+        if self.wakeup is None:
+            self.wakeup = asyncio.Event()
+        self.worker_tasks = [task for task in self.worker_tasks if not task.done()]
+        while len(self.worker_tasks) < self.workers:
+            self.worker_tasks.append(asyncio.create_task(self.worker()))
+
+    def next_task(self) -> Optional[str]:
+        """Take the next task from the highest-priority lane, rotating through its clients"""
+        for lane in LANES:
+            clients = self.lanes[lane]
+            if clients:
+                client, queue = next(iter(clients.items()))
+                task_id = queue.popleft()
+                if queue:
+                    clients.move_to_end(client)
+                else:
+                    del clients[client]
+                return task_id
+        return None
+
+    def cancel(self, task_id: str) -> bool:
+        """Cancel a queued or running task. Returns False if the task is unknown or already finished."""
+        if task_id in self.queued:
+            queued = self.queued.pop(task_id)
+            queue = self.lanes[queued.lane][queued.client]
+            queue.remove(task_id)
+            if not queue:
+                del self.lanes[queued.lane][queued.client]
+            update_task(task_id, "cancelled", stage="cancelled")
+            metrics.TASKS_FINISHED.inc("cancelled")
+            return True
+        if task_id in self.running:
+            self.cancelled.add(task_id)
+            update_task(task_id, stage="cancelling")
+            return True
+        return False
+
+    async def worker(self):
+        while True:
+            task_id = self.next_task()
+            if task_id is None:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+            queued = self.queued.pop(task_id)
+            self.running.add(task_id)
+            started = time.monotonic()
+            metrics.QUEUE_WAIT.observe(started - queued.enqueued, queued.lane)
+            try:
+                await run_inference_task(task_id, queued.request_data)
+            finally:
+                self.running.discard(task_id)
+                self.cancelled.discard(task_id)
+                duration = time.monotonic() - started
+                self.mean_duration = 0.8 * self.mean_duration + 0.2 * duration
+                metrics.WORKER_BUSY.inc(amount=duration)
+                metrics.TASK_DURATION.observe(duration, tasks[task_id])
+                metrics.TASKS_FINISHED.inc(tasks[task_id])
+
+scheduler = TaskScheduler()
+metrics.register_scheduler(scheduler)
+
+async def start_workers():
+    """Start the worker processes ahead of the first task"""
+    await asyncio.to_thread(worker_pool.warm)
+
+def stop_workers():
+    worker_pool.shutdown()
+
+def update_task(task_id: str, status: Optional[str] = None, **progress):
+    """Record a status transition and/or progress of a task and wake up waiting clients"""
+    if status is not None:
+        tasks[task_id] = status
+    task_progress.setdefault(task_id, {}).update(progress)
+    task_versions[task_id] = task_versions.get(task_id, 0) + 1
+    event = task_updates.pop(task_id, None)
+    if event is not None:
+        event.set()
+
+def new_task_id() -> str:
+    """Create an ID for a new task"""
+    return str(uuid.uuid4())
+
+def task_input_path(task_id: str) -> Path:
+    """Path of the input structure in the task's storage"""
+    input_dir = Path(f"storage/{task_id}")
+    input_dir.mkdir(parents=True, exist_ok=True)
+    return input_dir / "input.pdb"
+
+def remove_task_storage(task_id: str):
+    """Remove the task's storage, e.g. an upload of a rejected task"""
+    shutil.rmtree(Path(f"storage/{task_id}"), ignore_errors=True)
+
+async def save_upload(task_id: str, upload) -> str:
+    """Stream an uploaded structure to the task's storage chunk by chunk.
+    Gzip-compressed uploads are decompressed on the fly, including files of several gzip members.
+    The partial file is removed if the upload fails."""
+    input_file = task_input_path(task_id)
+    decompressor = None
+    try:
+        with open(input_file, 'wb') as f:
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                if decompressor is None:
+                    # Decide on the first chunk whether the upload is gzip-compressed
+                    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if chunk.startswith(GZIP_MAGIC) else False
+                if not decompressor:
+                    f.write(chunk)
+                    continue
+                while chunk:
+                    if decompressor.eof:
+                        # Next member; anything that is not gzip data raises zlib.error
+                        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                    f.write(decompressor.decompress(chunk))
+                    chunk = decompressor.unused_data
+            if decompressor:
+                f.write(decompressor.flush())
+                if not decompressor.eof:
+                    raise ValueError("Truncated gzip upload")
+    except BaseException:
+        input_file.unlink(missing_ok=True)
+        raise
+    logger.info(f"Saved input file to: {input_file}")
+    return str(input_file)
+
+def count_atoms(input_file: str) -> int:
+    """Count the ATOM/HETATM records of a structure file"""
+    with open(input_file, 'rb') as f:
+        return sum(1 for line in f if line.startswith((b'ATOM', b'HETATM')))
+
+async def process_task(request_data: dict, task_id: Optional[str] = None, client: str = "default") -> str:
+    """Create a task for PLIP analysis and queue it. Raises QueueFullError if the queue is full.
+    The lane is taken from request_data['priority'] if given and otherwise estimated from the atom count."""
+    if task_id is None:
+        task_id = new_task_id()
+    try:
+        scheduler.check_admission()
+
+        request_data = dict(request_data)
+        request_data['input_file'] = await prepare_input(task_id, request_data)
+        lane = request_data.get('priority')
+        if lane not in LANES:
+            if request_data['input_file'].startswith('pdb:'):
+                lane = "batch"  # Size unknown before the download
+            else:
+                atoms = await asyncio.to_thread(count_atoms, request_data['input_file'])
+                lane = "interactive" if atoms <= SMALL_STRUCTURE_ATOMS else "batch"
+
+        scheduler.submit(task_id, request_data, client, lane)
+    except QueueFullError:
+        # The queue may have filled up while the structure was uploaded, which is not kept for rejected tasks
+        remove_task_storage(task_id)
+        raise
     return task_id
 
+def cancel_task(task_id: str) -> bool:
+    """Cancel a queued or running task"""
+    return scheduler.cancel(task_id)
+
 async def run_inference_task(task_id: str, request_data: dict):
     """Run inference in background"""
-    try:
-        tasks[task_id] = "running"
+    loop = asyncio.get_running_loop()
 
-        # Prepare input
-        input_file = await prepare_input(task_id, request_data)
-        logger.info(f"Prepared input file: {input_file}")
+    def report_progress(stage: str, current: int = 0, total: int = 0):
+        # Called from the inference thread
+        loop.call_soon_threadsafe(
+            lambda: update_task(task_id, stage=stage, ligand=current, ligands=total)
+        )
+
+    try:
+        update_task(task_id, "running", stage="preparing")
+        input_file = request_data['input_file']
 
-        # Run inference
-        inference = PLIPInference(task_id)
-        await inference.run(
-            pdb_file=input_file,
-            output_format=request_data.get('output_format', ['xml', 'txt'])
+        # Run inference in a worker process, which is killed if the task exceeds its limits
+        await loop.run_in_executor(
+            inference_executor,
+            lambda: worker_pool.run(
+                task_id,
+                input_file,
+                request_data.get('output_format', ['xml', 'txt']),
+                progress=report_progress,
+                listener=metrics.collector,
+                cancelled=lambda: task_id in scheduler.cancelled
+            )
         )
 
-        tasks[task_id] = "completed"
+        update_task(task_id, "completed", stage="completed")
         logger.info(f"Task {task_id} completed successfully")
 
+    except TaskCancelled:
+        logger.info(f"Task {task_id} cancelled")
+        update_task(task_id, "cancelled", stage="cancelled")
+
+    except TaskTimeout as e:
+        logger.error(f"Task {task_id} timed out: {str(e)}")
+        update_task(task_id, "timeout", stage="timeout", error=str(e))
+
+    except TaskOutOfMemory as e:
+        logger.error(f"Task {task_id} ran out of memory: {str(e)}")
+        update_task(task_id, "oom", stage="oom", error=str(e))
+
     except BaseException as e:
         logger.error(f"Task {task_id} failed: {str(e)}")
-        tasks[task_id] = "failed"
+        update_task(task_id, "failed", stage="failed", error=str(e))
 
 async def prepare_input(task_id: str, request_data: dict) -> str:
     """Prepare input file for inference"""
-    if request_data.get('file_content'):
-        input_dir = Path(f"storage/{task_id}")
-        input_dir.mkdir(parents=True, exist_ok=True)
-        input_file = input_dir / "input.pdb"
+    if request_data.get('input_file'):
+        # Uploaded files are already in the task's storage
+        return request_data['input_file']
+    elif request_data.get('file_content'):
+        input_file = task_input_path(task_id)
         content = request_data['file_content']
         with open(input_file, 'w') as f:  # Changed to text mode since we decoded in API
             f.write(content)
@@ -66,6 +316,43 @@ async def get_task_status(task_id: str) -> str:
     """Get current status of a task"""
     return tasks.get(task_id, "not_found")
 
+def get_task_info(task_id: str) -> Optional[dict]:
+    """Get status, progress and update counter of a task"""
+    if task_id not in tasks:
+        return None
+    return {
+        "task_id": task_id,
+        "status": tasks[task_id],
+        "version": task_versions.get(task_id, 0),
+        **task_progress.get(task_id, {})
+    }
+
+async def wait_for_task_update(task_id: str, version: int, timeout: float) -> Optional[dict]:
+    """Wait until a task has seen more than `version` updates or the timeout expires,
+    then return the task info (None for unknown tasks)"""
+    deadline = time.monotonic() + timeout
+    while task_id in tasks and task_versions.get(task_id, 0) <= version:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        event = task_updates.setdefault(task_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), remaining)
+        except asyncio.TimeoutError:
+            break
+    return get_task_info(task_id)
+
+async def wait_for_task(task_id: str, timeout: float) -> str:
+    """Wait until a task is finished or the timeout expires, then return its status"""
+    deadline = time.monotonic() + timeout
+    info = get_task_info(task_id)
+    while info is not None and info["status"] not in FINISHED_STATES:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        info = await wait_for_task_update(task_id, info["version"], remaining)
+    return info["status"] if info is not None else "not_found"
+
 def list_tasks() -> list:
     """Get list of all task IDs"""
     return list(tasks.keys())
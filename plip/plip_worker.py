@@ -0,0 +1,273 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from typing import Callable, List, Optional
+
+from plip.basic import instrumentation
+
+logger = logging.getLogger(__name__)
+
+# Limits per task, enforced by killing the worker process running it
+TASK_TIMEOUT = float(os.environ.get("PLIP_TASK_TIMEOUT", 600))  # wall-clock seconds
+TASK_MEMORY_LIMIT = int(os.environ.get("PLIP_TASK_MEMORY_MB", 4096)) * 1024 * 1024  # resident memory in bytes
+# Workers are replaced after this many tasks to cap memory growth (e.g. from OpenBabel)
+MAX_TASKS_PER_WORKER = int(os.environ.get("PLIP_MAX_TASKS_PER_WORKER", 50))
+# How often the parent checks a running task (seconds)
+POLL_INTERVAL = 0.1
+# Modules imported once by the fork server; workers are forked from it with OpenBabel, lxml and
+# the analysis code already loaded and initialized
+PRELOAD = ["plip.basic.preload", "plip.plip_inference"]
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+class TaskTimeout(Exception):
+    """The task exceeded the wall-clock limit"""
+    pass
+
+class TaskOutOfMemory(Exception):
+    """The task exceeded the memory limit or the worker was killed by the system"""
+    pass
+
+class TaskCancelled(Exception):
+    """The task was cancelled while running"""
+    pass
+
+class TaskFailed(Exception):
+    """The analysis raised an error, which the worker reported; the worker can be reused"""
+    pass
+
+class _Forwarder:
+    """Instrumentation listener in the worker process, sending everything to the parent"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def stage(self, name: str, seconds: float):
+        self.conn.send(("stage", name, seconds))
+
+    def event(self, name: str):
+        self.conn.send(("event", name))
+
+    def observe(self, name: str, value: float):
+        self.conn.send(("observe", name, value))
+
+def _worker_main(conn):
+    """Entry point of worker processes: run tasks received over the pipe until None is received"""
+    from plip.plip_inference import PLIPInference
+
+    instrumentation.set_listener(_Forwarder(conn))
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        task_id, input_file, output_format = message
+
+        def progress(stage, current=0, total=0):
+            conn.send(("progress", stage, current, total))
+
+        try:
+            PLIPInference(task_id).analyze(input_file, output_format, progress)
+            conn.send(("done",))
+        except MemoryError:
+            conn.send(("oom", "out of memory"))
+        except Exception as e:
+            conn.send(("error", str(e)))
+
+class WorkerProcess:
+    """Process running analyses one after another, controlled through a pipe"""
+
+    def __init__(self, context, target: Callable = _worker_main):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=target, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.tasks_run = 0
+
+    def is_alive(self) -> bool:
+        return self.process.is_alive()
+
+    def rss(self) -> Optional[int]:
+        """Resident memory of the worker in bytes, None where /proc is not available"""
+        try:
+            with open(f"/proc/{self.process.pid}/statm") as f:
+                return int(f.read().split()[1]) * PAGE_SIZE
+        except (OSError, ValueError, IndexError):
+            return None
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def close(self):
+        """Stop the worker after its current task"""
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+    def run(
+        self,
+        task_id: str,
+        input_file: str,
+        output_format: List[str],
+        progress: Callable[..., None],
+        listener,
+        cancelled: Callable[[], bool],
+        timeout: float,
+        memory_limit: int
+    ):
+        """Run a task in the worker and wait for it, enforcing the limits. Blocks until the task is finished.
+        Raises TaskFailed if the analysis failed, the worker can be reused then. Raises TaskTimeout,
+        TaskOutOfMemory, TaskCancelled or RuntimeError otherwise; the worker must be killed then.
+        The limits are checked after every message, so that a task reporting progress cannot exceed them."""
+        self.tasks_run += 1
+        self.conn.send((task_id, input_file, output_format))
+        deadline = time.monotonic() + timeout
+        while True:
+            if self.conn.poll(POLL_INTERVAL):
+                try:
+                    message = self.conn.recv()
+                except EOFError:
+                    message = None
+                if message is None:
+                    self.process.join(timeout=1)
+                    self._raise_for_exit()
+                kind = message[0]
+                if kind == "done":
+                    return
+                elif kind == "progress":
+                    progress(*message[1:])
+                elif kind == "stage":
+                    listener.stage(*message[1:])
+                elif kind == "event":
+                    listener.event(*message[1:])
+                elif kind == "observe":
+                    listener.observe(*message[1:])
+                elif kind == "oom":
+                    raise TaskOutOfMemory(message[1])
+                elif kind == "error":
+                    raise TaskFailed(message[1])
+            if not self.process.is_alive():
+                self._raise_for_exit()
+            if cancelled():
+                raise TaskCancelled()
+            if time.monotonic() > deadline:
+                raise TaskTimeout(f"Analysis exceeded the time limit of {timeout:g} seconds")
+            rss = self.rss()
+            if memory_limit and rss is not None and rss > memory_limit:
+                raise TaskOutOfMemory(f"Analysis exceeded the memory limit of {memory_limit // 2 ** 20} MB")
+
+    def _raise_for_exit(self):
+        exitcode = self.process.exitcode
+        if exitcode == -9:  # SIGKILL, usually the kernel's OOM killer
+            raise TaskOutOfMemory("Worker was killed, probably out of memory")
+        raise RuntimeError(f"Worker exited unexpectedly with code {exitcode}")
+
+def worker_context():
+    """Multiprocessing context for workers: forked from a fork server with PRELOAD imported where
+    available, never from the API process itself with its event loop and threads"""
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(PRELOAD)
+        return context
+    return multiprocessing.get_context("spawn")
+
+class WorkerPool:
+    """Pool of warm worker processes, reused across tasks. Workers are killed when a task exceeds its limits,
+    is cancelled or the worker exits unexpectedly, and replaced after max_tasks tasks; errors reported by
+    the analysis do not affect the worker. Up to `size` replacements are started right away so that the next
+    task does not wait for one. on_recycle(reason) is called whenever a worker is retired."""
+
+    def __init__(self, size: int = 1, max_tasks: int = MAX_TASKS_PER_WORKER, timeout: float = TASK_TIMEOUT,
+                 memory_limit: int = TASK_MEMORY_LIMIT, on_recycle: Optional[Callable[[str], None]] = None,
+                 target: Callable = _worker_main):
+        self.size = size
+        self.max_tasks = max_tasks
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.on_recycle = on_recycle or (lambda reason: None)
+        self.target = target
+        self.context = worker_context()
+        self.idle: List[WorkerProcess] = []
+        self.busy = 0
+        self.lock = threading.Lock()
+
+    def warm(self):
+        """Start workers until `size` workers are idle or busy (blocking)"""
+        while True:
+            with self.lock:
+                if len(self.idle) + self.busy >= self.size:
+                    return
+                self.busy += 1  # Reserve the slot while the worker starts
+            try:
+                worker = WorkerProcess(self.context, self.target)
+            finally:
+                with self.lock:
+                    self.busy -= 1
+            with self.lock:
+                self.idle.append(worker)
+
+    def acquire(self) -> WorkerProcess:
+        with self.lock:
+            self.busy += 1
+            while self.idle:
+                worker = self.idle.pop()
+                if worker.is_alive():
+                    return worker
+                worker.kill()
+        try:
+            return WorkerProcess(self.context, self.target)
+        except BaseException:
+            with self.lock:
+                self.busy -= 1
+            raise
+
+    def release(self, worker: WorkerProcess):
+        if worker.is_alive() and worker.tasks_run < self.max_tasks:
+            with self.lock:
+                self.busy -= 1
+                self.idle.append(worker)
+            return
+        worker.close()
+        self.retire("max_tasks")
+
+    def retire(self, reason: str):
+        """Account for a worker that was stopped and start its replacement"""
+        with self.lock:
+            self.busy -= 1
+        self.on_recycle(reason)
+        self.warm()
+
+    def run(self, task_id: str, input_file: str, output_format: List[str], progress: Callable[..., None],
+            listener, cancelled: Callable[[], bool] = lambda: False):
+        """Run a task in a worker process (blocking), see WorkerProcess.run"""
+        worker = self.acquire()
+        try:
+            worker.run(task_id, input_file, output_format, progress, listener, cancelled,
+                       self.timeout, self.memory_limit)
+        except TaskFailed:
+            # Reported by the worker, which is still intact
+            self.release(worker)
+            raise
+        except BaseException as e:
+            # The worker may be stuck in or damaged by the task
+            worker.kill()
+            self.retire({TaskTimeout: "timeout", TaskOutOfMemory: "oom",
+                         TaskCancelled: "cancelled"}.get(type(e), "error"))
+            raise
+        self.release(worker)
+
+    def shutdown(self):
+        with self.lock:
+            workers, self.idle = self.idle, []
+        for worker in workers:
+            worker.close()
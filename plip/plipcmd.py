@@ -7,7 +7,6 @@ plipcmd.py - Main script for PLIP command line execution.
 # system imports
 import argparse
 import logging
-import multiprocessing
 import os
 import sys
 import ast
@@ -19,12 +18,9 @@ from plip.basic import config, logger
 logger = logger.get_logger()
 
 from plip.basic.config import __version__
-from plip.basic.parallel import parallel_fn
-from plip.basic.remote import VisualizerData
-from plip.exchange.report import StructureReport
-from plip.exchange.webservices import fetch_pdb
-from plip.structure.preparation import create_folder_if_not_exists, extract_pdbid
-from plip.structure.preparation import tilde_expansion, PDBComplex
+
+# The analysis modules (and with them OpenBabel, lxml, numpy and PyMOL) are imported on first use
+# in the functions below, so that e.g. `plip --help` does not pay for loading them
 
 description = f"The Protein-Ligand Interaction Profiler (PLIP) Version {__version__} " \
               "is a command-line based tool to analyze interactions in a protein-ligand complex. " \
@@ -39,6 +35,58 @@ def threshold_limiter(aparser, arg):
         aparser.error("All thresholds have to be values larger than zero.")
     return arg
 
+def check_thresholds(aparser, thresholds, values):
+    """Checks the given threshold values (by config name), with the current values of all other thresholds.
+    The search space for binding site residues is extended for large distance thresholds."""
+    for t in thresholds:
+        tvalue = values.get(t.name.upper())
+        if tvalue is not None:
+            if t.type == 'angle' and not 0 < tvalue < 180:  # Check value for angle thresholds
+                aparser.error("Threshold for angles need to have values within 0 and 180.")
+            if t.type == 'distance':
+                if tvalue > 10:  # Check value for angle thresholds
+                    aparser.error("Threshold for distances must not be larger than 10 Angstrom.")
+                elif tvalue > config.BS_DIST + 1:  # Dynamically adapt the search space for binding site residues
+                    config.BS_DIST = tvalue + 1
+    values = dict({t.name.upper(): getattr(config, t.name.upper()) for t in thresholds}, **values)
+    # Check additional conditions for interdependent thresholds
+    if not values['HALOGEN_ACC_ANGLE'] > values['HALOGEN_ANGLE_DEV']:
+        aparser.error("The halogen acceptor angle has to be larger than the halogen angle deviation.")
+    if not values['HALOGEN_DON_ANGLE'] > values['HALOGEN_ANGLE_DEV']:
+        aparser.error("The halogen donor angle has to be larger than the halogen angle deviation.")
+    if not values['WATER_BRIDGE_MINDIST'] < values['WATER_BRIDGE_MAXDIST']:
+        aparser.error("The water bridge minimum distance has to be smaller than the water bridge maximum distance.")
+    if not values['WATER_BRIDGE_OMEGA_MIN'] < values['WATER_BRIDGE_OMEGA_MAX']:
+        aparser.error("The water bridge omega minimum angle has to be smaller than the water bridge omega maximum angle")
+
+
+def sweep_settings(aparser, thresholds, path):
+    """Reads the threshold settings of a sweep from a JSON file with a list of objects, e.g.
+    [{"hbond_dist_max": 3.5}, {"hbond_dist_max": 4.5, "hbond_don_angle_min": 90}], and returns them
+    by config name. Thresholds missing in a setting have the values given on the command line."""
+    import json
+    from plip.structure.detection import THRESHOLDS
+    try:
+        with open(path) as f:
+            settings = json.load(f)
+    except (OSError, ValueError) as e:
+        aparser.error(f"Cannot read threshold settings for the sweep: {e}")
+    if not isinstance(settings, list) or not settings or not all(isinstance(s, dict) for s in settings):
+        aparser.error('Threshold settings for the sweep have to be a list of objects, e.g. [{"hbond_dist_max": 3.5}].')
+    sweepable = [t.name for t in thresholds if t.name.upper() in THRESHOLDS]
+    for setting in settings:
+        for name in setting:
+            if name not in sweepable:
+                aparser.error(f"Threshold {name} cannot be varied in a sweep, use one of {', '.join(sweepable)}.")
+    try:
+        settings = [{name.upper(): threshold_limiter(aparser, value) for name, value in s.items()} for s in settings]
+    except (TypeError, ValueError):
+        aparser.error("Threshold values for the sweep have to be numbers.")
+    for setting in settings:
+        check_thresholds(aparser, thresholds, setting)
+    return settings
+
+
 def residue_list(input_string):
     """Parse mix of residue numbers and ranges passed with the --residues flag into one list"""
     result = []
@@ -50,8 +98,67 @@ def residue_list(input_string):
             result.append(int(part))
     return result
 
+# Complex prepared in interface mode, loaded from its snapshot once per worker process (see characterize_interface),
+# by digest of the snapshot, as the paths of temporary snapshots are reused
+prepared_interfaces = {}
+
+
+def characterize_interface(pair, snapshot, digest, outpath):
+    """Characterizes the interface of a receptor chain and a ligand chain (see PDBComplex.characterize_interface)
+    in a worker process, with the complex loaded from the snapshot of the prepared complex once per worker.
+    Returns the reports of the interface."""
+    from plip.exchange.report import BindingSiteReport, BindingSiteReportData
+    from plip.structure.preparation import PDBComplex
+    if digest not in prepared_interfaces:
+        prepared_interfaces.clear()
+        mol = PDBComplex()
+        mol.output_path = outpath
+        mol.load_snapshot(snapshot)
+        prepared_interfaces[digest] = mol
+    mol = prepared_interfaces[digest]
+    receptor, chain = pair
+    ligand = next(ligand for ligand in mol.ligands if ligand.chain == chain)
+    site = mol.characterize_interface(receptor, ligand)
+    return BindingSiteReportData(site, BindingSiteReport(mol.interaction_sets.pop(site)))
+
+
+def process_interfaces(mol, outpath, outputprefix='report'):
+    """Characterizes the interfaces of all chains in contact in a complex prepared in interface mode and returns
+    the report for all of them. With several threads, the interfaces are characterized in parallel by workers
+    loading a snapshot of the prepared complex."""
+    import hashlib
+    import tempfile
+    from plip.exchange.report import StructureReport
+    interfaces = mol.interfaces()
+    logger.info(f'{len(interfaces)} interface(s) between chains in contact')
+    threads = min(config.MAXTHREADS, len(interfaces))
+    if threads > 1:
+        from plip.basic.parallel import parallel_fn
+        logger.info(f'characterizing interfaces in parallel on {threads} cores')
+        handle, snapshot = tempfile.mkstemp(suffix=config.SNAPSHOT_SUFFIX)
+        os.close(handle)
+        try:
+            mol.save_snapshot(snapshot)
+            with open(snapshot, 'rb') as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+            parfn = parallel_fn(characterize_interface)
+            reports = parfn([(receptor, ligand.chain) for receptor, ligand in interfaces], processes=threads,
+                            snapshot=snapshot, digest=digest, outpath=outpath)
+        finally:
+            os.remove(snapshot)
+        # Same order as the interaction sets in the report of the complex
+        return StructureReport(mol, outputprefix=outputprefix,
+                               bindingsite_reports=sorted(reports, key=lambda report: report.site))
+    for receptor, ligand in interfaces:
+        mol.characterize_interface(receptor, ligand)
+    return StructureReport(mol, outputprefix=outputprefix)
+
+
 def process_pdb(pdbfile, outpath, as_string=False, outputprefix='report'):
     """Analysis of a single PDB file with optional chain filtering."""
+    from plip.basic.supplemental import create_folder_if_not_exists
+    from plip.exchange.report import StructureReport
+    from plip.structure.preparation import PDBComplex
     if not as_string:
         pdb_file_name = pdbfile.split('/')[-1]
         startmessage = f'starting analysis of {pdb_file_name}'
@@ -60,29 +167,60 @@ def process_pdb(pdbfile, outpath, as_string=False, outputprefix='report'):
     logger.info(startmessage)
     mol = PDBComplex()
     mol.output_path = outpath
-    mol.load_pdb(pdbfile, as_string=as_string)
-    for ligand in mol.ligands:
-        mol.characterize_complex(ligand)
+    if not as_string and pdbfile.endswith(config.SNAPSHOT_SUFFIX):
+        mol.load_snapshot(pdbfile)  # Complex prepared before, saved with --snapshot
+    else:
+        mol.load_pdb(pdbfile, as_string=as_string)
+    if config.SWEEP:
+        sweep = mol.sweep_thresholds(config.SWEEP)
+    elif not config.INTERFACES:  # Interfaces are characterized after saving the snapshot (see process_interfaces)
+        for ligand in mol.ligands:
+            mol.characterize_complex(ligand)
 
     create_folder_if_not_exists(outpath)
+    if config.SNAPSHOT and (as_string or not pdbfile.endswith(config.SNAPSHOT_SUFFIX)):
+        basename = pdbfile.split('/')[-1].split('.')[0] if not as_string else 'from_stdin'
+        mol.save_snapshot(os.path.join(outpath, basename + config.SNAPSHOT_SUFFIX))
+
+    if config.SWEEP:  # Only the reports for each setting of the threshold sweep
+        for i, interaction_sets in enumerate(sweep, 1):
+            mol.interaction_sets = interaction_sets
+            streport = StructureReport(mol, outputprefix=f'{outputprefix}_sweep{i}')
+            if config.XML:
+                streport.write_xml(as_string=config.STDOUT)
+            if config.TXT:
+                streport.write_txt(as_string=config.STDOUT)
+        return
+
+    if config.INTERFACES:  # Only the report for all interfaces
+        streport = process_interfaces(mol, outpath, outputprefix=outputprefix)
+        if config.XML:
+            streport.write_xml(as_string=config.STDOUT)
+        if config.TXT:
+            streport.write_txt(as_string=config.STDOUT)
+        return
 
     # Generate the report files
     streport = StructureReport(mol, outputprefix=outputprefix)
 
-    config.MAXTHREADS = min(config.MAXTHREADS, len(mol.interaction_sets))
+    # Not stored in the config, so that later structures of a batch still use all render workers
+    threads = min(config.MAXTHREADS, len(mol.interaction_sets))
 
     ######################################
     # PyMOL Visualization (parallelized) #
     ######################################
 
     if config.PYMOL or config.PICS:
-        from plip.visualization.visualize import visualize_in_pymol
+        from plip.basic.parallel import parallel_fn
+        from plip.basic.remote import VisualizerData
+        from plip.visualization.visualize import initialize_renderer, visualize_in_pymol
         complexes = [VisualizerData(mol, site) for site in sorted(mol.interaction_sets)
                      if not len(mol.interaction_sets[site].interacting_res) == 0]
-        if config.MAXTHREADS > 1:
-            logger.info(f'generating visualizations in parallel on {config.MAXTHREADS} cores')
-            parfn = parallel_fn(visualize_in_pymol)
-            parfn(complexes, processes=config.MAXTHREADS)
+        if threads > 1:
+            logger.info(f'generating visualizations in parallel on {threads} cores')
+            # Render workers start PyMOL once and are reused for all structures
+            parfn = parallel_fn(visualize_in_pymol, initializer=initialize_renderer)
+            parfn(complexes, processes=threads)
         else:
             [visualize_in_pymol(plcomplex) for plcomplex in complexes]
 
@@ -97,6 +235,8 @@ def download_structure(inputpdbid):
     """Given a PDB ID, downloads the corresponding PDB structure.
     Checks for validity of ID and handles error while downloading.
     Returns the path of the downloaded file."""
+    from plip.basic.supplemental import create_folder_if_not_exists, extract_pdbid, tilde_expansion
+    from plip.exchange.webservices import fetch_pdb, PDBFetchError
     try:
         if len(inputpdbid) != 4 or extract_pdbid(inputpdbid.lower()) == 'UnknownProtein':
             logger.error(f'invalid PDB-ID (wrong format): {inputpdbid}')
@@ -112,6 +252,9 @@ def download_structure(inputpdbid):
     except ValueError:  # Invalid PDB ID, cannot fetch from RCBS server
         logger.error(f'PDB-ID does not exist: {inputpdbid}')
         sys.exit(1)
+    except PDBFetchError as e:
+        logger.error(str(e))
+        sys.exit(1)
 
 
 def remove_duplicates(slist):
@@ -154,7 +297,10 @@ def run_analysis(inputstructs, inputpdbids, chains=None):
                     logger.error('empty PDB file')
                     sys.exit(1)
                 if num_structures > 1:
-                    basename = inputstruct.split('.')[-2].split('/')[-1]
+                    if inputstruct.endswith(config.SNAPSHOT_SUFFIX):
+                        basename = inputstruct[:-len(config.SNAPSHOT_SUFFIX)].split('/')[-1]
+                    else:
+                        basename = inputstruct.split('.')[-2].split('/')[-1]
                     config.OUTPATH = '/'.join([config.BASEPATH, basename])
                     output_prefix = 'report'
             process_pdb(inputstruct, config.OUTPATH, as_string=read_from_stdin, outputprefix=output_prefix)
@@ -199,7 +345,7 @@ def main():
                         action="store_true")
     parser.add_argument("-y", "--pymol", dest="pymol", default=False, help="Additional PyMOL session files",
                         action="store_true")
-    parser.add_argument("--maxthreads", dest="maxthreads", default=multiprocessing.cpu_count(),
+    parser.add_argument("--maxthreads", dest="maxthreads", default=os.cpu_count(),
                         help="Set maximum number of main threads (number of binding sites processed simultaneously)."
                              "If not set, PLIP uses all available CPUs if possible.",
                         type=int)
@@ -228,6 +374,13 @@ def main():
                             help="Allows to define one or multiple chains as peptide ligands or to detect inter-chain contacts",
                             nargs="+")
     ligandtype.add_argument("--intra", dest="intra", help="Allows to define one chain to analyze intra-chain contacts.")
+    ligandtype.add_argument("--interfaces", dest="interfaces", default=False,
+                            help="Detect the interactions at the interfaces of all pairs of chains in contact in one "
+                                 "run, with the chain appearing later as ligand, and write one report for all of them.",
+                            action="store_true")
+    parser.add_argument("--blocks", dest="blocks", default=None, type=int,
+                        help="Compare chains analyzed with --peptides or --intra in blocks of this number of residues, "
+                             "only with the blocks in reach, to keep run time and memory low for large chains.")
     parser.add_argument("--residues", dest="residues", default=[], nargs="+",
                         help="""Allows to specify which residues of the chain(s) should be considered as peptide ligands.
                         Give single residues (separated with comma) or ranges (with dash) or both, for several chains separate selections with one space""")
@@ -237,6 +390,23 @@ def main():
     parser.add_argument("--nohydro", dest="nohydro", default=False,
                         help="Do not add polar hydrogens in case your structure already contains hydrogens.",
                         action="store_true")
+    parser.add_argument("--pdbmirror", dest="pdbmirror", default=None,
+                        help="Read structures for PDB IDs from a local PDB mirror (divided layout, e.g. vs/pdb1vsn.ent.gz) before downloading them.")
+    parser.add_argument("--pdbcache", dest="pdbcache", default=None,
+                        help="Cache structures downloaded for PDB IDs in this directory.")
+    parser.add_argument("--snapshotcache", dest="snapshotcache", default=None,
+                        help="Cache read and protonated structures in this directory, so that they are not prepared again for identical input.")
+    parser.add_argument("--snapshot", dest="snapshot", default=False,
+                        help="Save the prepared complex to <name>.plip.npz in the output folder. Snapshots are accepted as input files to analyze the complex again (e.g. with other thresholds) without preparing it.",
+                        action="store_true")
+    parser.add_argument("--protonated", dest="protonated", default=False,
+                        help="Write the protonated structure to <name>_protonated.pdb in the output folder.",
+                        action="store_true")
+    parser.add_argument("--sweep", dest="sweep", default=None,
+                        help="Analyze the structure with each of the threshold settings in this JSON file, e.g. "
+                             "[{\"hbond_dist_max\": 3.5}, {\"hbond_dist_max\": 4.5}], and write the reports of "
+                             "setting i to <name>_sweep<i>. Interactions are detected once and selected for "
+                             "each setting.")
     parser.add_argument("--model", dest="model", default=1, type=int,
                         help="Model number to be used for multi-model structures.")
     # Optional threshold arguments, not shown in help
@@ -262,11 +432,19 @@ def main():
 
 
     arguments = parser.parse_args()
+    from plip.basic.supplemental import tilde_expansion
     # make sure, residues is only used together with --inter (could be expanded to --intra in the future)
     if arguments.residues and not (arguments.peptides or arguments.intra):
         parser.error("The --residues option requires specification of a chain with --inter or --peptide")
     if arguments.residues and len(arguments.residues)!=len(arguments.peptides):
         parser.error("Please provide residue numbers or ranges for each chain specified. Separate selections with a single space.")
+    if arguments.blocks is not None and not (arguments.peptides or arguments.intra or arguments.interfaces):
+        parser.error("The --blocks option requires specification of a chain with --inter, --peptides or --intra, "
+                     "or --interfaces")
+    if arguments.interfaces and (arguments.chains or arguments.sweep is not None):
+        parser.error("The --interfaces option can not be combined with --chains or --sweep")
+    if arguments.blocks is not None and arguments.blocks < 1:
+        parser.error("The --blocks option requires a positive number of residues")
     # configure log levels
     config.VERBOSE = True if arguments.verbose else False
     config.QUIET = True if arguments.quiet else False
@@ -295,14 +473,22 @@ def main():
     config.PEPTIDES = arguments.peptides
     config.RESIDUES = dict(zip(arguments.peptides, map(residue_list, arguments.residues)))
     config.INTRA = arguments.intra
+    # Chains are always compared in blocks in interface mode, so that run time grows with the contacts
+    config.BLOCKS = config.INTERFACE_BLOCKS if arguments.interfaces and arguments.blocks is None else arguments.blocks
     config.NOFIX = arguments.nofix
     config.NOFIXFILE = arguments.nofixfile
-    config.NOPDBCANMAP = bool(arguments.nopdbcanmap or config.INTRA or config.PEPTIDES)
+    config.INTERFACES = arguments.interfaces
+    config.NOPDBCANMAP = bool(arguments.nopdbcanmap or config.INTRA or config.PEPTIDES or config.INTERFACES)
     config.KEEPMOD = arguments.keepmod
     config.DNARECEPTOR = arguments.dnareceptor
     config.OUTPUTFILENAME = arguments.outputfilename
     config.NOHYDRO = arguments.nohydro
     config.MODEL = arguments.model
+    config.PDB_MIRROR = tilde_expansion(arguments.pdbmirror) if arguments.pdbmirror is not None else None
+    config.PDB_CACHE = tilde_expansion(arguments.pdbcache) if arguments.pdbcache is not None else None
+    config.SNAPSHOT_CACHE = tilde_expansion(arguments.snapshotcache) if arguments.snapshotcache is not None else None
+    config.PROTONATED = arguments.protonated
+    config.SNAPSHOT = arguments.snapshot
 
     try:
         # add inner quotes for python backend
@@ -327,26 +513,11 @@ def main():
             logger.error('PyMOL is required for the --pics and --pymol option')
             sys.exit(1)
     # Assign values to global thresholds
-    for t in thresholds:
-        tvalue = getattr(arguments, t.name)
-        if tvalue is not None:
-            if t.type == 'angle' and not 0 < tvalue < 180:  # Check value for angle thresholds
-                parser.error("Threshold for angles need to have values within 0 and 180.")
-            if t.type == 'distance':
-                if tvalue > 10:  # Check value for angle thresholds
-                    parser.error("Threshold for distances must not be larger than 10 Angstrom.")
-                elif tvalue > config.BS_DIST + 1:  # Dynamically adapt the search space for binding site residues
-                    config.BS_DIST = tvalue + 1
-            setattr(config, t.name.upper(), tvalue)
-    # Check additional conditions for interdependent thresholds
-    if not config.HALOGEN_ACC_ANGLE > config.HALOGEN_ANGLE_DEV:
-        parser.error("The halogen acceptor angle has to be larger than the halogen angle deviation.")
-    if not config.HALOGEN_DON_ANGLE > config.HALOGEN_ANGLE_DEV:
-        parser.error("The halogen donor angle has to be larger than the halogen angle deviation.")
-    if not config.WATER_BRIDGE_MINDIST < config.WATER_BRIDGE_MAXDIST:
-        parser.error("The water bridge minimum distance has to be smaller than the water bridge maximum distance.")
-    if not config.WATER_BRIDGE_OMEGA_MIN < config.WATER_BRIDGE_OMEGA_MAX:
-        parser.error("The water bridge omega minimum angle has to be smaller than the water bridge omega maximum angle")
+    values = {t.name.upper(): getattr(arguments, t.name) for t in thresholds if getattr(arguments, t.name) is not None}
+    check_thresholds(parser, thresholds, values)
+    for name, value in values.items():
+        setattr(config, name, value)
+    config.SWEEP = sweep_settings(parser, thresholds, arguments.sweep) if arguments.sweep is not None else None
     expanded_path = tilde_expansion(arguments.input) if arguments.input is not None else None
     run_analysis(expanded_path, arguments.pdbid)  # Start main script
 
@@ -6,41 +6,50 @@ import numpy as np
 from openbabel.openbabel import OBAtomAtomIter
 
 from plip.basic import config, logger
+from plip.basic.instrumentation import timed
 from plip.basic.supplemental import vecangle, vector, euclidean3d, projection
 from plip.basic.supplemental import whichresnumber, whichrestype, whichchain
 
 logger = logger.get_logger()
 
-def filter_contacts(pairings):
+def filter_contacts(pairings, seen=None):
     """Filter interactions by two criteria:
     1. No interactions between the same residue (important for intra mode).
-    2. No duplicate interactions (A with B and B with A, also important for intra mode)."""
+    2. No duplicate interactions (A with B and B with A, also important for intra mode).
+    Interactions detected in several parts are filtered across the parts when passing the same set of `seen`
+    interactions (see contact_key) for each."""
     if not config.INTRA:
         return pairings
-    filtered1_pairings = [p for p in pairings if (p.resnr, p.reschain) != (p.resnr_l, p.reschain_l)]
-    already_considered = []
-    filtered2_pairings = []
-    for contact in filtered1_pairings:
+    already_considered = set() if seen is None else seen
+    filtered_pairings = []
+    for contact in pairings:
+        if (contact.resnr, contact.reschain) == (contact.resnr_l, contact.reschain_l):
+            continue
+        key = contact_key(contact)
+        if key not in already_considered:
+            filtered_pairings.append(contact)
+            already_considered.add(key)
+    return filtered_pairings
+
+
+def contact_key(contact):
+    """Both residues and the distance of an interaction, regardless of which residue is seen as ligand."""
+    try:
+        dist = 'D{}'.format(round(contact.distance, 2))
+    except AttributeError:
         try:
-            dist = 'D{}'.format(round(contact.distance, 2))
+            dist = 'D{}'.format(round(contact.distance_ah, 2))
         except AttributeError:
-            try:
-                dist = 'D{}'.format(round(contact.distance_ah, 2))
-            except AttributeError:
-                dist = 'D{}'.format(round(contact.distance_aw, 2))
-        res1, res2 = ''.join([str(contact.resnr), contact.reschain]), ''.join(
-            [str(contact.resnr_l), contact.reschain_l])
-        data = {res1, res2, dist}
-        if data not in already_considered:
-            filtered2_pairings.append(contact)
-            already_considered.append(data)
-    return filtered2_pairings
+            dist = 'D{}'.format(round(contact.distance_aw, 2))
+    res1, res2 = ''.join([str(contact.resnr), contact.reschain]), ''.join([str(contact.resnr_l), contact.reschain_l])
+    return frozenset([res1, res2, dist])
 
 
 ##################################################
 # FUNCTIONS FOR DETECTION OF SPECIFIC INTERACTIONS
 ##################################################
 
+@timed('detect.hydrophobic')
 def hydrophobic_interactions(atom_set_a, atom_set_b):
     """Detection of hydrophobic pliprofiler between atom_set_a (binding site) and atom_set_b (ligand).
     Definition: All pairs of qualified carbon atoms within a distance of HYDROPH_DIST_MAX
@@ -64,6 +73,7 @@ def hydrophobic_interactions(atom_set_a, atom_set_b):
     return filter_contacts(pairings)
 
 
+@timed('detect.hbonds')
 def hbonds(acceptors, donor_pairs, protisdon, typ):
     """Detection of hydrogen bonds between sets of acceptors and donor pairs.
     Definition: All pairs of hydrogen bond acceptor and donors with
@@ -111,6 +121,7 @@ def hbonds(acceptors, donor_pairs, protisdon, typ):
     return filter_contacts(pairings)
 
 
+@timed('detect.pistacking')
 def pistacking(rings_bs, rings_lig):
     """Return all pi-stackings between the given aromatic ring systems in receptor and ligand."""
     data = namedtuple(
@@ -151,6 +162,7 @@ def pistacking(rings_bs, rings_lig):
     return filter_contacts(pairings)
 
 
+@timed('detect.pication')
 def pication(rings, pos_charged, protcharged):
     """Return all pi-Cation interaction between aromatic rings and positively charged groups.
     For tertiary and quaternary amines, check also the angle between the ring and the nitrogen.
@@ -203,6 +215,7 @@ def pication(rings, pos_charged, protcharged):
     return filter_contacts(pairings)
 
 
+@timed('detect.saltbridge')
 def saltbridge(poscenter, negcenter, protispos):
     """Detect all salt bridges (pliprofiler between centers of positive and negative charge)"""
     data = namedtuple(
@@ -224,6 +237,7 @@ def saltbridge(poscenter, negcenter, protispos):
     return filter_contacts(pairings)
 
 
+@timed('detect.halogen')
 def halogen(acceptor, donor):
     """Detect all halogen bonds of the type Y-O...X-C"""
     data = namedtuple('halogenbond', 'acc acc_orig_idx don don_orig_idx distance don_angle acc_angle restype '
@@ -255,6 +269,7 @@ def halogen(acceptor, donor):
     return filter_contacts(pairings)
 
 
+@timed('detect.water_bridges')
 def water_bridges(bs_hba, lig_hba, bs_hbd, lig_hbd, water):
     """Find water-bridged hydrogen bonds between ligand and protein. For now only considers bridged of first degree."""
     data = namedtuple('waterbridge', 'a a_orig_idx atype d d_orig_idx dtype h water water_orig_idx distance_aw '
@@ -325,6 +340,7 @@ def water_bridges(bs_hba, lig_hba, bs_hbd, lig_hbd, water):
     return filter_contacts(pairings)
 
 
+@timed('detect.metal_complexation')
 def metal_complexation(metals, metal_binding_lig, metal_binding_bs):
     """Find all metal complexes between metals and appropriate groups in both protein and ligand, as well as water"""
     data = namedtuple('metal_complex', 'metal metal_orig_idx metal_type target target_orig_idx target_type '
@@ -477,3 +493,69 @@ def metal_complexation(metals, metal_binding_lig, metal_binding_bs):
                                    resnr_l=resnr_l, restype_l=restype_l, reschain_l=reschain_l)
                     pairings.append(contact)
     return filter_contacts(pairings)
+
+
+##########################################################
+# SELECTION OF INTERACTIONS DETECTED WITH LOOSER THRESHOLDS
+##########################################################
+
+# Thresholds of the detection functions, as upper ('max') or lower ('min') bounds of distances and angles.
+# The optimal halogen bond angles are the centers ('center') of windows of HALOGEN_ANGLE_DEV instead.
+THRESHOLDS = {'MIN_DIST': 'min', 'HYDROPH_DIST_MAX': 'max', 'HBOND_DIST_MAX': 'max', 'HBOND_DON_ANGLE_MIN': 'min',
+              'PISTACK_DIST_MAX': 'max', 'PISTACK_ANG_DEV': 'max', 'PISTACK_OFFSET_MAX': 'max',
+              'PICATION_DIST_MAX': 'max', 'SALTBRIDGE_DIST_MAX': 'max', 'HALOGEN_DIST_MAX': 'max',
+              'HALOGEN_ACC_ANGLE': 'center', 'HALOGEN_DON_ANGLE': 'center', 'HALOGEN_ANGLE_DEV': 'max',
+              'WATER_BRIDGE_MINDIST': 'min', 'WATER_BRIDGE_MAXDIST': 'max', 'WATER_BRIDGE_OMEGA_MIN': 'min',
+              'WATER_BRIDGE_OMEGA_MAX': 'max', 'WATER_BRIDGE_THETA_MIN': 'min', 'METAL_DIST_MAX': 'max'}
+
+
+def loosest_thresholds(settings):
+    """Returns the thresholds with which all interactions are detected that are detected with any of the settings,
+    given as dicts of thresholds by config name. Thresholds missing in a setting have their current values."""
+    settings = [dict({name: getattr(config, name) for name in THRESHOLDS}, **setting) for setting in settings]
+    loosest = {}
+    for name, bound in THRESHOLDS.items():
+        values = [setting[name] for setting in settings]
+        loosest[name] = max(values) if bound == 'max' else min(values) if bound == 'min' else values[0]
+    # Widen the halogen bond angle windows around the first optimal angles to cover the windows of all settings
+    loosest['HALOGEN_ANGLE_DEV'] = max(abs(setting[name] - loosest[name]) + setting['HALOGEN_ANGLE_DEV']
+                                       for setting in settings for name in ('HALOGEN_ACC_ANGLE', 'HALOGEN_DON_ANGLE'))
+    return loosest
+
+
+def select_interactions(candidates):
+    """Selects the interactions within the current thresholds from the candidates detected with looser thresholds,
+    by the same criteria as the detection functions. The candidates are the lists of interactions returned by
+    saltbridge, hbonds, pistacking, hydrophobic_interactions, halogen and water_bridges, by name."""
+    selected = {}
+    for name in ('saltbridge_lneg', 'saltbridge_pneg'):
+        selected[name] = [sb for sb in candidates[name] if config.MIN_DIST < sb.distance < config.SALTBRIDGE_DIST_MAX]
+    for name in ('all_hbonds_ldon', 'all_hbonds_pdon'):
+        selected[name] = [hbond for hbond in candidates[name]
+                          if config.MIN_DIST < hbond.distance_ad < config.HBOND_DIST_MAX
+                          and hbond.angle > config.HBOND_DON_ANGLE_MIN]
+    selected['pistacking'] = []
+    for stack in candidates['pistacking']:
+        if not config.MIN_DIST < stack.distance < config.PISTACK_DIST_MAX \
+                or not stack.offset < config.PISTACK_OFFSET_MAX:
+            continue
+        # The type depends on the angle deviation allowed, perpendicular (T) takes precedence as in pistacking
+        if 90 - config.PISTACK_ANG_DEV < stack.angle < 90 + config.PISTACK_ANG_DEV:
+            selected['pistacking'].append(stack._replace(type='T'))
+        elif 0 < stack.angle < config.PISTACK_ANG_DEV:
+            selected['pistacking'].append(stack._replace(type='P'))
+    selected['all_hydrophobic_contacts'] = [h for h in candidates['all_hydrophobic_contacts']
+                                            if config.MIN_DIST < h.distance < config.HYDROPH_DIST_MAX]
+    selected['halogen_bonds'] = [
+        hal for hal in candidates['halogen_bonds'] if config.MIN_DIST < hal.distance < config.HALOGEN_DIST_MAX
+        and config.HALOGEN_ACC_ANGLE - config.HALOGEN_ANGLE_DEV < hal.acc_angle
+        < config.HALOGEN_ACC_ANGLE + config.HALOGEN_ANGLE_DEV
+        and config.HALOGEN_DON_ANGLE - config.HALOGEN_ANGLE_DEV < hal.don_angle
+        < config.HALOGEN_DON_ANGLE + config.HALOGEN_ANGLE_DEV]
+    selected['all_water_bridges'] = [
+        wb for wb in candidates['all_water_bridges']
+        if config.WATER_BRIDGE_MINDIST <= wb.distance_aw <= config.WATER_BRIDGE_MAXDIST
+        and config.WATER_BRIDGE_MINDIST <= wb.distance_dw <= config.WATER_BRIDGE_MAXDIST
+        and wb.d_angle > config.WATER_BRIDGE_THETA_MIN
+        and config.WATER_BRIDGE_OMEGA_MIN < wb.w_angle < config.WATER_BRIDGE_OMEGA_MAX]
+    return selected
@@ -0,0 +1,197 @@
+"""
+Protein-Ligand Interaction Profiler - Analyze and visualize protein-ligand interactions in PDB files.
+interface.py - Detection of interactions within and between chains block by block, in bounded memory, and of
+the chains in contact.
+"""
+
+import itertools
+from collections import defaultdict
+
+import numpy as np
+from openbabel import pybel
+
+from plip.basic import config, logger
+from plip.basic.supplemental import whichchain, whichresnumber, whichrestype
+from plip.structure.detection import filter_contacts, halogen, hbonds, hydrophobic_interactions, metal_complexation
+from plip.structure.detection import pication, pistacking, saltbridge, water_bridges
+
+logger = logger.get_logger()
+
+# Interactions detected by PLInteraction.detect, in the order of detection
+INTERACTION_TYPES = ['saltbridge_lneg', 'saltbridge_pneg', 'all_hbonds_ldon', 'all_hbonds_pdon', 'pistacking',
+                     'all_hydrophobic_contacts', 'halogen_bonds', 'all_water_bridges', 'all_pication_laro',
+                     'all_pication_paro', 'metal_complexes']
+
+# Fields of the feature namedtuples of Mol holding the atom at which the feature is located (hydrophobic atoms,
+# hydrogen bond acceptors and donors, halogen bond acceptors and donors, water)
+LOCATION_FIELDS = ['atom', 'a', 'd', 'o', 'x', 'oxy']
+
+
+def locate(feature):
+    """Returns the index of the OpenBabel residue and the position of a feature. Features are atoms, namedtuples
+    with an atom (see LOCATION_FIELDS) or groups of atoms with a center, i.e. aromatic rings and charged groups."""
+    fields = getattr(feature, '_fields', ())
+    if 'center' in fields:
+        atom, position = feature.atoms[0], feature.center
+    else:
+        atom = next((getattr(feature, field) for field in LOCATION_FIELDS if field in fields), feature)
+        position = atom.coords
+    residue = atom.OBAtom.GetResidue()
+    return residue.GetIdx() if residue is not None else -1, position
+
+
+def runs(features, size):
+    """Splits features into runs of consecutive features from the same block of `size` residues. Yields each run
+    with the center and radius of its bounding sphere."""
+    located = [(locate(feature), feature) for feature in features]
+    for _, run in itertools.groupby(located, key=lambda item: item[0][0] // size):
+        run = list(run)
+        positions = np.array([position for (_, position), _ in run], dtype=float)
+        center = positions.mean(axis=0)
+        yield [feature for _, feature in run], center, np.sqrt(((positions - center) ** 2).sum(axis=1)).max()
+
+
+class BlockIndex:
+    """Spatial index of features tiled into blocks of `size` consecutive residues. The bounding spheres of the blocks
+    are put in a grid, to find the features of all blocks within `cutoff` of a sphere by looking at the neighboring
+    cells only."""
+
+    def __init__(self, features, size, cutoff):
+        self.features = features
+        self.cutoff = cutoff
+        blocks = defaultdict(list)
+        positions = []
+        for i, feature in enumerate(features):
+            residue, position = locate(feature)
+            blocks[residue // size].append(i)
+            positions.append(position)
+        positions = np.array(positions, dtype=float).reshape(-1, 3)
+        self.members = [np.array(members) for members in blocks.values()]
+        self.centers = np.array([positions[members].mean(axis=0) for members in self.members]).reshape(-1, 3)
+        self.radii = np.array([np.sqrt(((positions[members] - center) ** 2).sum(axis=1)).max()
+                               for members, center in zip(self.members, self.centers)])
+        self.max_radius = self.radii.max(initial=0.0)
+        self.cellsize = self.max_radius + cutoff + 1.0
+        self.grid = defaultdict(list)
+        for block, cell in enumerate(np.floor(self.centers / self.cellsize).astype(int).tolist()):
+            self.grid[tuple(cell)].append(block)
+
+    def near(self, center, radius):
+        """Features of the blocks which may be within the cutoff of the sphere, in their original order."""
+        reach = radius + self.cutoff + self.max_radius
+        low = np.floor((center - reach) / self.cellsize).astype(int).tolist()
+        high = np.floor((center + reach) / self.cellsize).astype(int).tolist()
+        blocks = [block for cell in itertools.product(*[range(l, h + 1) for l, h in zip(low, high)])
+                  for block in self.grid.get(cell, ())]
+        blocks = [block for block in blocks if np.sqrt(((self.centers[block] - center) ** 2).sum())
+                  <= radius + self.cutoff + self.radii[block]]
+        if not blocks:
+            return []
+        return [self.features[i] for i in np.sort(np.concatenate([self.members[block] for block in blocks]))]
+
+
+def detect_by_blocks(ligand, bindingsite, size):
+    """Detects the interactions between a ligand and its binding site like PLInteraction.detect, for chains as ligands
+    (intra-chain and peptide mode). Instead of comparing all features of the ligand and the binding site, each run of
+    features from a block of `size` residues is only compared with the features in blocks within reach (see
+    BlockIndex). Yields the interaction type and the interactions found for each run as soon as they are detected,
+    with duplicates removed across all blocks. The interactions of each type are the same and in the same order
+    as from PLInteraction.detect."""
+    passes = [
+        ('saltbridge_lneg', saltbridge, bindingsite.get_pos_charged(), ligand.get_neg_charged(),
+         config.SALTBRIDGE_DIST_MAX, [True]),
+        ('saltbridge_pneg', saltbridge, ligand.get_pos_charged(), bindingsite.get_neg_charged(),
+         config.SALTBRIDGE_DIST_MAX, [False]),
+        ('all_hbonds_ldon', hbonds, bindingsite.get_hba(), ligand.get_hbd(), config.HBOND_DIST_MAX, [False, 'strong']),
+        ('all_hbonds_pdon', hbonds, ligand.get_hba(), bindingsite.get_hbd(), config.HBOND_DIST_MAX, [True, 'strong']),
+        ('pistacking', pistacking, bindingsite.rings, ligand.rings, config.PISTACK_DIST_MAX, []),
+        ('all_hydrophobic_contacts', hydrophobic_interactions, bindingsite.get_hydrophobic_atoms(),
+         ligand.get_hydrophobic_atoms(), config.HYDROPH_DIST_MAX, []),
+        ('halogen_bonds', halogen, bindingsite.halogenbond_acc, ligand.halogenbond_don, config.HALOGEN_DIST_MAX, [])]
+    for name, detector, outer, inner, cutoff, arguments in passes:
+        seen = set()  # Interactions already found in other blocks (only used in intra-chain mode)
+        index = BlockIndex(inner, size, cutoff)
+        for run, center, radius in runs(outer, size):
+            yield name, filter_contacts(detector(run, index.near(center, radius), *arguments), seen)
+
+    # Water bridges are detected around each water molecule, first with the protein as donor, then with the ligand
+    seen = set()
+    cutoff = config.WATER_BRIDGE_MAXDIST
+    passes = [(BlockIndex(ligand.get_hba(), size, cutoff), BlockIndex(bindingsite.get_hbd(), size, cutoff), True),
+              (BlockIndex(bindingsite.get_hba(), size, cutoff), BlockIndex(ligand.get_hbd(), size, cutoff), False)]
+    for acceptors, donors, protisdon in passes:
+        for water, center, radius in runs(ligand.water, 1):
+            near_acceptors, near_donors = acceptors.near(center, radius), donors.near(center, radius)
+            if protisdon:
+                contacts = water_bridges([], near_acceptors, near_donors, [], water)
+            else:
+                contacts = water_bridges(near_acceptors, [], [], near_donors, water)
+            yield 'all_water_bridges', filter_contacts(contacts, seen)
+
+    passes = [('all_pication_laro', ligand.rings, bindingsite.get_pos_charged(), True),
+              ('all_pication_paro', bindingsite.rings, ligand.get_pos_charged(), False)]
+    for name, rings, charged, protcharged in passes:
+        seen = set()
+        index = BlockIndex(charged, size, config.PICATION_DIST_MAX)
+        for run, center, radius in runs(rings, size):
+            yield name, filter_contacts(pication(run, index.near(center, radius), protcharged), seen)
+    # Few metals and binding partners, so all of them are compared
+    yield 'metal_complexes', metal_complexation(ligand.metals, ligand.metal_binding, bindingsite.metal_binding)
+
+
+def binding_site_by_blocks(bs_atoms, lig_atoms, size):
+    """Selects the binding site atoms within BS_DIST of the ligand and the minimal distances of the binding site
+    residues to the ligand like PDBComplex.characterize_complex, comparing the atoms of each block of residues with
+    the ligand atoms in blocks within reach only (see BlockIndex)."""
+    index = BlockIndex(lig_atoms, size, config.BS_DIST)
+    bs_atoms_refined, min_dist = [], {}
+    for run, center, radius in runs(bs_atoms, size):
+        near = index.near(center, radius)
+        if not near:
+            continue
+        coords = np.array([atom.coords for atom in near])
+        for r in run:
+            # Same operations as euclidean3d
+            d = coords - r.coords
+            distance = np.sqrt(d[:, 0] ** 2 + d[:, 1] ** 2 + d[:, 2] ** 2).min()
+            if distance <= config.BS_DIST:
+                bs_res_id = ''.join([str(whichresnumber(r)), whichchain(r)])
+                if bs_res_id not in min_dist or min_dist[bs_res_id][0] > distance:
+                    min_dist[bs_res_id] = (distance, whichrestype(r))
+                bs_atoms_refined.append(r)
+    logger.debug(f'binding site atoms selected in {len(bs_atoms_refined)} blocks of {size} residues')
+    return bs_atoms_refined, min_dist
+
+
+def contacting_chains(residues, cutoff):
+    """Returns the pairs of chains with residues within `cutoff` of each other, in order of appearance of the chains.
+    Residues are compared coarsely as spheres around their centroids, only with the residues in the neighboring cells
+    of a grid, so that chains are in contact if atoms of them may be within the cutoff."""
+    chains, centers, radii = [], [], []
+    for res in residues:
+        coords = np.array([(atom.x(), atom.y(), atom.z()) for atom in pybel.ob.OBResidueAtomIter(res)]).reshape(-1, 3)
+        if len(coords) == 0:
+            continue
+        center = coords.mean(axis=0)
+        chains.append(res.GetChain())
+        centers.append(center)
+        radii.append(np.sqrt(((coords - center) ** 2).sum(axis=1)).max())
+    order = {chain: i for i, chain in enumerate(dict.fromkeys(chains))}
+    centers, radii = np.array(centers).reshape(-1, 3), np.array(radii)
+    cellsize = 2 * radii.max(initial=0.0) + cutoff + 1.0
+    grid = defaultdict(list)
+    for i, cell in enumerate(np.floor(centers / cellsize).astype(int).tolist()):
+        grid[tuple(cell)].append(i)
+    pairs = set()
+    for cell, members in grid.items():
+        neighbors = np.array([j for offset in itertools.product([-1, 0, 1], repeat=3)
+                              for j in grid.get(tuple(c + o for c, o in zip(cell, offset)), ())])
+        members = np.array(members)
+        d = centers[members][:, None] - centers[neighbors][None]
+        close = np.sqrt((d ** 2).sum(axis=2)) <= radii[members][:, None] + radii[neighbors][None] + cutoff
+        for i, j in zip(*np.nonzero(close)):
+            a, b = chains[members[i]], chains[neighbors[j]]
+            if order[a] < order[b]:
+                pairs.add((a, b))
+    logger.debug(f'{len(pairs)} pair(s) of chains in contact among {len(order)} chain(s)')
+    return sorted(pairs, key=lambda pair: (order[pair[0]], order[pair[1]]))
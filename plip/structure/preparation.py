@@ -3,23 +3,32 @@ import os
 import re
 import tempfile
 from collections import namedtuple
-from operator import itemgetter
 
 import numpy as np
 from openbabel import pybel
 
 from plip.basic import config, logger
+from plip.basic.instrumentation import stage, timed
 from plip.basic.supplemental import centroid, tilde_expansion, tmpfile, classify_by_name
 from plip.basic.supplemental import cluster_doubles, is_lig, normalize_vector, vector, ring_is_planar
 from plip.basic.supplemental import extract_pdbid, read_pdb, create_folder_if_not_exists, canonicalize
 from plip.basic.supplemental import read, nucleotide_linkage, sort_members_by_importance
 from plip.basic.supplemental import whichchain, whichrestype, whichresnumber, euclidean3d, int32_to_negative
+from plip.basic.supplemental import vecangle, UnionFind
 from plip.basic.supplemental import residue_belongs_to_receptor
 from plip.structure.detection import halogen, pication, water_bridges, metal_complexation
 from plip.structure.detection import hydrophobic_interactions, pistacking, hbonds, saltbridge
+from plip.structure.detection import THRESHOLDS, loosest_thresholds, select_interactions
+from plip.structure.interface import INTERACTION_TYPES, binding_site_by_blocks, contacting_chains, detect_by_blocks
+from plip.structure.snapshot import MolSnapshot, SnapshotCache, pack, snapshot_key, unpack
 
 logger = logger.get_logger()
 
+# Settings the preparation of complexes depends on, stored in snapshots of prepared complexes
+PREPARATION_SETTINGS = ['MODEL', 'NOFIX', 'ALTLOC', 'PEPTIDES', 'INTRA', 'CHAINS', 'INTERFACES', 'KEEPMOD',
+                        'DNARECEPTOR', 'BREAKCOMPOSITE', 'MAX_COMPOSITE_LENGTH', 'NOHYDRO', 'NOPDBCANMAP']
+LIGAND_DATA = ['Name', 'Chain', 'ResNr']  # Data of ligand molecules set by LigandFinder.extract_ligand
+
 
 class PDBParser:
     def __init__(self, pdbpath, as_string):
@@ -28,12 +37,13 @@ class PDBParser:
         self.num_fixed_lines = 0
         self.covlinkage = namedtuple("covlinkage", "id1 chain1 pos1 conf1 id2 chain2 pos2 conf2")
         self.proteinmap, self.modres, self.covalent, self.altconformations, self.corrected_pdb = self.parse_pdb()
+        self.reversed_proteinmap = self.reverse_map(self.proteinmap)
 
     def parse_pdb(self):
         """Extracts additional information from PDB files.
         I. When reading in a PDB file, OpenBabel numbers ATOMS and HETATOMS continously.
         In PDB files, TER records are also counted, leading to a different numbering system.
-        This functions reads in a PDB file and provides a mapping as a dictionary.
+        This functions reads in a PDB file and provides a mapping as an array, indexed by the internal ID.
         II. Additionally, it returns a list of modified residues.
         III. Furthermore, covalent linkages between ligands and protein residues/other ligands are identified
         IV. Alternative conformations
@@ -45,8 +55,8 @@ class PDBParser:
             fil = f.readlines()
             f.close()
         corrected_lines = []
-        i, j = 0, 0  # idx and PDB numbering
-        d = {}
+        j = 0  # PDB numbering
+        d = [0]  # Internal IDs start at 1
         modres = set()
         covalent = []
         alt = []
@@ -109,13 +119,8 @@ class PDBParser:
                 if location != 'A':
                     alt.append(atomid)
 
-                if not previous_ter:
-                    i += 1
-                    j += 1
-                else:
-                    i += 1
-                    j += 2
-                d[i] = j
+                j += 2 if previous_ter else 1
+                d.append(j)
                 previous_ter = False
             # Numbering Changes at TER records
             if line.startswith("TER"):
@@ -126,7 +131,14 @@ class PDBParser:
             # Get covalent linkages between ligands
             if line.startswith("LINK"):
                 covalent.append(self.get_linkage(line))
-        return d, modres, covalent, alt, corrected_pdb
+        return np.array(d), modres, covalent, alt, corrected_pdb
+
+    @staticmethod
+    def reverse_map(proteinmap):
+        """Returns the array mapping PDB atom IDs back to internal IDs, with 0 for IDs without atom (e.g. TER)."""
+        reversed_map = np.zeros(proteinmap.max(initial=0) + 1, dtype=proteinmap.dtype)
+        reversed_map[proteinmap] = np.arange(len(proteinmap))
+        return reversed_map
 
     def fix_pdbline(self, pdbline, lastnum):
         """Fix a PDB line if information is missing."""
@@ -226,6 +238,8 @@ class PDBParser:
 
 
 class LigandFinder:
+    ligand_data = namedtuple('ligand', 'mol hetid chain position water members longname type atomorder can_to_pdb')
+
     def __init__(self, proteincomplex, altconf, modres, covalent, mapper):
         self.lignames_all = None
         self.lignames_kept = None
@@ -257,7 +271,7 @@ class LigandFinder:
         Returns all non-empty ligands.
         """
 
-        if config.PEPTIDES == [] and config.INTRA is None and config.CHAINS is None:
+        if config.PEPTIDES == [] and config.INTRA is None and config.CHAINS is None and not config.INTERFACES:
             # Extract small molecule ligands (default)
             ligands = []
 
@@ -298,6 +312,12 @@ class LigandFinder:
             elif config.INTRA is not None:
                 peptide_ligands = [self.getpeptides(config.INTRA), ]
 
+            elif config.INTERFACES:
+                # Each chain is a ligand at its interfaces with the chains before it (see PDBComplex.interfaces)
+                chains = dict.fromkeys(o.GetChain() for o in pybel.ob.OBResidueIter(self.proteincomplex.OBMol)
+                                       if not self.is_het_residue(o) and not o.GetResidueProperty(9))
+                peptide_ligands = [self.getpeptides(chain) for chain in list(chains)[1:]]
+
             ligands = [p for p in peptide_ligands if p is not None]
             self.covalent, self.lignames_kept, self.lignames_all = [], [], set()
 
@@ -305,7 +325,6 @@ class LigandFinder:
 
     def extract_ligand(self, kmer):
         """Extract the ligand by copying atoms and bonds and assign all information necessary for later steps."""
-        data = namedtuple('ligand', 'mol hetid chain position water members longname type atomorder can_to_pdb')
         members = [(res.GetName(), res.GetChain(), int32_to_negative(res.GetNum())) for res in kmer]
         members = sort_members_by_importance(members)
         rname, rchain, rnum = members[0]
@@ -313,7 +332,7 @@ class LigandFinder:
         names = [x[0] for x in members]
         longname = '-'.join([x[0] for x in members])
 
-        if config.PEPTIDES or config.CHAINS:
+        if config.PEPTIDES or config.CHAINS or config.INTERFACES:
             ligtype = 'PEPTIDE'
         elif config.INTRA is not None:
             ligtype = 'INTRA'
@@ -348,8 +367,8 @@ class LigandFinder:
         # map the old atom idx of OBMol to the new idx of the ligand #
         ##############################################################
 
-        newidx = dict(zip(sorted(hetatoms.keys()), [obatom.GetIdx() for obatom in pybel.ob.OBMolAtomIter(lig)]))
-        mapold = dict(zip(newidx.values(), newidx))
+        # CopySubstructure keeps the order of atoms, so atom i of the ligand is the i-th atom in the bit vector
+        mapold = np.array([0] + sorted(hetatoms.keys()))
 
         lig = pybel.Molecule(lig)
 
@@ -372,11 +391,11 @@ class LigandFinder:
 
         can_to_pdb = {}
         if atomorder is not None:
-            can_to_pdb = {atomorder[key - 1]: mapold[key] for key in mapold}
+            can_to_pdb = {atomorder[key - 1]: idx for key, idx in enumerate(mapold[1:].tolist(), 1)}
 
-        ligand = data(mol=lig, hetid=rname, chain=rchain, position=rnum, water=self.water,
-                      members=members, longname=longname, type=ligtype, atomorder=atomorder,
-                      can_to_pdb=can_to_pdb)
+        ligand = self.ligand_data(mol=lig, hetid=rname, chain=rchain, position=rnum, water=self.water,
+                                  members=members, longname=longname, type=ligtype, atomorder=atomorder,
+                                  can_to_pdb=can_to_pdb)
         return ligand
 
     @staticmethod
@@ -465,20 +484,53 @@ class Mapper:
     """Provides functions for mapping atom IDs in the correct way"""
 
     def __init__(self):
+        # All maps are arrays indexed by the ID to map, with 0 as placeholder for IDs not assigned to atoms
         self.proteinmap = None  # Map internal atom IDs of protein residues to original PDB Atom IDs
-        self.ligandmaps = {}  # Map IDs of new ligand molecules to internal IDs (or PDB IDs?)
+        self.reversed_proteinmap = None  # Map original PDB Atom IDs to internal atom IDs
+        self.ligandmaps = {}  # Map IDs of new ligand molecules to internal IDs
         self.original_structure = None
 
+    def is_mapped(self, idx):
+        """Checks if an internal ID belongs to an atom read from the PDB file (and not e.g. an added hydrogen)."""
+        return 0 < idx < len(self.proteinmap)
+
     def mapid(self, idx, mtype, bsid=None, to='original'):  # Mapping to original IDs is standard for ligands
+        """Maps a single ID or, in one go, a list or array of IDs. Returns an int or a list of ints, respectively.
+        Raises KeyError for IDs which are not in the map, including 0 and negative IDs."""
+        if isinstance(idx, (list, tuple, np.ndarray)):
+            idx = np.asarray(idx, dtype=int)
+            lookup = self.lookup_all
+        else:
+            lookup = self.lookup
         if mtype == 'reversed':  # Needed to map internal ID back to original protein ID
-            return self.reversed_proteinmap[idx]
+            return lookup(self.reversed_proteinmap, idx)
         if mtype == 'protein':
-            return self.proteinmap[idx]
+            return lookup(self.proteinmap, idx)
         elif mtype == 'ligand':
             if to == 'internal':
-                return self.ligandmaps[bsid][idx]
+                return lookup(self.ligandmaps[bsid], idx)
             elif to == 'original':
-                return self.proteinmap[self.ligandmaps[bsid][idx]]
+                return lookup(self.proteinmap, lookup(self.ligandmaps[bsid], idx))
+
+    @staticmethod
+    def lookup(idmap, idx):
+        """Maps an ID, raising KeyError for IDs not in the map (like a dictionary)"""
+        if not 0 < idx < len(idmap) or idmap[idx] == 0:
+            raise KeyError(idx)
+        return idmap.item(idx)
+
+    @staticmethod
+    def lookup_all(idmap, idx):
+        """Maps an array of IDs, raising KeyError if any of them is not in the map"""
+        idx = np.asarray(idx, dtype=int)
+        if idx.size == 0:
+            return []
+        if idx.min() <= 0 or idx.max() >= len(idmap):
+            raise KeyError(idx[(idx <= 0) | (idx >= len(idmap))][0].item())
+        mapped = idmap[idx]
+        if not mapped.all():
+            raise KeyError(idx[mapped == 0][0].item())
+        return mapped.tolist()
 
     def id_to_atom(self, idx):
         """Returns the atom for a given original ligand ID.
@@ -562,7 +614,8 @@ class Mol:
                 res = list(set([whichrestype(a) for a in r_atoms]))
                 # re-sort ring atoms for only ligands, because HETATM numbering is not canonical in OpenBabel
                 if res[0] == 'UNL':
-                    ligand_orig_idx = [self.Mapper.ligandmaps[self.bsid][a.idx] for a in r_atoms]
+                    ligand_orig_idx = self.Mapper.mapid([a.idx for a in r_atoms], mtype='ligand', bsid=self.bsid,
+                                                        to='internal')
                     sort_order = np.argsort(np.array(ligand_orig_idx))
                     r_atoms = [r_atoms[i] for i in sort_order]
                 if ring.IsAromatic() or res[0] in aromatic_amino or ring_is_planar(ring, r_atoms):
@@ -573,8 +626,8 @@ class Mol:
                     ring_atms = [r_atoms[a].coords for a in [0, 2, 4]]  # Probe atoms for normals, assuming planarity
                     ringv1 = vector(ring_atms[0], ring_atms[1])
                     ringv2 = vector(ring_atms[2], ring_atms[0])
-                    atoms_orig_idx = [self.Mapper.mapid(r_atom.idx, mtype=self.mtype,
-                                                        bsid=self.bsid) for r_atom in r_atoms]
+                    atoms_orig_idx = self.Mapper.mapid([r_atom.idx for r_atom in r_atoms], mtype=self.mtype,
+                                                       bsid=self.bsid)
                     orig_atoms = [self.Mapper.id_to_atom(idx) for idx in atoms_orig_idx]
                     rings.append(data(atoms=r_atoms,
                                       orig_atoms=orig_atoms,
@@ -607,8 +660,10 @@ class Mol:
 class PLInteraction:
     """Class to store a ligand, a protein and their interactions."""
 
-    def __init__(self, lig_obj, bs_obj, protcomplex):
-        """Detect all interactions when initializing"""
+    def __init__(self, lig_obj, bs_obj, protcomplex, candidates=None, detected=None):
+        """Detect all interactions when initializing. Given the candidates of an interaction set detected with
+        looser thresholds, the interactions within the current thresholds are selected from them instead. Interactions
+        already detected by name (see PLInteraction.detect) are only refined."""
         self.ligand = lig_obj
         self.lig_members = lig_obj.members
         self.pdbid = protcomplex.pymol_name
@@ -618,39 +673,34 @@ class PLInteraction:
         self.altconf = protcomplex.altconf
         # #@todo Refactor code to combine different directionality
 
-        self.saltbridge_lneg = saltbridge(self.bindingsite.get_pos_charged(), self.ligand.get_neg_charged(), True)
-        self.saltbridge_pneg = saltbridge(self.ligand.get_pos_charged(), self.bindingsite.get_neg_charged(), False)
+        self.candidates = detected if detected is not None else self.detect(candidates)
+        self.saltbridge_lneg = self.candidates['saltbridge_lneg']
+        self.saltbridge_pneg = self.candidates['saltbridge_pneg']
 
-        self.all_hbonds_ldon = hbonds(self.bindingsite.get_hba(),
-                                      self.ligand.get_hbd(), False, 'strong')
-        self.all_hbonds_pdon = hbonds(self.ligand.get_hba(),
-                                      self.bindingsite.get_hbd(), True, 'strong')
+        self.all_hbonds_ldon = self.candidates['all_hbonds_ldon']
+        self.all_hbonds_pdon = self.candidates['all_hbonds_pdon']
 
         self.hbonds_ldon = self.refine_hbonds_ldon(self.all_hbonds_ldon, self.saltbridge_lneg,
                                                    self.saltbridge_pneg)
         self.hbonds_pdon = self.refine_hbonds_pdon(self.all_hbonds_pdon, self.saltbridge_lneg,
                                                    self.saltbridge_pneg)
 
-        self.pistacking = pistacking(self.bindingsite.rings, self.ligand.rings)
+        self.pistacking = self.candidates['pistacking']
 
-        self.all_pication_laro = pication(self.ligand.rings, self.bindingsite.get_pos_charged(), True)
-        self.all_pication_paro = pication(self.bindingsite.rings, self.ligand.get_pos_charged(), False)
+        self.all_pication_laro = self.candidates['all_pication_laro']
+        self.all_pication_paro = self.candidates['all_pication_paro']
 
         self.pication_laro = self.refine_pication(self.all_pication_laro, self.pistacking)
         self.pication_paro = self.refine_pication(self.all_pication_paro, self.pistacking)
 
-        self.all_hydrophobic_contacts = hydrophobic_interactions(self.bindingsite.get_hydrophobic_atoms(),
-                                                                 self.ligand.get_hydrophobic_atoms())
+        self.all_hydrophobic_contacts = self.candidates['all_hydrophobic_contacts']
         self.hydrophobic_contacts = self.refine_hydrophobic(self.all_hydrophobic_contacts, self.pistacking)
-        self.halogen_bonds = halogen(self.bindingsite.halogenbond_acc, self.ligand.halogenbond_don)
-        self.water_bridges = water_bridges(self.bindingsite.get_hba(), self.ligand.get_hba(),
-                                           self.bindingsite.get_hbd(), self.ligand.get_hbd(),
-                                           self.ligand.water)
+        self.halogen_bonds = self.candidates['halogen_bonds']
 
-        self.water_bridges = self.refine_water_bridges(self.water_bridges, self.hbonds_ldon, self.hbonds_pdon)
+        self.water_bridges = self.refine_water_bridges(self.candidates['all_water_bridges'], self.hbonds_ldon,
+                                                       self.hbonds_pdon)
 
-        self.metal_complexes = metal_complexation(self.ligand.metals, self.ligand.metal_binding,
-                                                  self.bindingsite.metal_binding)
+        self.metal_complexes = self.candidates['metal_complexes']
 
         self.all_itypes = self.saltbridge_lneg + self.saltbridge_pneg + self.hbonds_pdon
         self.all_itypes = self.all_itypes + self.hbonds_ldon + self.pistacking + self.pication_laro + self.pication_paro
@@ -659,12 +709,12 @@ class PLInteraction:
 
         self.no_interactions = all(len(i) == 0 for i in self.all_itypes)
         self.unpaired_hba, self.unpaired_hbd, self.unpaired_hal = self.find_unpaired_ligand()
-        self.unpaired_hba_orig_idx = [self.Mapper.mapid(atom.idx, mtype='ligand', bsid=self.ligand.bsid)
-                                      for atom in self.unpaired_hba]
-        self.unpaired_hbd_orig_idx = [self.Mapper.mapid(atom.idx, mtype='ligand', bsid=self.ligand.bsid)
-                                      for atom in self.unpaired_hbd]
-        self.unpaired_hal_orig_idx = [self.Mapper.mapid(atom.idx, mtype='ligand', bsid=self.ligand.bsid)
-                                      for atom in self.unpaired_hal]
+        self.unpaired_hba_orig_idx = self.Mapper.mapid([atom.idx for atom in self.unpaired_hba],
+                                                       mtype='ligand', bsid=self.ligand.bsid)
+        self.unpaired_hbd_orig_idx = self.Mapper.mapid([atom.idx for atom in self.unpaired_hbd],
+                                                       mtype='ligand', bsid=self.ligand.bsid)
+        self.unpaired_hal_orig_idx = self.Mapper.mapid([atom.idx for atom in self.unpaired_hal],
+                                                       mtype='ligand', bsid=self.ligand.bsid)
         self.num_unpaired_hba, self.num_unpaired_hbd = len(self.unpaired_hba), len(self.unpaired_hbd)
         self.num_unpaired_hal = len(self.unpaired_hal)
 
@@ -702,6 +752,34 @@ class PLInteraction:
         else:
             logger.info('no interactions for this ligand')
 
+    def detect(self, candidates=None):
+        """Detects the interactions between ligand and binding site before their refinement, by name. If candidates
+        detected with looser thresholds are given, the interactions are selected from them (see select_interactions).
+        In intra-chain mode, duplicates are removed among the interactions detected (see filter_contacts), so that
+        they are always detected again."""
+        if candidates is not None and config.INTRA is None:
+            detected = select_interactions(candidates)
+        else:
+            detected = {
+                'saltbridge_lneg': saltbridge(self.bindingsite.get_pos_charged(), self.ligand.get_neg_charged(), True),
+                'saltbridge_pneg': saltbridge(self.ligand.get_pos_charged(), self.bindingsite.get_neg_charged(), False),
+                'all_hbonds_ldon': hbonds(self.bindingsite.get_hba(), self.ligand.get_hbd(), False, 'strong'),
+                'all_hbonds_pdon': hbonds(self.ligand.get_hba(), self.bindingsite.get_hbd(), True, 'strong'),
+                'pistacking': pistacking(self.bindingsite.rings, self.ligand.rings),
+                'all_hydrophobic_contacts': hydrophobic_interactions(self.bindingsite.get_hydrophobic_atoms(),
+                                                                     self.ligand.get_hydrophobic_atoms()),
+                'halogen_bonds': halogen(self.bindingsite.halogenbond_acc, self.ligand.halogenbond_don),
+                'all_water_bridges': water_bridges(self.bindingsite.get_hba(), self.ligand.get_hba(),
+                                                   self.bindingsite.get_hbd(), self.ligand.get_hbd(),
+                                                   self.ligand.water)}
+        # Pi-cation interactions with tertiary amines and metal complexes are not simply selected by thresholds,
+        # but there are few candidates for them to detect again
+        detected['all_pication_laro'] = pication(self.ligand.rings, self.bindingsite.get_pos_charged(), True)
+        detected['all_pication_paro'] = pication(self.bindingsite.rings, self.ligand.get_pos_charged(), False)
+        detected['metal_complexes'] = metal_complexation(self.ligand.metals, self.ligand.metal_binding,
+                                                         self.bindingsite.metal_binding)
+        return detected
+
     def find_unpaired_ligand(self):
         """Identify unpaired functional in groups in ligands, involving H-Bond donors, acceptors, halogen bond donors.
         """
@@ -732,14 +810,12 @@ class PLInteraction:
     @staticmethod
     def refine_hydrophobic(all_h, pistacks):
         """Apply several rules to reduce the number of hydrophobic interactions."""
-        sel = {}
         #  1. Rings interacting via stacking can't have additional hydrophobic contacts between each other.
-        for pistack, h in itertools.product(pistacks, all_h):
-            h1, h2 = h.bsatom.idx, h.ligatom.idx
-            brs, lrs = [p1.idx for p1 in pistack.proteinring.atoms], [p2.idx for p2 in pistack.ligandring.atoms]
-            if h1 in brs and h2 in lrs:
-                sel[(h1, h2)] = "EXCLUDE"
-        hydroph = [h for h in all_h if not (h.bsatom.idx, h.ligatom.idx) in sel]
+        stacked = set()
+        for pistack in pistacks:
+            stacked.update(itertools.product([p1.idx for p1 in pistack.proteinring.atoms],
+                                             [p2.idx for p2 in pistack.ligandring.atoms]))
+        hydroph = [h for h in all_h if (h.bsatom.idx, h.ligatom.idx) not in stacked]
         sel2 = {}
         #  2. If a ligand atom interacts with several binding site atoms in the same residue,
         #  keep only the one with the closest distance
@@ -771,39 +847,30 @@ class PLInteraction:
                 else:
                     bsclust[h.bsatom.idx].append(h)
 
-            idx_to_h = {}
             for bs in [a for a in bsclust if len(bsclust[a]) == 1]:
                 hydroph_final.append(bsclust[bs][0])
 
-            # A list of tuples with the idx of an atom and one of its neighbours is created
-            for bs in [a for a in bsclust if not len(bsclust[a]) == 1]:
-                tuples = []
-                all_idx = [i.ligatom.idx for i in bsclust[bs]]
-                for b in bsclust[bs]:
-                    idx = b.ligatom.idx
-                    neigh = [na for na in pybel.ob.OBAtomAtomIter(b.ligatom.OBAtom)]
-                    for n in neigh:
-                        n_idx = n.GetIdx()
-                        if n_idx in all_idx:
-                            if n_idx < idx:
-                                tuples.append((n_idx, idx))
-                            else:
-                                tuples.append((idx, n_idx))
-                            idx_to_h[idx] = b
-
-                tuples = list(set(tuples))
-                tuples = sorted(tuples, key=itemgetter(1))
-                clusters = cluster_doubles(tuples)  # Cluster connected atoms (i.e. find hydrophobic patches)
+            # Bonded neighbors of the ligand atoms, collected once for all binding site atoms
+            neighbors = {}
+            for h in hydroph:
+                if h.ligatom.idx not in neighbors:
+                    neighbors[h.ligatom.idx] = [n.GetIdx() for n in pybel.ob.OBAtomAtomIter(h.ligatom.OBAtom)]
 
+            for bs in [a for a in bsclust if not len(bsclust[a]) == 1]:
+                idx_to_h = {b.ligatom.idx: b for b in bsclust[bs]}
+                # Cluster bonded ligand atoms (i.e. find hydrophobic patches), atoms without bonded partner are dropped
+                patches = UnionFind()
+                bonded_to_lower = set()
+                for idx in idx_to_h:
+                    for n_idx in neighbors[idx]:
+                        if n_idx < idx and n_idx in idx_to_h:
+                            patches.union(n_idx, idx)
+                            bonded_to_lower.add(idx)
+                # Patches are ordered by their first bond, with bonds sorted by the higher atom index
+                clusters = sorted(patches.groups().values(),
+                                  key=lambda cluster: min(bonded_to_lower.intersection(cluster)))
                 for cluster in clusters:
-                    min_dist = float('inf')
-                    min_h = None
-                    for atm_idx in cluster:
-                        h = idx_to_h[atm_idx]
-                        if h.distance < min_dist:
-                            min_dist = h.distance
-                            min_h = h
-                    hydroph_final.append(min_h)
+                    hydroph_final.append(min((idx_to_h[idx] for idx in sorted(cluster)), key=lambda h: h.distance))
         before, reduced = len(all_h), len(hydroph_final)
         if not before == 0 and not before == reduced:
             logger.info(f'reduced number of hydrophobic contacts from {before} to {reduced}')
@@ -924,6 +991,63 @@ class PLInteraction:
         return filtered_wb
 
 
+class RingTable:
+    """Rings of a whole structure, perceived once and indexed by residue. Binding sites look up
+    the rings of their residues here instead of running ring perception over the structure each."""
+
+    def __init__(self, mol):
+        self.rings = []  # (SSSR index, ring, sorted atom indices) in the order of the SSSR
+        self.by_residue = {}  # OpenBabel residue index -> indices of rings with atoms in the residue
+        self.normals = {}  # (ring index, atom index) -> normal of the ring plane at the atom
+        self.planarity = {}  # (ring index, atom indices, threshold) -> planarity as checked by ring_is_planar
+        # Ring atoms are looked up among the atoms closest to the ring center, checked with OBRing.IsInRing
+        in_rings = [atom for atom in pybel.ob.OBMolAtomIter(mol.OBMol) if atom.IsInRing()]
+        in_rings_idxs = np.array([atom.GetIdx() for atom in in_rings])
+        in_rings_coords = np.array([(atom.GetX(), atom.GetY(), atom.GetZ()) for atom in in_rings]).reshape(-1, 3)
+        center, normal1, normal2 = pybel.ob.vector3(), pybel.ob.vector3(), pybel.ob.vector3()
+        for i, ring in enumerate(mol.OBMol.GetSSSR()):
+            ring.findCenterAndNormal(center, normal1, normal2)
+            distances = ((in_rings_coords - (center.GetX(), center.GetY(), center.GetZ())) ** 2).sum(axis=1)
+            nearest = min(2 * ring.Size(), len(distances))
+            closest = in_rings_idxs[np.argpartition(distances, nearest - 1)[:nearest]]
+            atom_idxs = tuple(sorted(int(idx) for idx in closest if ring.IsInRing(int(idx))))
+            if len(atom_idxs) != ring.Size():
+                # Distorted or large rings
+                atom_idxs = tuple(sorted(int(idx) for idx in in_rings_idxs if ring.IsInRing(int(idx))))
+            self.rings.append((i, ring, atom_idxs))
+            for idx in atom_idxs:
+                residue = mol.OBMol.GetAtom(idx).GetResidue().GetIdx()
+                self.by_residue.setdefault(residue, set()).add(i)
+        logger.debug(f'number of aromatic ring candidates: {len(self.rings)}')
+
+    def candidates(self, atoms):
+        """Rings with atoms in the residues of the given atoms, in the order of the SSSR"""
+        residues = set(a.OBAtom.GetResidue().GetIdx() for a in atoms)
+        ring_ids = set()
+        for residue in residues:
+            ring_ids.update(self.by_residue.get(residue, ()))
+        return [self.rings[i] for i in sorted(ring_ids)]
+
+    def normal(self, ring_id, ring, atom):
+        """Normal at a ring atom spanned by its two ring neighbors (computed once per atom)"""
+        key = (ring_id, atom.idx)
+        if key not in self.normals:
+            n_coords = [pybel.Atom(neigh).coords for neigh in pybel.ob.OBAtomAtomIter(atom.OBAtom)
+                        if ring.IsMember(neigh)]
+            self.normals[key] = np.cross(vector(atom.coords, n_coords[0]), vector(atom.coords, n_coords[1]))
+        return self.normals[key]
+
+    def is_planar(self, ring_id, ring, r_atoms):
+        """Same check as ring_is_planar, with normals and results cached"""
+        key = (ring_id, tuple(a.idx for a in r_atoms), config.AROMATIC_PLANARITY)
+        if key not in self.planarity:
+            normals = [self.normal(ring_id, ring, a) for a in r_atoms]
+            self.planarity[key] = not any(config.AROMATIC_PLANARITY < angle < 180.0 - config.AROMATIC_PLANARITY
+                                          for angle in (vecangle(n1, n2) for n1, n2 in
+                                                        itertools.product(normals, repeat=2)))
+        return self.planarity[key]
+
+
 class BindingSite(Mol):
     def __init__(self, atoms, protcomplex, cclass, altconf, min_dist, mapper):
         """Find all relevant parts which could take part in interactions"""
@@ -933,7 +1057,7 @@ class BindingSite(Mol):
         self.all_atoms = atoms
         self.min_dist = min_dist  # Minimum distance of bs res to ligand
         self.bs_res = list(set([''.join([str(whichresnumber(a)), whichchain(a)]) for a in self.all_atoms]))  # e.g. 47A
-        self.rings = self.find_rings(self.full_mol, self.all_atoms)
+        self.rings = self.find_rings(self.complex.ring_table(), self.all_atoms)
         self.hydroph_atoms = self.hydrophobic_atoms(self.all_atoms)
         self.hbond_acc_atoms = self.find_hba(self.all_atoms)
         self.hbond_don_atom_pairs = self.find_hbd(self.all_atoms, self.hydroph_atoms)
@@ -941,6 +1065,35 @@ class BindingSite(Mol):
         self.halogenbond_acc = self.find_hal(self.all_atoms)
         self.metal_binding = self.find_metal_binding(self.full_mol)
 
+    def find_rings(self, table, all_atoms):
+        """Find aromatic rings among the binding site atoms, see Mol.find_rings.
+        Only the rings of the binding site residues are looked up in the ring table of the structure."""
+        data = namedtuple('aromatic_ring', 'atoms orig_atoms atoms_orig_idx normal obj center type')
+        rings = []
+        aromatic_amino = ['TYR', 'TRP', 'HIS', 'PHE']
+        atoms_by_idx = {a.idx: a for a in all_atoms}
+        for ring_id, ring, atom_idxs in table.candidates(all_atoms):
+            # Rings may be cut by the binding site, only the atoms within it are considered
+            r_atoms = [atoms_by_idx[idx] for idx in atom_idxs if idx in atoms_by_idx]
+            if 4 < len(r_atoms) <= 6:
+                res = list(set([whichrestype(a) for a in r_atoms]))
+                if ring.IsAromatic() or res[0] in aromatic_amino or table.is_planar(ring_id, ring, r_atoms):
+                    ring_type = '%s-membered' % len(r_atoms)
+                    ring_atms = [r_atoms[a].coords for a in [0, 2, 4]]  # Probe atoms for normals, assuming planarity
+                    ringv1 = vector(ring_atms[0], ring_atms[1])
+                    ringv2 = vector(ring_atms[2], ring_atms[0])
+                    atoms_orig_idx = self.Mapper.mapid([r_atom.idx for r_atom in r_atoms], mtype=self.mtype,
+                                                       bsid=self.bsid)
+                    orig_atoms = [self.Mapper.id_to_atom(idx) for idx in atoms_orig_idx]
+                    rings.append(data(atoms=r_atoms,
+                                      orig_atoms=orig_atoms,
+                                      atoms_orig_idx=atoms_orig_idx,
+                                      normal=normalize_vector(np.cross(ringv1, ringv2)),
+                                      obj=ring,
+                                      center=centroid([ra.coords for ra in r_atoms]),
+                                      type=ring_type))
+        return rings
+
     def find_hal(self, atoms):
         """Look for halogen bond acceptors (Y-{O|P|N|S}, with Y=C,P,S)"""
         data = namedtuple('hal_acceptor', 'o o_orig_idx y y_orig_idx')
@@ -1086,16 +1239,16 @@ class Ligand(Mol):
         # Special Case for hydrogen bond acceptor identification #
         ##########################################################
 
-        self.inverse_mapping = {v: k for k, v in self.Mapper.ligandmaps[self.bsid].items()}
-        self.pdb_to_idx_mapping = {v: k for k, v in self.Mapper.proteinmap.items()}
         self.hbond_don_atom_pairs = self.find_hbd(self.all_atoms, self.hydroph_atoms)
 
         ######
         donor_pairs = []
         data = namedtuple('hbonddonor', 'd d_orig_atom d_orig_idx h type')
-        for donor in self.all_atoms:
-            pdbidx = self.Mapper.mapid(donor.idx, mtype='ligand', bsid=self.bsid, to='original')
-            d = cclass.atoms[self.pdb_to_idx_mapping[pdbidx]]
+        # The donors are looked up in the protonated complex, via the internal IDs of the ligand atoms
+        internal_idx = self.Mapper.mapid([donor.idx for donor in self.all_atoms], mtype='ligand', bsid=self.bsid,
+                                         to='internal')
+        for donor, idx, pdbidx in zip(self.all_atoms, internal_idx, self.Mapper.mapid(internal_idx, mtype='protein')):
+            d = cclass.atoms[idx]
             if d.OBAtom.IsHbondDonor():
                 for adj_atom in [a for a in pybel.ob.OBAtomAtomIter(d.OBAtom) if a.IsHbondDonorH()]:
                     d_orig_atom = self.Mapper.id_to_atom(pdbidx)
@@ -1186,7 +1339,7 @@ class Ligand(Mol):
                 n_atoms = [na for na in pybel.ob.OBAtomAtomIter(a.OBAtom) if na.GetAtomicNum() == 6]
                 x_orig_idx = self.Mapper.mapid(a.idx, mtype=self.mtype, bsid=self.bsid)
                 orig_x = self.Mapper.id_to_atom(x_orig_idx)
-                c_orig_idx = [self.Mapper.mapid(na.GetIdx(), mtype=self.mtype, bsid=self.bsid) for na in n_atoms]
+                c_orig_idx = self.Mapper.mapid([na.GetIdx() for na in n_atoms], mtype=self.mtype, bsid=self.bsid)
                 a_set.append(data(x=a, orig_x=orig_x, x_orig_idx=x_orig_idx,
                                   c=pybel.Atom(n_atoms[0]), c_orig_idx=c_orig_idx))
         if len(a_set) != 0:
@@ -1220,8 +1373,8 @@ class Ligand(Mol):
                     a_contributing = [a, ]
                     a_contributing_orig_idx = [a_orig_idx, ]
                     [a_contributing.append(pybel.Atom(neighbor)) for neighbor in pybel.ob.OBAtomAtomIter(a.OBAtom)]
-                    [a_contributing_orig_idx.append(self.Mapper.mapid(neighbor.idx, mtype=self.mtype, bsid=self.bsid))
-                     for neighbor in a_contributing]
+                    a_contributing_orig_idx += self.Mapper.mapid([neighbor.idx for neighbor in a_contributing],
+                                                                 mtype=self.mtype, bsid=self.bsid)
                     orig_contributing = [self.Mapper.id_to_atom(idx) for idx in a_contributing_orig_idx]
                     a_set.append(
                         data(atoms=a_contributing, orig_atoms=orig_contributing, atoms_orig_idx=a_contributing_orig_idx,
@@ -1232,8 +1385,8 @@ class Ligand(Mol):
                     a_contributing_orig_idx = [a_orig_idx, ]
                     [a_contributing.append(pybel.Atom(neighbor)) for neighbor in pybel.ob.OBAtomAtomIter(a.OBAtom) if
                      neighbor.GetAtomicNum() == 8]
-                    [a_contributing_orig_idx.append(self.Mapper.mapid(neighbor.idx, mtype=self.mtype, bsid=self.bsid))
-                     for neighbor in a_contributing]
+                    a_contributing_orig_idx += self.Mapper.mapid([neighbor.idx for neighbor in a_contributing],
+                                                                 mtype=self.mtype, bsid=self.bsid)
                     orig_contributing = [self.Mapper.id_to_atom(idx) for idx in a_contributing_orig_idx]
                     a_set.append(
                         data(atoms=a_contributing, orig_atoms=orig_contributing, atoms_orig_idx=a_contributing_orig_idx,
@@ -1242,8 +1395,8 @@ class Ligand(Mol):
                 elif self.is_functional_group(a, 'sulfate'):
                     a_contributing = [a, ]
                     a_contributing_orig_idx = [a_orig_idx, ]
-                    [a_contributing_orig_idx.append(self.Mapper.mapid(neighbor.idx, mtype=self.mtype, bsid=self.bsid))
-                     for neighbor in a_contributing]
+                    a_contributing_orig_idx += self.Mapper.mapid([neighbor.idx for neighbor in a_contributing],
+                                                                 mtype=self.mtype, bsid=self.bsid)
                     [a_contributing.append(pybel.Atom(neighbor)) for neighbor in pybel.ob.OBAtomAtomIter(a.OBAtom)]
                     orig_contributing = [self.Mapper.id_to_atom(idx) for idx in a_contributing_orig_idx]
                     a_set.append(
@@ -1253,8 +1406,8 @@ class Ligand(Mol):
                 if self.is_functional_group(a, 'carboxylate'):
                     a_contributing = [pybel.Atom(neighbor) for neighbor in pybel.ob.OBAtomAtomIter(a.OBAtom)
                                       if neighbor.GetAtomicNum() == 8]
-                    a_contributing_orig_idx = [self.Mapper.mapid(neighbor.idx, mtype=self.mtype, bsid=self.bsid)
-                                               for neighbor in a_contributing]
+                    a_contributing_orig_idx = self.Mapper.mapid([neighbor.idx for neighbor in a_contributing],
+                                                                mtype=self.mtype, bsid=self.bsid)
                     orig_contributing = [self.Mapper.id_to_atom(idx) for idx in a_contributing_orig_idx]
                     a_set.append(
                         data(atoms=a_contributing, orig_atoms=orig_contributing, atoms_orig_idx=a_contributing_orig_idx,
@@ -1263,8 +1416,8 @@ class Ligand(Mol):
                 elif self.is_functional_group(a, 'guanidine'):
                     a_contributing = [pybel.Atom(neighbor) for neighbor in pybel.ob.OBAtomAtomIter(a.OBAtom)
                                       if neighbor.GetAtomicNum() == 7]
-                    a_contributing_orig_idx = [self.Mapper.mapid(neighbor.idx, mtype=self.mtype, bsid=self.bsid)
-                                               for neighbor in a_contributing]
+                    a_contributing_orig_idx = self.Mapper.mapid([neighbor.idx for neighbor in a_contributing],
+                                                                mtype=self.mtype, bsid=self.bsid)
                     orig_contributing = [self.Mapper.id_to_atom(idx) for idx in a_contributing_orig_idx]
                     a_set.append(
                         data(atoms=a_contributing, orig_atoms=orig_contributing, atoms_orig_idx=a_contributing_orig_idx,
@@ -1401,6 +1554,8 @@ class PDBComplex:
         self.excluded = []  # Excluded ligands
         self.Mapper = Mapper()
         self.ligands = []
+        self._ring_table = None  # Rings of the structure, perceived on first use (see ring_table)
+        self.num_read_atoms = 0  # Atoms of the structure before protonation, the hydrogens added are appended
 
     def __str__(self):
         formatted_lig_names = [":".join([x.hetid, x.chain, str(x.position)]) for x in self.ligands]
@@ -1418,10 +1573,12 @@ class PDBComplex:
             self.sourcefiles['pdbcomplex.original'] = pdbpath
             self.sourcefiles['pdbcomplex'] = pdbpath
         self.information['pdbfixes'] = False
-        pdbparser = PDBParser(pdbpath, as_string=as_string)  # Parse PDB file to find errors and get additional data
+        self._ring_table = None
+        with stage('parse'):
+            pdbparser = PDBParser(pdbpath, as_string=as_string)  # Parse PDB file to find errors and get additional data
         # #@todo Refactor and rename here
         self.Mapper.proteinmap = pdbparser.proteinmap
-        self.Mapper.reversed_proteinmap = {v: k for k, v in self.Mapper.proteinmap.items()}
+        self.Mapper.reversed_proteinmap = pdbparser.reversed_proteinmap
         self.modres = pdbparser.modres
         self.covalent = pdbparser.covalent
         self.altconf = pdbparser.altconformations
@@ -1446,7 +1603,20 @@ class PDBComplex:
 
         if not as_string:
             self.sourcefiles['filename'] = os.path.basename(self.sourcefiles['pdbcomplex'])
-        self.protcomplex, self.filetype = read_pdb(self.corrected_pdb, as_string= (self.corrected_pdb != pdbpath)) # self.corrected_pdb may fallback to pdbpath
+        # Structures read before are restored from their snapshot, skipping the bond perception and protonation
+        read_as_string = self.corrected_pdb != pdbpath  # self.corrected_pdb may fallback to pdbpath
+        snapshots = SnapshotCache(config.SNAPSHOT_CACHE, config.SNAPSHOT_CACHE_SIZE) if config.SNAPSHOT_CACHE else None
+        snapshot, restored = None, False
+        if snapshots is not None:
+            snapshot_id = snapshot_key(self.corrected_pdb, read_as_string)
+            snapshot = snapshots.get(snapshot_id)
+            restored = snapshot is not None
+        with stage('read'):
+            if restored:
+                self.protcomplex, self.filetype = snapshot.restore(), 'pdb'
+            else:
+                self.protcomplex, self.filetype = read_pdb(self.corrected_pdb, as_string=read_as_string)
+        self.num_read_atoms = self.protcomplex.OBMol.NumAtoms()
 
         # Update the model in the Mapper class instance
         self.Mapper.original_structure = self.protcomplex.OBMol
@@ -1464,23 +1634,39 @@ class PDBComplex:
         logger.debug(f'PyMOL name set as: {self.pymol_name}')
 
         # Extract and prepare ligands
-        ligandfinder = LigandFinder(self.protcomplex, self.altconf, self.modres, self.covalent, self.Mapper)
+        with stage('ligand_detection'):
+            ligandfinder = LigandFinder(self.protcomplex, self.altconf, self.modres, self.covalent, self.Mapper)
         self.ligands = ligandfinder.ligands
         self.excluded = ligandfinder.excluded
 
         # decide whether to add polar hydrogens
         if not config.NOHYDRO:
-            if not as_string:
-                basename = os.path.basename(pdbpath).split('.')[0]
-            else:
-                basename = "from_stdin"
-            self.protcomplex.OBMol.AddPolarHydrogens()
-            output_path = os.path.join(self._output_path, f'{basename}_protonated.pdb')
-            self.protcomplex.write('pdb', output_path, overwrite=True)
-            logger.info(f'protonated structure written to {output_path}')
+            with stage('protonation'):
+                if restored and snapshot.protonated:
+                    snapshot.protonate(self.protcomplex.OBMol)
+                else:
+                    self.protcomplex.OBMol.AddPolarHydrogens()
+            if config.PROTONATED:
+                if not as_string:
+                    basename = os.path.basename(pdbpath).split('.')[0]
+                else:
+                    basename = "from_stdin"
+                output_path = os.path.join(self._output_path, f'{basename}_protonated.pdb')
+                self.protcomplex.write('pdb', output_path, overwrite=True)
+                logger.info(f'protonated structure written to {output_path}')
         else:
             logger.warning('no polar hydrogens will be assigned (make sure your structure contains hydrogens)')
+        if snapshots is not None and not (restored and (snapshot.protonated or config.NOHYDRO)):
+            snapshots.put(snapshot_id, MolSnapshot.capture(self.protcomplex.OBMol, self.protonated_from()))
+        self.collect_atoms_and_residues()
 
+    def protonated_from(self):
+        """Number of atoms before protonation, whose hydrogens are appended, or None without protonation."""
+        return None if config.NOHYDRO else self.num_read_atoms
+
+    def collect_atoms_and_residues(self):
+        """Indexes the atoms and receptor residues of the prepared structure."""
+        self.atoms = {}
         for atm in self.protcomplex:
             self.atoms[atm.idx] = atm
 
@@ -1504,11 +1690,85 @@ class PDBComplex:
         else:
             logger.info(f'structure contains no ligands')
 
+    def save_snapshot(self, path):
+        """Saves the complex prepared by load_pdb to a snapshot file, from which load_snapshot restores it without
+        parsing, bond perception, ligand detection and protonation, e.g. to analyze it again with other thresholds.
+        Besides the structure, the snapshot holds the ligand definitions, mappings and the preparation settings."""
+        snapshot = MolSnapshot.capture(self.protcomplex.OBMol, self.protonated_from())
+        ligands = []
+        for ligand in self.ligands:
+            ligands.append({'hetid': ligand.hetid, 'chain': ligand.chain, 'position': ligand.position,
+                            'members': ligand.members, 'longname': ligand.longname, 'type': ligand.type,
+                            'atomorder': ligand.atomorder, 'can_to_pdb': list(ligand.can_to_pdb.items()),
+                            'title': ligand.mol.title, 'data': {key: ligand.mol.data[key] for key in LIGAND_DATA},
+                            'atoms': self.Mapper.ligandmaps[ligand.mol.title][1:].tolist()})
+        snapshot.arrays['complex'] = pack({
+            'settings': {name: getattr(config, name) for name in PREPARATION_SETTINGS},
+            'sourcefiles': self.sourcefiles, 'information': self.information, 'corrected_pdb': self.corrected_pdb,
+            'filetype': self.filetype, 'pymol_name': self.pymol_name, 'modres': sorted(self.modres),
+            'covalent': self.covalent, 'altconf': self.altconf, 'excluded': self.excluded, 'ligands': ligands})
+        snapshot.arrays['proteinmap'] = self.Mapper.proteinmap
+        snapshot.save(path)
+        logger.info(f'prepared complex saved to {path}')
+
+    def load_snapshot(self, path):
+        """Loads a complex saved by save_snapshot. The preparation settings of the snapshot (e.g. peptide chains
+        or the model) are applied to the config, as the ligands and receptor residues depend on them."""
+        snapshot = MolSnapshot.load(path)
+        if snapshot is None or 'complex' not in snapshot.arrays:
+            raise ValueError(f'{path} is not a snapshot of a prepared complex from this version of PLIP')
+        prepared = unpack(snapshot.arrays['complex'])
+        for name, value in prepared['settings'].items():
+            if getattr(config, name) != value:
+                logger.info(f'using {name}={value} from the snapshot')
+                setattr(config, name, value)
+        self.sourcefiles, self.information = prepared['sourcefiles'], prepared['information']
+        self.corrected_pdb, self.filetype = prepared['corrected_pdb'], prepared['filetype']
+        self.pymol_name, self.modres = prepared['pymol_name'], set(prepared['modres'])
+        covlinkage = namedtuple("covlinkage", "id1 chain1 pos1 conf1 id2 chain2 pos2 conf2")
+        self.covalent = [covlinkage(*link) for link in prepared['covalent']]
+        self.altconf, self.excluded = prepared['altconf'], prepared['excluded']
+        self.Mapper.proteinmap = snapshot.arrays['proteinmap']
+        self.Mapper.reversed_proteinmap = PDBParser.reverse_map(self.Mapper.proteinmap)
+        self._ring_table = None
+        with stage('read'):
+            self.protcomplex = snapshot.restore()
+        self.num_read_atoms = self.protcomplex.OBMol.NumAtoms()
+        self.Mapper.original_structure = self.protcomplex.OBMol
+        logger.info('prepared complex successfully read from snapshot')
+
+        with stage('ligand_detection'):
+            water = [o for o in pybel.ob.OBResidueIter(self.protcomplex.OBMol) if o.GetResidueProperty(9)]
+            self.ligands = [self.restore_ligand(ligand, water) for ligand in prepared['ligands']]
+        if snapshot.protonated:
+            with stage('protonation'):
+                snapshot.protonate(self.protcomplex.OBMol)
+        self.collect_atoms_and_residues()
+
+    def restore_ligand(self, ligand, water):
+        """Extracts a ligand defined in a snapshot from the restored structure, like LigandFinder.extract_ligand."""
+        lig = pybel.ob.OBMol()
+        atomsBitVec = pybel.ob.OBBitVec(self.protcomplex.OBMol.NumAtoms())
+        for atomidx in ligand['atoms']:
+            atomsBitVec.SetBitOn(atomidx)
+        self.protcomplex.OBMol.CopySubstructure(lig, atomsBitVec, None, 0)
+        mapold = np.array([0] + ligand['atoms'])
+        lig = pybel.Molecule(lig)
+        lig.data.update(ligand['data'])
+        lig.title = ligand['title']
+        self.Mapper.ligandmaps[lig.title] = mapold
+        return LigandFinder.ligand_data(mol=lig, hetid=ligand['hetid'], chain=ligand['chain'],
+                                        position=ligand['position'], water=water,
+                                        members=[tuple(member) for member in ligand['members']],
+                                        longname=ligand['longname'], type=ligand['type'],
+                                        atomorder=ligand['atomorder'], can_to_pdb=dict(ligand['can_to_pdb']))
+
     def analyze(self):
         """Triggers analysis of all complexes in structure"""
         for ligand in self.ligands:
             self.characterize_complex(ligand)
 
+    @timed('characterize_complex')
     def characterize_complex(self, ligand):
         """Handles all basic functions for characterizing the interactions for one ligand"""
 
@@ -1530,41 +1790,102 @@ class PDBComplex:
         if ligtype not in ['POLYMER', 'DNA', 'ION', 'DNA+ION', 'RNA+ION', 'SMALLMOLECULE+ION'] and any_in_biolip:
             logger.info('may be biologically irrelevant')
 
-        lig_obj = Ligand(self, ligand)
+        with stage('ligand_preparation'):
+            lig_obj = Ligand(self, ligand)
         cutoff = lig_obj.max_dist_to_center + config.BS_DIST
         bs_res = self.extract_bs(cutoff, lig_obj.centroid, self.resis)
         # Get a list of all atoms belonging to the binding site, search by idx
         bs_atoms = [self.atoms[idx] for idx in [i for i in self.atoms.keys()
                                                 if self.atoms[i].OBAtom.GetResidue().GetIdx() in bs_res]
-                    if idx in self.Mapper.proteinmap and self.Mapper.mapid(idx, mtype='protein') not in self.altconf]
+                    if self.Mapper.is_mapped(idx) and self.Mapper.mapid(idx, mtype='protein') not in self.altconf]
         if ligand.type == 'PEPTIDE':
             # If peptide, don't consider the peptide chain as part of the protein binding site
             bs_atoms = [a for a in bs_atoms if a.OBAtom.GetResidue().GetChain() != lig_obj.chain]
         if ligand.type == 'INTRA':
             # Interactions within the chain
             bs_atoms = [a for a in bs_atoms if a.OBAtom.GetResidue().GetChain() == lig_obj.chain]
-        bs_atoms_refined = []
-
-        # Create hash with BSRES -> (MINDIST_TO_LIG, AA_TYPE)
-        # and refine binding site atom selection with exact threshold
-        min_dist = {}
-        for r in bs_atoms:
-            bs_res_id = ''.join([str(whichresnumber(r)), whichchain(r)])
-            for l in ligand.mol.atoms:
-                distance = euclidean3d(r.coords, l.coords)
-                if bs_res_id not in min_dist:
-                    min_dist[bs_res_id] = (distance, whichrestype(r))
-                elif min_dist[bs_res_id][0] > distance:
-                    min_dist[bs_res_id] = (distance, whichrestype(r))
-                if distance <= config.BS_DIST and r not in bs_atoms_refined:
-                    bs_atoms_refined.append(r)
+        blocks = config.BLOCKS if ligand.type in ['PEPTIDE', 'INTRA'] else None
+        if blocks:
+            bs_atoms_refined, min_dist = binding_site_by_blocks(bs_atoms, ligand.mol.atoms, blocks)
+        else:
+            bs_atoms_refined = []
+
+            # Create hash with BSRES -> (MINDIST_TO_LIG, AA_TYPE)
+            # and refine binding site atom selection with exact threshold
+            min_dist = {}
+            for r in bs_atoms:
+                bs_res_id = ''.join([str(whichresnumber(r)), whichchain(r)])
+                for l in ligand.mol.atoms:
+                    distance = euclidean3d(r.coords, l.coords)
+                    if bs_res_id not in min_dist:
+                        min_dist[bs_res_id] = (distance, whichrestype(r))
+                    elif min_dist[bs_res_id][0] > distance:
+                        min_dist[bs_res_id] = (distance, whichrestype(r))
+                    if distance <= config.BS_DIST and r not in bs_atoms_refined:
+                        bs_atoms_refined.append(r)
         num_bs_atoms = len(bs_atoms_refined)
         logger.info(f'binding site atoms in vicinity ({config.BS_DIST} A max. dist: {num_bs_atoms})')
 
         bs_obj = BindingSite(bs_atoms_refined, self.protcomplex, self, self.altconf, min_dist, self.Mapper)
-        pli_obj = PLInteraction(lig_obj, bs_obj, self)
+        with stage('interactions'):
+            if blocks:
+                # Chains as ligands are compared in blocks of residues, collecting the interactions as they come
+                detected = {name: [] for name in INTERACTION_TYPES}
+                for name, contacts in detect_by_blocks(lig_obj, bs_obj, blocks):
+                    detected[name].extend(contacts)
+                pli_obj = PLInteraction(lig_obj, bs_obj, self, detected=detected)
+            else:
+                pli_obj = PLInteraction(lig_obj, bs_obj, self)
         self.interaction_sets[ligand.mol.title] = pli_obj
 
+    def sweep_thresholds(self, settings):
+        """Characterizes all ligands with each of the settings, given as dicts of thresholds by config name (see
+        detection.THRESHOLDS), and returns the interaction sets of each setting. Interactions are detected once with
+        the loosest thresholds of all settings and only selected for each setting, the interaction sets of the
+        complex are those detected with the loosest thresholds afterwards."""
+        unknown = sorted(set(itertools.chain.from_iterable(settings)) - set(THRESHOLDS))
+        if unknown:
+            raise ValueError(f'thresholds {unknown} cannot be varied in a threshold sweep')
+        current = {name: getattr(config, name) for name in THRESHOLDS}
+        sweep = []
+        try:
+            for name, value in loosest_thresholds(settings).items():
+                setattr(config, name, value)
+            for ligand in self.ligands:
+                self.characterize_complex(ligand)
+            for setting in settings:
+                for name, value in dict(current, **setting).items():
+                    setattr(config, name, value)
+                with stage('interactions'):
+                    sweep.append({site: PLInteraction(loose.ligand, loose.bindingsite, self, loose.candidates)
+                                  for site, loose in self.interaction_sets.items()})
+        finally:
+            for name, value in current.items():
+                setattr(config, name, value)
+        return sweep
+
+    def interfaces(self):
+        """Returns the interfaces of the complex as pairs of receptor chain and ligand, for all pairs of chains with
+        residues in contact (see interface.contacting_chains). The chain appearing later in the structure is the
+        ligand, extracted as a peptide when loading in interface mode (config.INTERFACES)."""
+        ligands = {ligand.chain: ligand for ligand in self.ligands}
+        return [(receptor, ligands[chain]) for receptor, chain in contacting_chains(self.resis, config.BS_DIST)
+                if chain in ligands]
+
+    def characterize_interface(self, receptor, ligand):
+        """Characterizes the interactions of a chain, extracted as peptide ligand, with one receptor chain, as with
+        the chains [[receptor], [ligand chain]] defined in config.CHAINS. Returns the name of the interaction set,
+        made of the receptor chain and the ligand name, as the ligand may have interfaces with several chains."""
+        chains = config.CHAINS
+        config.CHAINS = [[receptor], [ligand.chain]]
+        try:
+            self.characterize_complex(ligand)
+        finally:
+            config.CHAINS = chains
+        site = ':'.join([receptor, ligand.mol.title])
+        self.interaction_sets[site] = self.interaction_sets.pop(ligand.mol.title)
+        return site
+
     def extract_bs(self, cutoff, ligcentroid, resis):
         """Return list of ids from residues belonging to the binding site"""
         return [obres.GetIdx() for obres in resis if self.res_belongs_to_bs(obres, cutoff, ligcentroid)]
@@ -1583,6 +1904,12 @@ class PDBComplex:
     def get_atom(self, idx):
         return self.atoms[idx]
 
+    def ring_table(self):
+        """Returns the ring table of the structure, shared by all binding sites"""
+        if self._ring_table is None:
+            self._ring_table = RingTable(self.protcomplex)
+        return self._ring_table
+
     @property
     def output_path(self):
         return self._output_path
@@ -0,0 +1,234 @@
+"""
+Protein-Ligand Interaction Profiler - Analyze and visualize protein-ligand interactions in PDB files.
+snapshot.py - Binary snapshots of read and protonated structures, cached by the hash of the input.
+"""
+
+import hashlib
+import json
+from collections import Counter
+
+import numpy as np
+
+from plip.basic import logger
+from plip.basic.instrumentation import event
+from plip.basic.supplemental import DirectoryCache
+
+logger = logger.get_logger()
+
+SNAPSHOT_VERSION = 2  # Increase whenever the layout of snapshots or the preparation of structures changes
+
+ATOM_FIELDS = [('atomicnum', 'u1'), ('x', 'f8'), ('y', 'f8'), ('z', 'f8'), ('charge', 'i1'), ('implicit_h', 'u1'),
+               ('residue', 'i4'), ('hetatm', '?'), ('serial', 'i4')]
+BOND_FIELDS = [('begin', 'i4'), ('end', 'i4'), ('order', 'u1')]
+RESIDUE_FIELDS = [('chain', 'u4'), ('insertion', 'u4'), ('chainnum', 'i4')]
+
+
+def openbabel():
+    from openbabel import pybel
+    return pybel.ob
+
+
+def persisted_flags():
+    """Flags of molecules kept in snapshots. Everything else (rings, aromaticity, atom types) is perceived
+    again on demand, exactly as for a structure read from the PDB file."""
+    ob = openbabel()
+    return ob.OB_CHAINS_MOL | ob.OB_H_ADDED_MOL
+
+
+def pack(data):
+    """Stores JSON data as an array of bytes"""
+    return np.frombuffer(json.dumps(data).encode(), dtype='u1')
+
+
+def unpack(array):
+    return json.loads(array.tobytes())
+
+
+def snapshot_key(pdb, as_string):
+    """Returns the cache key of a structure read by read_pdb, i.e. the hash of its (corrected) PDB text
+    or of the file content. Files and strings are read with different options and get different keys."""
+    digest = hashlib.sha256(b'string:' if as_string else b'file:')
+    if as_string:
+        digest.update(pdb.encode())
+    else:
+        with open(pdb, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+class MolSnapshot:
+    """Arrays describing an OpenBabel molecule as read from a PDB file: atoms with their residue data, bonds
+    with their orders, residues, PDB records and the unit cell. If the molecule was protonated, the hydrogens
+    appended by AddPolarHydrogens are stored after the heavy atoms (starting at index `heavy`), together
+    with the implicit hydrogen counts after protonation, so that restore() and protonate() can reproduce
+    both states in the same order as the original preparation."""
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+
+    @property
+    def heavy(self):
+        return int(self.arrays['heavy'])
+
+    @property
+    def protonated(self):
+        return 'hydrogens' in self.arrays
+
+    @classmethod
+    def capture(cls, obmol, heavy=None):
+        """Returns the snapshot of a molecule as read from a PDB file. If the molecule was protonated since, `heavy`
+        is the number of atoms before AddPolarHydrogens, which appended all atoms after it."""
+        ob = openbabel()
+        protonated = heavy is not None
+        heavy = heavy if protonated else obmol.NumAtoms()
+        residues = list(ob.OBResidueIter(obmol))
+        flags = obmol.GetFlags() & persisted_flags()
+        arrays = {'version': np.array(SNAPSHOT_VERSION), 'openbabel': np.array(ob.OBReleaseVersion()),
+                  'heavy': np.array(heavy), 'flags': np.array(flags & ~ob.OB_H_ADDED_MOL if protonated else flags),
+                  'title': np.array(obmol.GetTitle()),
+                  'residues': np.array([(ord(r.GetChain() or '\0'), ord(r.GetInsertionCode() or '\0'), r.GetChainNum())
+                                        for r in residues], dtype=RESIDUE_FIELDS),
+                  'residue_names': np.array([r.GetName() for r in residues], dtype=str),
+                  'residue_numbers': np.array([r.GetNumString() for r in residues], dtype=str)}
+        arrays.update(cls._atoms(obmol, 1, heavy, 'atom'))
+        bonds = [(b.GetBeginAtomIdx(), b.GetEndAtomIdx(), b.GetBondOrder()) for b in ob.OBMolBondIter(obmol)]
+        arrays['bonds'] = np.array([b for b in bonds if b[0] <= heavy and b[1] <= heavy], dtype=BOND_FIELDS)
+        records = [(d.GetAttribute(), d.GetValue()) for d in obmol.GetData() if d.GetDataType() == ob.PairData]
+        arrays['records'] = pack(records)  # Lengths vary too much for str
+        cell = obmol.GetData(ob.UnitCell)
+        cell = ob.toUnitCell(cell) if cell is not None else None
+        arrays['cell'] = np.array([cell.GetA(), cell.GetB(), cell.GetC(), cell.GetAlpha(), cell.GetBeta(),
+                                   cell.GetGamma()] if cell is not None else [], dtype='f8')
+        arrays['spacegroup'] = np.array(cell.GetSpaceGroupName() if cell is not None else '')
+        if protonated:
+            arrays.update(cls._atoms(obmol, heavy + 1, obmol.NumAtoms(), 'hydrogen'))
+            arrays['hydrogen_bonds'] = np.array([b for b in bonds if b[0] > heavy or b[1] > heavy], dtype=BOND_FIELDS)
+            arrays['protonated_flags'] = np.array(flags)
+            # AddPolarHydrogens turned the implicit hydrogens of polar atoms into the explicit ones bonded to them
+            added = Counter(min(begin, end) for begin, end, _ in arrays['hydrogen_bonds'].tolist())
+            implicit_h = arrays['atoms']['implicit_h']
+            arrays['protonated_h'] = np.array([(idx, implicit_h[idx - 1]) for idx in sorted(added)],
+                                              dtype=[('idx', 'i4'), ('implicit_h', 'u1')])
+            for idx, count in added.items():
+                implicit_h[idx - 1] += count
+        return cls(arrays)
+
+    @staticmethod
+    def _atoms(obmol, start, end, prefix):
+        """Atom arrays of the atoms with indices from start to end"""
+        atoms, names = [], []
+        for idx in range(start, end + 1):
+            atom = obmol.GetAtom(idx)
+            residue = atom.GetResidue()
+            atoms.append((atom.GetAtomicNum(), atom.GetX(), atom.GetY(), atom.GetZ(), atom.GetFormalCharge(),
+                          atom.GetImplicitHCount(), residue.GetIdx() if residue is not None else -1,
+                          residue is not None and residue.IsHetAtom(atom),
+                          residue.GetSerialNum(atom) if residue is not None else 0))
+            names.append(residue.GetAtomID(atom) if residue is not None else '')
+        return {f'{prefix}s': np.array(atoms, dtype=ATOM_FIELDS), f'{prefix}_names': np.array(names, dtype=str)}
+
+    def restore(self):
+        """Returns a Pybel molecule in the state after reading the PDB file."""
+        from openbabel import pybel
+        ob = pybel.ob
+        arrays = self.arrays
+        obmol = ob.OBMol()
+        obmol.BeginModify()
+        residues = []
+        for (chain, insertion, chainnum), name, number in zip(arrays['residues'].tolist(), arrays['residue_names'],
+                                                               arrays['residue_numbers']):
+            residue = obmol.NewResidue()
+            residue.SetName(str(name))
+            residue.SetNum(str(number))
+            residue.SetChain(chr(chain))
+            residue.SetInsertionCode(chr(insertion))
+            residue.SetChainNum(chainnum)
+            residues.append(residue)
+        self._add_atoms(obmol, residues, arrays['atoms'], arrays['atom_names'])
+        for begin, end, order in arrays['bonds'].tolist():
+            obmol.AddBond(begin, end, order)
+        obmol.EndModify()
+        obmol.SetTitle(str(arrays['title']))
+        for attribute, value in unpack(arrays['records']):
+            record = ob.OBPairData()
+            record.SetAttribute(attribute)
+            record.SetValue(value)
+            obmol.CloneData(record)
+        if len(arrays['cell']):
+            cell = ob.OBUnitCell()
+            cell.SetData(*arrays['cell'].tolist())
+            cell.SetSpaceGroup(str(arrays['spacegroup']))
+            obmol.CloneData(cell)
+        obmol.SetFlags(int(arrays['flags']))
+        return pybel.Molecule(obmol)
+
+    def protonate(self, obmol):
+        """Adds the hydrogens of the snapshot to a molecule restored from it, instead of AddPolarHydrogens."""
+        arrays = self.arrays
+        residues = [obmol.GetResidue(i) for i in range(obmol.NumResidues())]
+        obmol.BeginModify()
+        self._add_atoms(obmol, residues, arrays['hydrogens'], arrays['hydrogen_names'])
+        for begin, end, order in arrays['hydrogen_bonds'].tolist():
+            obmol.AddBond(begin, end, order)
+        obmol.EndModify()
+        for idx, count in arrays['protonated_h'].tolist():
+            obmol.GetAtom(idx).SetImplicitHCount(count)
+        obmol.SetFlags(int(arrays['protonated_flags']))
+
+    @staticmethod
+    def _add_atoms(obmol, residues, atoms, names):
+        for (atomicnum, x, y, z, charge, implicit_h, residue, hetatm, serial), name in zip(atoms.tolist(), names):
+            atom = obmol.NewAtom()
+            atom.SetAtomicNum(atomicnum)
+            atom.SetVector(x, y, z)
+            # Setters are only called for values other than the defaults of new atoms, to save calls into OpenBabel
+            if charge:
+                atom.SetFormalCharge(charge)
+            if implicit_h:
+                atom.SetImplicitHCount(implicit_h)
+            if residue >= 0:
+                residue = residues[residue]
+                residue.AddAtom(atom)
+                residue.SetAtomID(atom, str(name))
+                if hetatm:
+                    residue.SetHetAtom(atom, True)
+                if serial:
+                    residue.SetSerialNum(atom, serial)
+
+    def save(self, path):
+        np.savez(path, **self.arrays)
+
+    @classmethod
+    def load(cls, path):
+        """Returns the snapshot stored in the file or None if it was written by another version."""
+        with np.load(path, allow_pickle=False) as f:
+            arrays = dict(f)
+        if int(arrays['version']) != SNAPSHOT_VERSION or str(arrays['openbabel']) != openbabel().OBReleaseVersion():
+            return None
+        return cls(arrays)
+
+
+class SnapshotCache(DirectoryCache):
+    """On-disk cache of structure snapshots, with entries named after the hash of the input (see snapshot_key)
+    and least-recently-used eviction (see DirectoryCache)."""
+
+    suffix = '.npz'
+
+    def get(self, key):
+        """Returns the cached snapshot or None on a cache miss."""
+        path = self.entry(key)
+        try:
+            snapshot = MolSnapshot.load(path)
+        except (OSError, ValueError, KeyError):
+            snapshot = None
+        if snapshot is None:
+            event('snapshot_cache_miss')
+            return None
+        event('snapshot_cache_hit')
+        self.touch(path)
+        logger.info('reading prepared structure from snapshot cache')
+        return snapshot
+
+    def put(self, key, snapshot):
+        """Adds a snapshot to the cache and removes the least recently used entries if the cache is full."""
+        self.write(key, snapshot.save)
@@ -0,0 +1,118 @@
+# coding=utf-8
+"""
+Protein-Ligand Interaction Profiler - Analyze and visualize protein-ligand interactions in PDB files.
+test_agent.py - Unit Tests for the asynchronous API client.
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+
+try:
+    import httpx
+    from plip_agent import PLIPAgent
+except ImportError:
+    httpx = None
+
+
+@unittest.skipIf(httpx is None, 'httpx is not installed')
+class AgentTest(unittest.IsolatedAsyncioTestCase):
+    """Checks waiting for tasks and the number of structures in flight against a mocked API"""
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmpdir.name)  # The agent creates its output directory here
+        self.requests = []
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmpdir.cleanup()
+
+    def agent(self, handler, **settings):
+        """Agent sending its requests to handler(request) instead of a server"""
+        async def record(request):
+            self.requests.append(request)
+            return await handler(request)
+        agent = PLIPAgent(**settings)
+        agent._client = httpx.AsyncClient(transport=httpx.MockTransport(record), base_url='http://plip')
+        return agent
+
+    @staticmethod
+    def statuses(*answers):
+        """Handler answering status requests with the given statuses, the last one repeatedly"""
+        answers = list(answers)
+
+        async def handler(request):
+            if request.url.path.startswith('/task_progress/'):
+                return httpx.Response(200, json={'status': 'failed', 'error': 'no ligands'})
+            return httpx.Response(200, json=answers.pop(0) if len(answers) > 1 else answers[0])
+        return handler
+
+    async def test_completed(self):
+        """Test if a completed status is returned."""
+        async with self.agent(self.statuses('completed')) as agent:
+            status = await agent.wait_for_task('task')
+        self.assertEqual(status, {'status': 'completed', 'task_id': 'task'})
+        self.assertEqual(len(self.requests), 1)
+        self.assertGreater(float(self.requests[0].url.params['wait']), 0)
+
+    async def test_failed(self):
+        """Test if a failed task raises with the error looked up in its progress."""
+        async with self.agent(self.statuses('failed')) as agent:
+            with self.assertRaisesRegex(Exception, 'Analysis failed: no ligands'):
+                await agent.wait_for_task('task')
+        self.assertEqual([request.url.path for request in self.requests], ['/task_status/task',
+                                                                            '/task_progress/task'])
+
+    async def test_polling(self):
+        """Test if the status is polled with backoff if the server answers long-polls right away."""
+        async with self.agent(self.statuses('running', 'running', 'completed'), poll_interval=0.05) as agent:
+            start = time.monotonic()
+            status = await agent.wait_for_task('task')
+        self.assertEqual(status['status'], 'completed')
+        self.assertEqual(len(self.requests), 3)
+        self.assertGreaterEqual(time.monotonic() - start, 0.05 + 0.1)  # Delay doubled after the first poll
+
+    async def test_timeout(self):
+        """Test if waiting ends after the overall time limit."""
+        async with self.agent(self.statuses('running'), poll_interval=0.05) as agent:
+            start = time.monotonic()
+            with self.assertRaises(TimeoutError):
+                await agent.wait_for_task('task', max_wait_time=0.3)
+        self.assertLess(time.monotonic() - start, 2)
+
+    async def test_concurrency(self):
+        """Test if at most `concurrency` structures are submitted but not finished."""
+        in_flight, most = set(), []
+
+        async def handler(request):
+            if request.url.path == '/inference':
+                task_id = 'task%i' % len(self.requests)
+                in_flight.add(task_id)
+                most.append(len(in_flight))
+                return httpx.Response(202, json={'task_id': task_id})
+            await asyncio.sleep(0.01)
+            in_flight.discard(request.url.path.split('/')[-1])
+            return httpx.Response(200, json='completed')
+
+        async with self.agent(handler) as agent:
+            results = await agent.analyze_many(['%ixyz' % i for i in range(10)], concurrency=3, download=False)
+        self.assertEqual([result['status'] for result in results], ['completed'] * 10)
+        self.assertEqual(max(most), 3)
+
+    async def test_submit_file(self):
+        """Test if a local structure is uploaded as file."""
+        async def handler(request):
+            return httpx.Response(202, json={'task_id': 'task'})
+
+        with open('1vsn.pdb', 'w') as f:
+            f.write('ATOM\n')
+        async with self.agent(handler) as agent:
+            task = await agent.submit('1vsn.pdb')
+        self.assertEqual(task, {'task_id': 'task', 'pdb_id': '1vsn'})
+        body = self.requests[0].read()
+        self.assertIn(b'filename="1vsn.pdb"', body)
+        self.assertIn(b'\r\n\r\nATOM\n', body)
@@ -0,0 +1,308 @@
+# coding=utf-8
+"""
+Protein-Ligand Interaction Profiler - Analyze and visualize protein-ligand interactions in PDB files.
+test_api.py - Unit Tests for the task submission and downloads of the REST API.
+"""
+
+import asyncio
+import gzip
+import io
+import json
+import os
+import tarfile
+import tempfile
+import time
+import unittest
+import zipfile
+import zlib
+from pathlib import Path
+
+from plip import plip_task
+from plip.plip_download import accepts_gzip, iter_tar, iter_zip, parse_range
+
+try:
+    import httpx
+    from fastapi.testclient import TestClient
+except ImportError:
+    TestClient = None
+
+
+class DownloadHelpersTest(unittest.TestCase):
+    """Checks the parsing of request headers and the streamed archives"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.paths = []
+        for name, content in (('report.txt', b'PLIP report\n' * 1000), ('report.xml', b'<report/>'),
+                              ('empty.pdb', b'')):
+            path = Path(self.tmpdir.name) / name
+            path.write_bytes(content)
+            self.paths.append(path)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_parse_range(self):
+        """Test if single byte ranges are parsed, others ignored and unsatisfiable ones rejected."""
+        self.assertEqual(parse_range('bytes=0-9', 100), (0, 9))
+        self.assertEqual(parse_range('bytes=90-', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=-10', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=-200', 100), (0, 99))
+        self.assertEqual(parse_range('bytes=50-200', 100), (50, 99))
+        self.assertIsNone(parse_range('items=0-9', 100))
+        self.assertIsNone(parse_range('bytes=0-9,20-29', 100))
+        self.assertIsNone(parse_range('bytes=a-b', 100))
+        with self.assertRaises(ValueError):
+            parse_range('bytes=100-', 100)
+        with self.assertRaises(ValueError):
+            parse_range('bytes=9-0', 100)
+
+    def test_accepts_gzip(self):
+        """Test if gzip is accepted unless excluded by its weight, also for malformed weights."""
+        self.assertTrue(accepts_gzip('gzip, deflate'))
+        self.assertTrue(accepts_gzip('deflate, GZIP;q=0.5'))
+        self.assertTrue(accepts_gzip('*'))
+        self.assertFalse(accepts_gzip(None))
+        self.assertFalse(accepts_gzip('deflate, br'))
+        self.assertFalse(accepts_gzip('gzip;q=0'))
+        self.assertFalse(accepts_gzip('gzip;q=abc'))
+
+    def test_iter_tar(self):
+        """Test if the streamed tar archive contains all files."""
+        with tarfile.open(fileobj=io.BytesIO(b''.join(iter_tar(self.paths)))) as archive:
+            self.assertEqual(archive.getnames(), [path.name for path in self.paths])
+            for path in self.paths:
+                self.assertEqual(archive.extractfile(path.name).read(), path.read_bytes())
+
+    def test_iter_zip(self):
+        """Test if the streamed zip archive contains all files."""
+        with zipfile.ZipFile(io.BytesIO(b''.join(iter_zip(self.paths)))) as archive:
+            self.assertIsNone(archive.testzip())
+            self.assertEqual(archive.namelist(), [path.name for path in self.paths])
+            for path in self.paths:
+                self.assertEqual(archive.read(path.name), path.read_bytes())
+
+
+class Upload:
+    """Stand-in for UploadFile, returning the data in small chunks"""
+
+    def __init__(self, data, chunksize=7):
+        self.data = io.BytesIO(data)
+        self.chunksize = chunksize
+
+    async def read(self, size=-1):
+        return self.data.read(min(size, self.chunksize))
+
+
+class UploadTest(unittest.TestCase):
+    """Checks if uploads are stored and decompressed chunk by chunk"""
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmpdir.name)
+        self.task_id = plip_task.new_task_id()
+        self.structure = b'ATOM      1  N   MET A   1      27.340  24.430   2.614  1.00  9.67           N\n' * 10
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmpdir.cleanup()
+
+    def save(self, data):
+        with open(asyncio.run(plip_task.save_upload(self.task_id, Upload(data))), 'rb') as f:
+            return f.read()
+
+    def test_plain(self):
+        """Test if uncompressed uploads are stored as they are."""
+        self.assertEqual(self.save(self.structure), self.structure)
+
+    def test_gzip(self):
+        """Test if gzip-compressed uploads are decompressed, also if they consist of several members."""
+        self.assertEqual(self.save(gzip.compress(self.structure)), self.structure)
+        half = len(self.structure) // 2
+        members = gzip.compress(self.structure[:half]) + gzip.compress(self.structure[half:])
+        self.assertEqual(self.save(members), self.structure)
+
+    def test_invalid_gzip(self):
+        """Test if truncated uploads and trailing data are rejected and the partial file is removed."""
+        compressed = gzip.compress(self.structure)
+        with self.assertRaises(ValueError):
+            self.save(compressed[:len(compressed) // 2])
+        self.assertFalse(plip_task.task_input_path(self.task_id).exists())
+        with self.assertRaises(zlib.error):
+            self.save(compressed + b'trailing data')
+        self.assertFalse(plip_task.task_input_path(self.task_id).exists())
+
+
+class SubmissionTest(unittest.TestCase):
+    """Checks the admission of new tasks"""
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmpdir.name)
+        self.max_queued = plip_task.scheduler.max_queued
+
+    def tearDown(self):
+        plip_task.scheduler.max_queued = self.max_queued
+        os.chdir(self.cwd)
+        self.tmpdir.cleanup()
+
+    def test_rejected_upload(self):
+        """Test if the upload of a task rejected because of a full queue is removed."""
+        task_id = plip_task.new_task_id()
+        input_file = plip_task.task_input_path(task_id)
+        input_file.write_text('ATOM\n')
+        plip_task.scheduler.max_queued = 0
+        with self.assertRaises(plip_task.QueueFullError):
+            asyncio.run(plip_task.process_task({'input_file': str(input_file)}, task_id))
+        self.assertFalse(os.path.exists(os.path.join('storage', task_id)))
+
+
+@unittest.skipIf(TestClient is None, 'fastapi is not installed')
+class InferenceEndpointTest(unittest.TestCase):
+    """Checks the validation of submitted tasks"""
+
+    def test_no_listener_on_import(self):
+        """Test if metrics are only collected in the API process once it serves requests."""
+        from plip.basic import instrumentation
+        import plip.plip_api  # noqa: F401
+        self.assertIsNone(instrumentation._listener)
+
+    def test_invalid_pdb_id(self):
+        """Test if IDs other than PDB IDs are rejected."""
+        from plip.plip_api import app
+        client = TestClient(app)
+        for pdb_id in ('../../etc/passwd', '/tmp/x/secret/leak', '1vsn1', 1234):
+            response = client.post('/inference', data={'body': json.dumps({'pdb_id': pdb_id})})
+            self.assertEqual(response.status_code, 400)
+
+
+@unittest.skipIf(TestClient is None, 'fastapi is not installed')
+class DownloadEndpointTest(unittest.TestCase):
+    """Checks conditional, partial and compressed downloads of a single artifact"""
+
+    def setUp(self):
+        from plip.plip_api import app
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmpdir.name)
+        self.task_id = plip_task.new_task_id()
+        plip_task.tasks[self.task_id] = 'completed'
+        self.content = b'PLIP report\n' * 1000
+        os.makedirs(os.path.join('storage', self.task_id))
+        with open(os.path.join('storage', self.task_id, 'report.txt'), 'wb') as f:
+            f.write(self.content)
+        self.url = f'/download/{self.task_id}'
+        self.client = TestClient(app)  # Not entered, so no analysis workers are started
+
+    def tearDown(self):
+        plip_task.tasks.pop(self.task_id, None)
+        os.chdir(self.cwd)
+        self.tmpdir.cleanup()
+
+    def test_range(self):
+        """Test if byte ranges are answered with 206 and unsatisfiable ones with 416."""
+        response = self.client.get(self.url, headers={'Range': 'bytes=12-23', 'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.headers['content-range'], f'bytes 12-23/{len(self.content)}')
+        self.assertNotIn('content-encoding', response.headers)
+        self.assertEqual(response.content, self.content[12:24])
+        response = self.client.get(self.url, headers={'Range': f'bytes={len(self.content)}-'})
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response.headers['content-range'], f'bytes */{len(self.content)}')
+
+    def test_if_range(self):
+        """Test if a range is ignored if If-Range does not match the current ETag."""
+        response = self.client.get(self.url, headers={'Range': 'bytes=0-9', 'If-Range': '"outdated"',
+                                                      'Accept-Encoding': 'identity'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, self.content)
+
+    def test_not_modified(self):
+        """Test if If-None-Match is compared with the ETag of the representation that is served."""
+        for encoding in ('identity', 'gzip'):
+            response = self.client.get(self.url, headers={'Accept-Encoding': encoding})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.content, self.content)
+            etag = response.headers['etag']
+            response = self.client.get(self.url, headers={'Accept-Encoding': encoding, 'If-None-Match': etag})
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.headers['etag'], etag)
+        gzip_etag = response.headers['etag']
+        response = self.client.get(self.url, headers={'Accept-Encoding': 'identity', 'If-None-Match': gzip_etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_gzip(self):
+        """Test if the artifact is compressed if the client accepts gzip."""
+        response = self.client.get(self.url, headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['content-encoding'], 'gzip')
+        self.assertEqual(response.content, self.content)  # Decoded by the client
+        response = self.client.get(self.url, headers={'Accept-Encoding': 'gzip;q=abc'})
+        self.assertNotIn('content-encoding', response.headers)
+        self.assertEqual(response.content, self.content)
+
+
+@unittest.skipIf(TestClient is None, 'fastapi is not installed')
+class PushChannelTest(unittest.IsolatedAsyncioTestCase):
+    """Checks long-polling and Server-Sent Events for task updates. The app runs in the event loop of the test
+    (instead of the thread of TestClient), so that tasks can be updated while a request waits."""
+
+    async def asyncSetUp(self):
+        from plip.plip_api import app
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://plip')
+        self.task_id = plip_task.new_task_id()
+        plip_task.update_task(self.task_id, 'running', stage='loading')
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+        for state in (plip_task.tasks, plip_task.task_progress, plip_task.task_versions, plip_task.task_updates):
+            state.pop(self.task_id, None)
+
+    def update_later(self, *updates, delay=0.2):
+        """Applies the updates (status, progress) one after another while a request waits"""
+        loop = asyncio.get_running_loop()
+        for i, (status, progress) in enumerate(updates, 1):
+            loop.call_later(i * delay, lambda status=status, progress=progress:
+                            plip_task.update_task(self.task_id, status, **progress))
+
+    async def test_wait_for_status(self):
+        """Test if a long-poll for the status returns as soon as the task is finished."""
+        self.update_later((None, {'stage': 'analysis'}), ('completed', {'stage': 'completed'}))
+        start = time.monotonic()
+        response = await self.client.get(f'/task_status/{self.task_id}', params={'wait': 30})
+        self.assertEqual(response.json(), 'completed')
+        self.assertLess(time.monotonic() - start, 5)
+
+    async def test_wait_for_progress(self):
+        """Test if a long-poll for progress returns with the first update after the given version."""
+        version = plip_task.get_task_info(self.task_id)['version']
+        start = time.monotonic()
+        response = await self.client.get(f'/task_progress/{self.task_id}', params={'wait': 30, 'version': version - 1})
+        self.assertEqual(response.json()['version'], version)  # Already newer, answered right away
+        self.assertLess(time.monotonic() - start, 1)
+        self.update_later((None, {'stage': 'analysis', 'ligand': 1, 'ligands': 2}))
+        response = await self.client.get(f'/task_progress/{self.task_id}', params={'wait': 30, 'version': version})
+        info = response.json()
+        self.assertEqual(info['version'], version + 1)
+        self.assertEqual((info['status'], info['stage'], info['ligand'], info['ligands']),
+                         ('running', 'analysis', 1, 2))
+        self.assertLess(time.monotonic() - start, 5)
+
+    async def test_events(self):
+        """Test if progress is streamed as events until the task is finished."""
+        self.update_later((None, {'stage': 'analysis'}), ('completed', {'stage': 'completed'}))
+        response = await self.client.get(f'/task_events/{self.task_id}')
+        self.assertEqual(response.headers['content-type'].split(';')[0], 'text/event-stream')
+        events = [json.loads(line[len('data: '):]) for line in response.text.splitlines() if line.startswith('data: ')]
+        self.assertEqual(response.text.count('event: progress'), 3)
+        self.assertEqual([(event['status'], event['stage']) for event in events],
+                         [('running', 'loading'), ('running', 'analysis'), ('completed', 'completed')])
+
+    async def test_unknown_task(self):
+        """Test if unknown tasks are answered with 404."""
+        for url, params in (('/task_status/unknown', {}), ('/task_status/unknown', {'wait': 1}),
+                            ('/task_progress/unknown', {}), ('/task_progress/unknown', {'wait': 1}),
+                            ('/task_events/unknown', {})):
+            response = await self.client.get(url, params=params)
+            self.assertEqual(response.status_code, 404)
@@ -10,8 +10,9 @@ import unittest
 
 import numpy
 
+from plip.basic import instrumentation
 from plip.basic.supplemental import euclidean3d, vector, vecangle, projection
-from plip.basic.supplemental import normalize_vector, cluster_doubles, centroid
+from plip.basic.supplemental import normalize_vector, cluster_doubles, centroid, UnionFind, int32_to_negative
 # Own modules
 from plip.structure.preparation import PDBComplex
 
@@ -75,6 +76,16 @@ class TestMapping(unittest.TestCase):
                 self.assertEqual(contact.don.x_orig_idx, 1628)
                 self.assertEqual(contact.acc.o_orig_idx, 1191)
 
+    def test_int32_to_negative(self):
+        """Negative residue numbers read as unsigned 32 bit integers are converted back."""
+        self.assertEqual(int32_to_negative(4294967295), -1)
+        self.assertEqual(int32_to_negative(4294966296), -1000)
+        self.assertEqual(int32_to_negative(2 ** 31), -2 ** 31)
+        self.assertEqual([int32_to_negative(i) for i in range(-5, 5)], list(range(-5, 5)))
+        self.assertEqual(int32_to_negative(2 ** 31 - 1), 2 ** 31 - 1)
+        for i in [-1, -2, -999, -1001, -123456]:
+            self.assertEqual(int32_to_negative(int(numpy.array(i).astype(numpy.uint32))), i)
+
 
 class GeometryTest(unittest.TestCase):
     """Tests for geometrical calculations in PLIP"""
@@ -142,3 +153,56 @@ class GeometryTest(unittest.TestCase):
         """Tests for mathematics.cluster_doubles"""
         # Are the results correct?
         self.assertEqual(set(cluster_doubles([(1, 3), (4, 1), (5, 6), (7, 5)])), {(1, 3, 4), (5, 6, 7)})
+        # Clusters joined by a later double are merged, clusters keep the order of their first double
+        self.assertEqual([set(c) for c in cluster_doubles([(8, 9), (1, 2), (3, 4), (2, 3), (9, 8)])],
+                         [{8, 9}, {1, 2, 3, 4}])
+
+    def test_union_find(self):
+        """Tests for supplemental.UnionFind"""
+        sets = UnionFind()
+        for a, b in [(1, 3), (4, 1), (5, 6), (7, 5), (8, 8)]:
+            sets.union(a, b)
+        self.assertEqual(sets.find(4), sets.find(3))
+        self.assertNotEqual(sets.find(1), sets.find(5))
+        self.assertEqual(sorted(sorted(group) for group in sets.groups().values()), [[1, 3, 4], [5, 6, 7], [8]])
+        self.assertNotIn(2, sets)
+
+
+class TestInstrumentation(unittest.TestCase):
+    """Test reporting of analysis stages to a listener"""
+
+    class Listener:
+        def __init__(self):
+            self.stages = []
+            self.events = []
+            self.observations = []
+
+        def stage(self, name, seconds):
+            self.stages.append(name)
+
+        def event(self, name):
+            self.events.append(name)
+
+        def observe(self, name, value):
+            self.observations.append((name, value))
+
+    def tearDown(self):
+        instrumentation.set_listener(None)
+
+    def test_stages(self):
+        """Stages of the analysis are reported while a listener is set"""
+        listener = self.Listener()
+        instrumentation.set_listener(listener)
+        tmpmol = PDBComplex()
+        tmpmol.load_pdb('./pdb/1vsn.pdb')
+        tmpmol.analyze()
+        instrumentation.event('test')
+        instrumentation.observe('test', 1.0)
+        for name in ['parse', 'ligand_detection', 'protonation', 'interactions', 'detect.hbonds']:
+            self.assertIn(name, listener.stages)
+        self.assertEqual(listener.events, ['test'])
+        self.assertIn(('test', 1.0), listener.observations)
+        instrumentation.set_listener(None)
+        with instrumentation.stage('unreported'):
+            pass
+        self.assertNotIn('unreported', listener.stages)
@@ -47,10 +47,57 @@ class CommandLineTest(unittest.TestCase):
 
     def test_valid_pdb(self):
         """A PDB ID with no valid PDB record is provided."""
-        exitcode = subprocess.call(f'{sys.executable} ../plipcmd.py -x -f ./pdb/1eve.pdb -o {self.tmp_dir.name}',
+        exitcode = subprocess.call(f'{sys.executable} ../plipcmd.py -x --protonated -f ./pdb/1eve.pdb '
+                                   f'-o {self.tmp_dir.name}', shell=True)
+        self.assertEqual(len(os.listdir(self.tmp_dir.name)), 2)  # Report and protonated structure
+        self.assertEqual(exitcode, 0)
+
+    def test_snapshot(self):
+        """The prepared complex is saved with --snapshot and analyzed again from the snapshot."""
+        exitcode = subprocess.call(f'{sys.executable} ../plipcmd.py -t --snapshot -f ./pdb/1eve.pdb '
+                                   f'-o {self.tmp_dir.name}', shell=True)
+        self.assertEqual(exitcode, 0)
+        snapshot = os.path.join(self.tmp_dir.name, '1eve.plip.npz')
+        self.assertTrue(os.path.isfile(snapshot))
+        with open(os.path.join(self.tmp_dir.name, 'report.txt')) as f:
+            report = f.read()
+        exitcode = subprocess.call(f'{sys.executable} ../plipcmd.py -t -f {snapshot} -o {self.tmp_dir.name}',
                                    shell=True)
-        self.assertEqual(len(os.listdir(self.tmp_dir.name)), 2)
         self.assertEqual(exitcode, 0)
+        with open(os.path.join(self.tmp_dir.name, 'report.txt')) as f:
+            self.assertEqual(f.read(), report)
+
+    def test_snapshots(self):
+        """Reports for several snapshots are written to folders named after the structures."""
+        exitcode = subprocess.call(f'{sys.executable} ../plipcmd.py -t --snapshot -f ./pdb/1eve.pdb ./pdb/1vsn.pdb '
+                                   f'-o {self.tmp_dir.name}', shell=True)
+        self.assertEqual(exitcode, 0)
+        snapshots = [os.path.join(self.tmp_dir.name, pdbid, f'{pdbid}.plip.npz') for pdbid in ('1eve', '1vsn')]
+        outpath = os.path.join(self.tmp_dir.name, 'from_snapshots')
+        exitcode = subprocess.call(f'{sys.executable} ../plipcmd.py -t -f {" ".join(snapshots)} -o {outpath}',
+                                   shell=True)
+        self.assertEqual(exitcode, 0)
+        for pdbid in ('1eve', '1vsn'):
+            self.assertTrue(os.path.isfile(os.path.join(outpath, pdbid, 'report.txt')))
+
+    def test_threshold_sweep(self):
+        """Reports are written for each setting of a threshold sweep."""
+        settings = os.path.join(self.tmp_dir.name, 'sweep.json')
+        with open(settings, 'w') as f:
+            f.write('[{"hbond_dist_max": 3.5}, {"hbond_dist_max": 4.5, "hydroph_dist_max": 4.5}]')
+        exitcode = subprocess.call(f'{sys.executable} ../plipcmd.py -t --sweep {settings} -f ./pdb/1vsn.pdb '
+                                   f'-o {self.tmp_dir.name}', shell=True)
+        self.assertEqual(exitcode, 0)
+        self.assertTrue(os.path.isfile(os.path.join(self.tmp_dir.name, 'report_sweep1.txt')))
+        self.assertTrue(os.path.isfile(os.path.join(self.tmp_dir.name, 'report_sweep2.txt')))
+
+    def test_interfaces(self):
+        """All interfaces between chains are characterized in parallel and written to one report."""
+        exitcode = subprocess.call(f'{sys.executable} ../plipcmd.py -x --interfaces --maxthreads 2 '
+                                   f'-f ./pdb/4day.pdb -o {self.tmp_dir.name}', shell=True)
+        self.assertEqual(exitcode, 0)
+        with open(os.path.join(self.tmp_dir.name, 'report.xml')) as f:
+            self.assertEqual(f.read().count('<bindingsite '), 3)  # Chains A-B, A-C and B-C
 
     def test_stdout(self):
         """A PDB ID with no valid PDB record is provided."""
@@ -0,0 +1,58 @@
+# coding=utf-8
+"""
+Protein-Ligand Interaction Profiler - Analyze and visualize protein-ligand interactions in PDB files.
+test_fingerprint.py - Unit Tests for interaction fingerprints and the similarity index.
+"""
+
+import unittest
+
+import numpy
+
+from plip.exchange.fingerprint import FingerprintEncoder, SimilarityIndex, INTERACTION_TYPES
+from plip.exchange.xml import PlipXML
+from plip.structure.preparation import PDBComplex
+
+
+class FingerprintTest(unittest.TestCase):
+    """Checks if fingerprints are generated and compared correctly"""
+
+    def setUp(self):
+        self.bsite = PlipXML('./xml/1vsn.report.xml').bsites['NFT:A:283']
+
+    def test_residue_fingerprint(self):
+        """Test if fingerprints over a residue list have one position per residue and interaction type."""
+        encoder = FingerprintEncoder(residues=[(61, 'A'), (67, 'A'), (999, 'A')])
+        self.assertEqual(encoder.nbits, 3 * len(INTERACTION_TYPES))
+        counts = encoder.counts(self.bsite)
+        hydrophobic, halogen = INTERACTION_TYPES.index('hydrophobic'), INTERACTION_TYPES.index('halogen')
+        self.assertEqual(counts[hydrophobic], 1)  # ASP61
+        self.assertEqual(counts[len(INTERACTION_TYPES) + halogen], 1)  # TYR67
+        self.assertEqual(counts[2 * len(INTERACTION_TYPES):].sum(), 0)
+
+    def test_hashed_fingerprint(self):
+        """Test if hashed fingerprints count all interactions and agree between XML and live analysis."""
+        encoder = FingerprintEncoder(nbits=4096)
+        self.assertEqual(encoder.counts(self.bsite).sum(), self.bsite.counts['total'])
+        tmpmol = PDBComplex()
+        tmpmol.load_pdb('./pdb/1vsn.pdb')
+        tmpmol.analyze()
+        fingerprints = encoder.encode_complex(tmpmol)
+        self.assertEqual(list(fingerprints), ['NFT:A:283'])
+        live = tmpmol.interaction_sets['NFT:A:283']
+        self.assertEqual(encoder.counts(live).sum(), len(live.all_itypes))
+        self.assertEqual(fingerprints['NFT:A:283'].tolist(), encoder.packed(live).tolist())
+
+    def test_similarity_index(self):
+        """Test if the similarity index ranks fingerprints by Tanimoto similarity."""
+        bits = numpy.zeros((3, 100), dtype=bool)
+        bits[0, :10] = True
+        bits[1, :20] = True
+        bits[2, 50:60] = True
+        index = SimilarityIndex(100)
+        index.add(['a', 'b'], numpy.packbits(bits[:2], axis=1))
+        index.add(['c'], numpy.packbits(bits[2:], axis=1))
+        self.assertEqual(len(index), 3)
+        self.assertEqual(index.search(numpy.packbits(bits[0]), top=2), [('a', 1.0), ('b', 0.5)])
+        self.assertEqual(index.search(numpy.packbits(bits[0]), threshold=0.1), [('a', 1.0), ('b', 0.5)])
+        with self.assertRaises(ValueError):
+            index.add(['d'], numpy.zeros((1, 4), dtype=numpy.uint8))
@@ -16,3 +16,52 @@ class IntraTest(unittest.TestCase):
             structure_report = StructureReport(pdb_complex, outputprefix="test_")
             structure_report.write_xml(as_string=True)
         config.PEPTIDES = []
+
+    def test_4day_blocks(self):
+        """Comparing the peptide in blocks of residues finds the same interactions as comparing all of it."""
+        config.PEPTIDES = ['C']
+        pdb_complex = PDBComplex()
+        pdb_complex.load_pdb('./pdb/4day.pdb')
+        ligand = [lig for lig in pdb_complex.ligands if lig.type == 'PEPTIDE'][0]
+        interactions = []
+        for blocks in [None, 1, 4]:
+            config.BLOCKS = blocks
+            pdb_complex.characterize_complex(ligand)
+            s = pdb_complex.interaction_sets[ligand.mol.title]
+            interactions.append([(type(i).__name__, i.resnr, i.reschain, i.resnr_l, i.reschain_l) for i in
+                                 s.all_itypes] + [(r, s.bindingsite.min_dist[r]) for r in s.bindingsite.bs_res])
+        config.BLOCKS = None
+        config.PEPTIDES = []
+        self.assertGreater(len(interactions[0]), 0)
+        self.assertEqual(interactions[0], interactions[1])
+        self.assertEqual(interactions[0], interactions[2])
+
+    def test_4day_interfaces(self):
+        """All interfaces are characterized as with the receptor and ligand chains of each defined with --chains."""
+        config.INTERFACES = True
+        pdb_complex = PDBComplex()
+        pdb_complex.load_pdb('./pdb/4day.pdb')
+        config.INTERFACES = False
+        interfaces = pdb_complex.interfaces()
+        self.assertEqual([(receptor, ligand.chain) for receptor, ligand in interfaces], [('A', 'B'), ('A', 'C'),
+                                                                                        ('B', 'C')])
+        sites = [pdb_complex.characterize_interface(receptor, ligand) for receptor, ligand in interfaces]
+        self.assertEqual(sorted(pdb_complex.interaction_sets), sorted(sites))
+        self.assertIsNone(config.CHAINS)
+        interface = pdb_complex.interaction_sets[sites[1]]
+        config.BLOCKS = config.INTERFACE_BLOCKS  # Default of --interfaces
+        interface_blocks = pdb_complex.interaction_sets[pdb_complex.characterize_interface(*interfaces[1])]
+        config.BLOCKS = None
+        config.CHAINS = [['A'], ['C']]
+        pdb_complex = PDBComplex()
+        pdb_complex.load_pdb('./pdb/4day.pdb')
+        for ligand in pdb_complex.ligands:
+            pdb_complex.characterize_complex(ligand)
+        config.CHAINS = None
+        chains = pdb_complex.interaction_sets[pdb_complex.ligands[0].mol.title]
+        self.assertGreater(len(chains.all_itypes), 0)
+        for s in (interface, interface_blocks):
+            self.assertEqual([(type(i).__name__, i.resnr, i.reschain, i.resnr_l, i.reschain_l)
+                              for i in chains.all_itypes],
+                             [(type(i).__name__, i.resnr, i.reschain, i.resnr_l, i.reschain_l) for i in s.all_itypes])
+            self.assertEqual(sorted(chains.bindingsite.bs_res), sorted(s.bindingsite.bs_res))
@@ -5,9 +5,14 @@ test_remote_services.py - Unit Tests for remote services.
 """
 
 
+import gzip
+import os
+import shutil
+import tempfile
+import time
 import unittest
 
-from plip.exchange.webservices import check_pdb_status
+from plip.exchange.webservices import check_pdb_status, fetch_pdb, LocalMirror, DownloadCache, PDBFetchError
 
 
 class TestPDB(unittest.TestCase):
@@ -29,3 +34,53 @@ class TestPDB(unittest.TestCase):
         status, current_pdbid = check_pdb_status('xxxx')
         self.assertEqual(status, 'UNKNOWN')
         self.assertEqual(current_pdbid, 'xxxx')
+
+
+class TestStructureSources(unittest.TestCase):
+    """Test the local PDB mirror and the download cache"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.mirror = os.path.join(self.tmpdir, 'mirror')
+        os.makedirs(os.path.join(self.mirror, 'vs'))
+        with open('./pdb/1vsn.pdb', 'rb') as f, gzip.open(os.path.join(self.mirror, 'vs', 'pdb1vsn.ent.gz'), 'wb') as g:
+            shutil.copyfileobj(f, g)
+        with open('./pdb/1vsn.pdb') as f:
+            self.pdbfile = f.read()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_mirror_and_cache(self):
+        """Structures from the mirror are added to a cache listed after it"""
+        cache = DownloadCache(os.path.join(self.tmpdir, 'cache'), maxsize=2)
+        pdbfile, pdbid = fetch_pdb('1VSN', sources=[cache, LocalMirror(self.mirror)])
+        self.assertEqual(pdbid, '1vsn')
+        self.assertEqual(pdbfile, self.pdbfile)
+        self.assertEqual(fetch_pdb('1vsn', sources=[cache])[0], self.pdbfile)
+        with self.assertRaises(PDBFetchError):
+            fetch_pdb('2reg', sources=[cache, LocalMirror(self.mirror)])
+
+    def test_invalid_pdbid(self):
+        """IDs other than PDB IDs are rejected before they are used in paths"""
+        with open(os.path.join(self.tmpdir, 'secret.pdb'), 'w') as f:
+            f.write(self.pdbfile)
+        cache = DownloadCache(os.path.join(self.tmpdir, 'cache'), maxsize=2)
+        for pdbid in (os.path.join(self.tmpdir, 'secret'), 'x/../../secret', '1vsn/', ''):
+            with self.assertRaises(PDBFetchError):
+                fetch_pdb(pdbid, sources=[cache, LocalMirror(self.mirror)])
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir, 'cache')))
+
+    def test_cache_eviction(self):
+        """The least recently used entries are removed from a full cache"""
+        cache = DownloadCache(os.path.join(self.tmpdir, 'cache'), maxsize=2)
+        cache.put('1aaa', 'first')
+        cache.put('1bbb', 'second')
+        past = time.time() - 60
+        os.utime(cache.entry('1aaa'), (past, past))
+        os.utime(cache.entry('1bbb'), (past - 60, past - 60))
+        self.assertEqual(cache.get('1bbb'), 'second')  # Refreshes 1bbb
+        cache.put('1ccc', 'third')
+        self.assertIsNone(cache.get('1aaa'))
+        self.assertEqual(cache.get('1bbb'), 'second')
+        self.assertEqual(cache.get('1ccc'), 'third')
@@ -0,0 +1,65 @@
+# coding=utf-8
+"""
+Protein-Ligand Interaction Profiler - Analyze and visualize protein-ligand interactions in PDB files.
+test_report_index.py - Unit Tests for the SQLite report index.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from plip.exchange.index import ReportIndex
+
+
+class ReportIndexTest(unittest.TestCase):
+    """Checks if reports are indexed, re-indexed and queried correctly"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.reports = os.path.join(self.tmpdir, 'reports')
+        os.makedirs(os.path.join(self.reports, 'vs'))
+        shutil.copy('./xml/1vsn.report.xml', os.path.join(self.reports, 'vs'))
+        self.index = ReportIndex(os.path.join(self.tmpdir, 'index.sqlite'))
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_query(self):
+        """Test if binding sites are found by identifiers, residues and interaction counts."""
+        self.assertEqual(self.index.update(self.reports), (1, 0))
+        matches = self.index.query(hetid='nft')
+        self.assertEqual(len(matches), 1)
+        self.assertEqual(matches[0]['pdbid'], '1VSN')
+        self.assertEqual(matches[0]['bsid'], 'NFT:A:283')
+        self.assertEqual(matches[0]['hbonds'], 6)
+        self.assertEqual(len(self.index.query(interaction='halogens', restype='TYR', resnr=67, reschain='A')), 1)
+        self.assertEqual(self.index.query(interaction='sbridges', restype='TYR'), [])
+        self.assertEqual(len(self.index.query(pdbid='1vsn', hydrophobics=4)), 1)
+        self.assertEqual(self.index.query(pdbid='1vsn', hydrophobics=5), [])
+        self.assertIn(('halogens', 67, 'TYR', 'A'), self.index.interactions('1VSN', 'NFT:A:283'))
+        with self.assertRaises(ValueError):
+            self.index.query(interaction='covalent')
+
+    def test_incremental_update(self):
+        """Test if only new or changed files are parsed again and removed files are dropped."""
+        self.index.update(self.reports)
+        self.assertEqual(self.index.update(self.reports), (0, 0))
+        shutil.copy('./xml/1vsn.report.xml', os.path.join(self.reports, 'copy.xml'))
+        self.assertEqual(self.index.update(self.reports), (1, 0))
+        self.assertEqual(len(self.index.query(hetid='NFT')), 2)
+        os.remove(os.path.join(self.reports, 'vs', '1vsn.report.xml'))
+        self.assertEqual(self.index.update(self.reports), (0, 1))
+        self.assertEqual(len(self.index.query(hetid='NFT')), 1)
+        self.assertEqual(self.index.connection.execute('SELECT COUNT(*) FROM interactions').fetchone()[0],
+                         self.index.query(hetid='NFT')[0]['total'])
+
+    def test_malformed_report(self):
+        """Test if a malformed report is skipped without rolling back the other files."""
+        with open(os.path.join(self.reports, 'broken.xml'), 'w') as f:
+            f.write('<report><bindingsite>')
+        self.assertEqual(self.index.update(self.reports), (1, 0))
+        self.assertEqual(len(self.index.query(hetid='NFT')), 1)
+        paths = [row[0] for row in self.index.connection.execute('SELECT path FROM files')]
+        self.assertEqual([os.path.basename(path) for path in paths], ['1vsn.report.xml'])
@@ -1,7 +1,9 @@
+import os
+import tempfile
 import unittest
 
 from plip.basic import config
-from plip.structure.preparation import PDBComplex, PLInteraction
+from plip.structure.preparation import Mol, PDBComplex, PLInteraction
 
 
 def characterize_complex(pdb_file: str, binding_site_id: str) -> PLInteraction:
@@ -29,3 +31,140 @@ class StructureProcessingTestCase(unittest.TestCase):
         interactions = characterize_complex('./pdb/2ndo.pdb', 'SFQ:A:201')
         all_hbonds = interactions.hbonds_ldon + interactions.hbonds_pdon
         self.assertEqual(len(all_hbonds), 1)
+
+    def test_ring_table(self):
+        """Rings of binding sites looked up in the ring table of the structure are the same as
+        found by ring perception over the whole structure"""
+        config.MODEL = 1
+        pdb_complex = PDBComplex()
+        pdb_complex.load_pdb('./pdb/4dst_protonated.pdb')
+        for ligand in pdb_complex.ligands:
+            pdb_complex.characterize_complex(ligand)
+        self.assertEqual(len(pdb_complex.ring_table().rings), len(pdb_complex.protcomplex.OBMol.GetSSSR()))
+        for interactions in pdb_complex.interaction_sets.values():
+            bindingsite = interactions.bindingsite
+            rings = Mol.find_rings(bindingsite, bindingsite.full_mol, bindingsite.all_atoms)
+            self.assertEqual([[atom.idx for atom in ring.atoms] for ring in bindingsite.rings],
+                             [[atom.idx for atom in ring.atoms] for ring in rings])
+            self.assertEqual([ring.center for ring in bindingsite.rings], [ring.center for ring in rings])
+
+    def test_id_mapping(self):
+        """Lists of IDs are mapped like each of the IDs, and PDB IDs map back to the internal IDs"""
+        config.MODEL = 1
+        pdb_complex = PDBComplex()
+        pdb_complex.load_pdb('./pdb/1vsn.pdb')
+        mapper = pdb_complex.Mapper
+        internal = list(range(1, len(mapper.proteinmap)))
+        original = mapper.mapid(internal, mtype='protein')
+        self.assertEqual(original, [mapper.mapid(idx, mtype='protein') for idx in internal])
+        self.assertEqual(mapper.mapid(original, mtype='reversed'), internal)
+        for ligand in pdb_complex.ligands:
+            bsid = ligand.mol.title
+            ligand_idx = [atom.idx for atom in ligand.mol.atoms]
+            self.assertEqual(mapper.mapid(ligand_idx, mtype='ligand', bsid=bsid),
+                             [mapper.mapid(idx, mtype='ligand', bsid=bsid) for idx in ligand_idx])
+            self.assertEqual(mapper.mapid(ligand_idx, mtype='ligand', bsid=bsid),
+                             mapper.mapid(mapper.mapid(ligand_idx, mtype='ligand', bsid=bsid, to='internal'),
+                                          mtype='protein'))
+
+    def test_id_mapping_unknown(self):
+        """Unknown, zero and negative IDs raise KeyError instead of wrapping around or mapping to 0"""
+        config.MODEL = 1
+        pdb_complex = PDBComplex()
+        pdb_complex.load_pdb('./pdb/1vsn.pdb')
+        mapper = pdb_complex.Mapper
+        unassigned = [idx for idx in range(1, len(mapper.reversed_proteinmap)) if not mapper.reversed_proteinmap[idx]]
+        self.assertTrue(unassigned)
+        for idx, mtype in [(-1, 'protein'), (0, 'protein'), (len(mapper.proteinmap), 'protein'),
+                           (0, 'reversed'), (unassigned[0], 'reversed')]:
+            with self.assertRaises(KeyError):
+                mapper.mapid(idx, mtype=mtype)
+            with self.assertRaises(KeyError):
+                mapper.mapid([1, idx], mtype=mtype)
+        bsid = pdb_complex.ligands[0].mol.title
+        for to in ('original', 'internal'):
+            with self.assertRaises(KeyError):
+                mapper.mapid(0, mtype='ligand', bsid=bsid, to=to)
+            with self.assertRaises(KeyError):
+                mapper.mapid(len(mapper.ligandmaps[bsid]), mtype='ligand', bsid=bsid, to=to)
+        with self.assertRaises(KeyError):
+            mapper.id_to_atom(unassigned[0])
+
+    def test_snapshot_cache(self):
+        """Structures restored from the snapshot cache are prepared exactly like the structure the snapshot
+        was taken from, including the hydrogens added by protonation"""
+        config.MODEL = 1
+        complexes = []
+        with tempfile.TemporaryDirectory() as cache, tempfile.TemporaryDirectory() as output:
+            config.SNAPSHOT_CACHE = cache
+            try:
+                for _ in range(2):
+                    pdb_complex = PDBComplex()
+                    pdb_complex.output_path = output
+                    pdb_complex.load_pdb('./pdb/1vsn.pdb')
+                    complexes.append(pdb_complex)
+            finally:
+                config.SNAPSHOT_CACHE = None
+            self.assertEqual(len(os.listdir(cache)), 1)
+            # The protonated structure is only written on request
+            self.assertFalse([f for f in os.listdir(output) if f.endswith('_protonated.pdb')])
+        read, restored = complexes
+        self.assertEqual([(atom.idx, atom.atomicnum, atom.coords, atom.type) for atom in read.protcomplex],
+                         [(atom.idx, atom.atomicnum, atom.coords, atom.type) for atom in restored.protcomplex])
+        self.assertEqual([ligand.mol.write('can') for ligand in read.ligands],
+                         [ligand.mol.write('can') for ligand in restored.ligands])
+        for pdb_complex in complexes:
+            pdb_complex.characterize_complex(pdb_complex.ligands[0])
+        read_interactions, restored_interactions = [list(c.interaction_sets.values())[0] for c in complexes]
+        self.assertEqual([(hbond.d.idx, hbond.a.idx) for hbond in read_interactions.all_hbonds_pdon],
+                         [(hbond.d.idx, hbond.a.idx) for hbond in restored_interactions.all_hbonds_pdon])
+
+    def test_prepared_complex_snapshot(self):
+        """Complexes loaded from a snapshot have the ligands, settings and interactions of the prepared complex"""
+        config.MODEL = 2
+        read = PDBComplex()
+        read.load_pdb('./pdb/2ndo.pdb')
+        with tempfile.TemporaryDirectory() as output:
+            path = os.path.join(output, '2ndo' + config.SNAPSHOT_SUFFIX)
+            read.save_snapshot(path)
+            config.MODEL = 1
+            restored = PDBComplex()
+            restored.load_snapshot(path)
+        self.assertEqual(config.MODEL, 2)
+        config.MODEL = 1
+        self.assertEqual([(lig.hetid, lig.chain, lig.position, lig.can_to_pdb) for lig in read.ligands],
+                         [(lig.hetid, lig.chain, lig.position, lig.can_to_pdb) for lig in restored.ligands])
+        self.assertEqual({title: ligandmap.tolist() for title, ligandmap in read.Mapper.ligandmaps.items()},
+                         {title: ligandmap.tolist() for title, ligandmap in restored.Mapper.ligandmaps.items()})
+        for pdb_complex in (read, restored):
+            pdb_complex.characterize_complex(pdb_complex.ligands[0])
+        read_interactions, restored_interactions = [c.interaction_sets['SFQ:A:201'] for c in (read, restored)]
+        self.assertEqual([(hbond.d.idx, hbond.a.idx) for hbond in read_interactions.all_hbonds_pdon],
+                         [(hbond.d.idx, hbond.a.idx) for hbond in restored_interactions.all_hbonds_pdon])
+        self.assertEqual(len(read_interactions.hydrophobic_contacts), len(restored_interactions.hydrophobic_contacts))
+
+    def test_threshold_sweep(self):
+        """Interactions selected for each setting of a threshold sweep are the ones detected with the setting"""
+        config.MODEL = 1
+        settings = [{'HBOND_DIST_MAX': 3.2, 'HYDROPH_DIST_MAX': 3.6}, {}, {'HBOND_DON_ANGLE_MIN': 90}]
+        swept = PDBComplex()
+        swept.load_pdb('./pdb/1vsn.pdb')
+        sweep = swept.sweep_thresholds(settings)
+        self.assertEqual(config.HBOND_DIST_MAX, 4.1)
+        for setting, interaction_sets in zip(settings, sweep):
+            current = {name: getattr(config, name) for name in setting}
+            for name, value in setting.items():
+                setattr(config, name, value)
+            try:
+                interactions = characterize_complex('./pdb/1vsn.pdb', 'NFT:A:283')
+            finally:
+                for name, value in current.items():
+                    setattr(config, name, value)
+            selected = interaction_sets['NFT:A:283']
+            self.assertEqual([(hbond.d.idx, hbond.a.idx) for hbond in interactions.all_hbonds_pdon],
+                             [(hbond.d.idx, hbond.a.idx) for hbond in selected.all_hbonds_pdon])
+            self.assertEqual([(hbond.d.idx, hbond.a.idx) for hbond in interactions.hbonds_ldon],
+                             [(hbond.d.idx, hbond.a.idx) for hbond in selected.hbonds_ldon])
+            self.assertEqual([(h.bsatom.idx, h.ligatom.idx) for h in interactions.hydrophobic_contacts],
+                             [(h.bsatom.idx, h.ligatom.idx) for h in selected.hydrophobic_contacts])
+        self.assertEqual([len(interaction_sets['NFT:A:283'].all_hbonds_pdon) for interaction_sets in sweep], [4, 5, 6])
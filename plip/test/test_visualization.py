@@ -1,13 +1,21 @@
 import os
+import shutil
 import tempfile
 import unittest
+from unittest import mock
 
 from plip.basic import config
 from plip.basic.remote import VisualizerData
 from plip.structure.preparation import PDBComplex
-from plip.visualization.visualize import visualize_in_pymol
 
+try:
+    from pymol import cmd
+    from plip.visualization.visualize import visualize_in_pymol
+except ImportError:
+    cmd = None
 
+
+@unittest.skipIf(cmd is None, 'PyMOL is not installed')
 class VisualizationTest(unittest.TestCase):
 
     def setUp(self) -> None:
@@ -29,3 +37,34 @@ class VisualizationTest(unittest.TestCase):
                                 not len(pdb_complex.interaction_sets[site].interacting_res) == 0]
         visualize_in_pymol(visualizer_complexes[0])
         self.assertEqual(1, len(os.listdir(self.tmp_dir)))
+
+
+@unittest.skipIf(cmd is None, 'PyMOL is not installed')
+class SessionCacheTest(unittest.TestCase):
+    """Checks if the structure is loaded once for all binding sites rendered in a process"""
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.mkdtemp()
+        self.settings = config.PYMOL, config.MODEL, config.OUTPATH
+        config.PYMOL, config.MODEL, config.OUTPATH = True, 1, self.tmp_dir
+
+    def tearDown(self) -> None:
+        config.PYMOL, config.MODEL, config.OUTPATH = self.settings
+        shutil.rmtree(self.tmp_dir)
+
+    def test_binding_sites_of_one_structure(self) -> None:
+        pdb_complex = PDBComplex()
+        pdb_complex.load_pdb('./pdb/1eve.pdb')
+        for ligand in pdb_complex.ligands:
+            pdb_complex.characterize_complex(ligand)
+        sites = [VisualizerData(pdb_complex, site) for site in ('E20:A:2001', 'NAG:A:3001')]
+        with mock.patch.object(cmd, 'load', wraps=cmd.load) as load:
+            visualize_in_pymol(sites[0])
+            visualize_in_pymol(sites[1])
+        self.assertEqual(load.call_count, 1)
+        # Only the selections of the second binding site are left in the restored session
+        names = cmd.get_names('all')
+        self.assertIn('Ligand_NAG', names)
+        self.assertNotIn('Ligand_E20', names)
+        self.assertEqual(cmd.count_atoms('Ligand_NAG and resn E20'), 0)
+        self.assertEqual(2, len(os.listdir(self.tmp_dir)))
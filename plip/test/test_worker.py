@@ -0,0 +1,70 @@
+# coding=utf-8
+"""
+Protein-Ligand Interaction Profiler - Analyze and visualize protein-ligand interactions in PDB files.
+test_worker.py - Unit Tests for the worker processes of the REST API.
+"""
+
+import multiprocessing
+import time
+import unittest
+
+from plip.plip_worker import TaskFailed, TaskTimeout, WorkerPool, WorkerProcess
+
+
+def streaming_worker(conn):
+    """Worker reporting progress for every task without ever finishing it"""
+    while conn.recv() is not None:
+        while True:
+            conn.send(('progress', 'streaming', 0, 0))
+            time.sleep(0.01)
+
+
+def failing_worker(conn):
+    """Worker reporting an error for every task"""
+    while conn.recv() is not None:
+        conn.send(('error', 'analysis failed'))
+
+
+class Listener:
+
+    def stage(self, name, seconds):
+        pass
+
+    def event(self, name):
+        pass
+
+    def observe(self, name, value):
+        pass
+
+
+class WorkerTest(unittest.TestCase):
+    """Checks if the limits of tasks are enforced and workers are reused after errors"""
+
+    def test_timeout_while_streaming(self):
+        """Test if a task times out although its worker keeps sending progress messages."""
+        worker = WorkerProcess(multiprocessing.get_context('spawn'), streaming_worker)
+        progress = []
+        start = time.monotonic()
+        try:
+            with self.assertRaises(TaskTimeout):
+                worker.run('task', 'input.pdb', ['xml'], lambda *message: progress.append(message), Listener(),
+                           lambda: False, timeout=0.5, memory_limit=0)
+        finally:
+            worker.kill()
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertGreater(len(progress), 1)
+
+    def test_error_reply(self):
+        """Test if a worker reporting an error is released to the pool instead of being killed."""
+        recycled = []
+        pool = WorkerPool(1, on_recycle=recycled.append, target=failing_worker)
+        try:
+            for _ in range(2):
+                with self.assertRaises(TaskFailed):
+                    pool.run('task', 'input.pdb', ['xml'], lambda *message: None, Listener())
+            self.assertEqual(recycled, [])
+            self.assertEqual(len(pool.idle), 1)
+            self.assertEqual(pool.idle[0].tasks_run, 2)
+            self.assertEqual(pool.busy, 0)
+        finally:
+            pool.shutdown()
@@ -7,7 +7,7 @@ test_xml_parser.py - Unit Tests for XML Parser.
 
 import unittest
 
-from plip.exchange.xml import PlipXML
+from plip.exchange.xml import PlipXML, iter_bsites
 
 
 class XMLParserTest(unittest.TestCase):
@@ -145,3 +145,29 @@ class XMLParserTest(unittest.TestCase):
 
         # Metal complexes
         self.assertEqual(len(self.bsite.metal_complexes), 0)
+
+    def test_lazy_bsites(self):
+        """Test if binding sites are only parsed on first access and cached afterwards."""
+        px = PlipXML('./xml/1vsn.report.xml')
+        self.assertEqual(px.num_bsites, 1)
+        self.assertEqual(list(px.bsites), ['NFT:A:283'])
+        self.assertEqual(px.bsites.parsed, {})
+        bsite = px.bsites['NFT:A:283']
+        self.assertIs(px.bsites['NFT:A:283'], bsite)
+
+    def test_iter_bsites(self):
+        """Test if streaming binding sites from several files gives the same results as the full parser."""
+        bsites = list(iter_bsites(['./xml/1vsn.report.xml', './xml/1vsn.report.xml']))
+        self.assertEqual(len(bsites), 2)
+        for bsite in bsites:
+            self.assertEqual(bsite.uniqueid, self.bsite.uniqueid)
+            self.assertEqual(bsite.counts, self.bsite.counts)
+            self.assertEqual(bsite.bs_res, self.bsite.bs_res)
+            self.assertEqual(bsite.mappings, self.bsite.mappings)
+
+    def test_iter_bsites_file_object(self):
+        """Test if binding sites are streamed from file objects, with the PDB ID written after them."""
+        with open('./xml/1vsn.report.xml', 'rb') as f:
+            bsites = list(iter_bsites([f]))
+        self.assertEqual([bsite.uniqueid for bsite in bsites], [self.bsite.uniqueid])
+        self.assertEqual(bsites[0].pdbid, self.px.pdbid)
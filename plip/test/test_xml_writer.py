@@ -1,6 +1,7 @@
+import io
 import unittest
 
-from plip.exchange.report import StructureReport
+from plip.exchange.report import StructureReport, BindingSiteReport
 from plip.structure.preparation import PDBComplex
 
 
@@ -21,4 +22,28 @@ class XMLWriterTest(unittest.TestCase):
             if ':'.join([ligand.hetid, ligand.chain, str(ligand.position)]) == 'H4B:A:802':
                 pdb_complex.characterize_complex(ligand)
                 structure_report = StructureReport(pdb_complex, outputprefix="test_")
-                structure_report.write_xml(as_string=True)
\ No newline at end of file
+                structure_report.write_xml(as_string=True)
+
+
+class TXTWriterTest(unittest.TestCase):
+    def test_rst_table(self):
+        table = BindingSiteReport.rst_table([('RESNR', 'DIST'), ('61', '3.67'), ('1133', '12.50')])
+        self.assertEqual(table, '+-------+-------+\n'
+                                '| RESNR | DIST  | \n'
+                                '+=======+=======+\n'
+                                '| 61    | 3.67  | \n'
+                                '+-------+-------+\n'
+                                '| 1133  | 12.50 | \n'
+                                '+-------+-------+\n')
+
+    def test_txt_stream(self):
+        pdb_complex = PDBComplex()
+        pdb_complex.load_pdb('./pdb/1vsn.pdb')
+        for ligand in pdb_complex.ligands:
+            pdb_complex.characterize_complex(ligand)
+        structure_report = StructureReport(pdb_complex, outputprefix="test_")
+        stream = io.StringIO()
+        structure_report.write_txt_stream(stream)
+        txt = stream.getvalue()
+        self.assertIn('NFT:A:283 (NFT) - SMALLMOLECULE', txt)
+        self.assertIn('**Hydrophobic Interactions**', txt)
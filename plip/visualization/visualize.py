@@ -1,3 +1,5 @@
+import os
+
 from pymol import cmd
 
 from plip.basic import config, logger
@@ -6,6 +8,44 @@ from plip.visualization.pymol import PyMOLVisualizer
 
 logger = logger.get_logger()
 
+# State of PyMOL in this process. The session right after loading the last structure is restored for further
+# binding sites of the same structure instead of loading and setting it up again (see load_structure).
+_renderer = {'started': False, 'key': None, 'session': None}
+
+
+def initialize_renderer():
+    """Starts PyMOL in the current process, once. Used as initializer of render workers (see parallel_fn),
+    which are then reused for all binding sites and structures."""
+    if not _renderer['started']:
+        start_pymol(run=True, options='-pcq', quiet=not config.VERBOSE and not config.SILENT)
+        _renderer['started'] = True
+
+
+def load_structure(plcomplex, vis):
+    """Loads the structure of a complex into a fresh PyMOL session, restoring the session saved after
+    loading it the last time if the structure did not change."""
+    sourcefile = plcomplex.sourcefile
+    key = (sourcefile, os.path.getmtime(sourcefile), config.MODEL, plcomplex.pdbid)
+    if _renderer['key'] == key:
+        cmd.set_session(_renderer['session'])
+        cmd.frame(config.MODEL)
+        return
+    if not _renderer['started']:
+        initialize_renderer()
+    else:
+        cmd.reinitialize()
+        if not config.VERBOSE and not config.SILENT:
+            cmd.feedback('disable', 'all', 'everything')
+    vis.set_initial_representations()
+
+    cmd.load(sourcefile)
+    cmd.frame(config.MODEL)
+    current_name = cmd.get_object_list(selection='(all)')[0]
+
+    logger.debug(f'setting current_name to {current_name} and PDB-ID to {plcomplex.pdbid}')
+    cmd.set_name(current_name, plcomplex.pdbid)
+    _renderer['key'], _renderer['session'] = key, cmd.get_session()
+
 
 def visualize_in_pymol(plcomplex):
     """Visualizes the given Protein-Ligand complex at one site in PyMOL."""
@@ -34,15 +74,7 @@ def visualize_in_pymol(plcomplex):
     # Basic visualizations #
     ########################
 
-    start_pymol(run=True, options='-pcq', quiet=not config.VERBOSE and not config.SILENT)
-    vis.set_initial_representations()
-
-    cmd.load(plcomplex.sourcefile)
-    cmd.frame(config.MODEL)
-    current_name = cmd.get_object_list(selection='(all)')[0]
-
-    logger.debug(f'setting current_name to {current_name} and PDB-ID to {pdbid}')
-    cmd.set_name(current_name, pdbid)
+    load_structure(plcomplex, vis)
     cmd.hide('everything', 'all')
     if config.PEPTIDES:
         if plcomplex.chain in config.RESIDUES.keys():
@@ -1,127 +1,238 @@
-import requests
+import httpx
 import time
 import os
 from pathlib import Path
 import logging
-from typing import Union, Optional
+from typing import Union, Optional, Iterable, List
 import asyncio
 import json
 logger = logging.getLogger(__name__)
 
 class PLIPAgent:
-    def __init__(self, api_url: str = "http://localhost:8000"):
+    def __init__(
+        self,
+        api_url: str = "http://localhost:8000",
+        max_connections: int = 10,
+        request_timeout: float = 60.0,
+        poll_interval: float = 0.5,
+        max_poll_interval: float = 10.0,
+        long_poll_time: float = 30.0
+    ):
         self.api_url = api_url
         self.output_dir = Path("plip_reports")
         self.output_dir.mkdir(exist_ok=True)
+        self.max_connections = max_connections
+        self.request_timeout = request_timeout
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.long_poll_time = long_poll_time
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Pooled HTTP session shared by all requests of this agent"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.api_url,
+                timeout=self.request_timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                )
+            )
+        return self._client
+
+    async def close(self):
+        """Close the pooled HTTP session"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def submit(self, input_structure: Union[str, Path], pdb_id: Optional[str] = None) -> dict:
+        """
+        Submit a structure for analysis without waiting for the result
+
+        Args:
+            input_structure: Path to PDB file or PDB ID
+            pdb_id: Optional PDB ID for naming the output file
+
+        Returns:
+            dict: Task ID and name of the structure
+        """
+        # Determine if input is a file path or PDB ID
+        if isinstance(input_structure, (str, Path)) and os.path.exists(input_structure):
+            # Local files are uploaded as multipart file (plain or gzip-compressed) and streamed by the server
+            payload = {
+                "output_format": ["txt"],
+                "outpath": str(self.output_dir)
+            }
+            if not pdb_id:
+                pdb_id = Path(input_structure).name.split('.')[0]
+            # Read off the event loop, so that other requests of the agent are not blocked meanwhile
+            content = await asyncio.to_thread(Path(input_structure).read_bytes)
+            response = await self.client.post(
+                "/inference",
+                data={"body": json.dumps(payload)},
+                files={"file": (Path(input_structure).name, content)}
+            )
+        else:
+            pdb_id = str(input_structure)
+            payload = {
+                "pdb_id": pdb_id,
+                "output_format": ["txt"],
+                "outpath": str(self.output_dir)
+            }
+            response = await self.client.post("/inference", data={"body": json.dumps(payload)})
+
+        if response.status_code != 202:
+            raise Exception(f"Failed to submit analysis: {response.text}")
+        return {"task_id": response.json()['task_id'], "pdb_id": pdb_id}
+
+    async def wait_for_task(self, task_id: str, max_wait_time: float = 300) -> dict:
+        """
+        Wait for a task to finish using long-polling requests. Servers without long-polling
+        answer immediately, in which case the status is polled with exponential backoff.
+
+        Returns:
+            dict: Final task status
+        """
+        deadline = time.monotonic() + max_wait_time
+        delay = self.poll_interval
+        while True:
+            wait = max(0.0, min(self.long_poll_time, deadline - time.monotonic()))
+            requested = time.monotonic()
+            status_response = await self.client.get(
+                f"/task_status/{task_id}",
+                params={"wait": round(wait, 3)},
+                timeout=self.request_timeout + wait
+            )
+            status_response.raise_for_status()
+            status = status_response.json()
+            # The API returns the bare status string, newer versions a dictionary
+            if not isinstance(status, dict):
+                status = {"status": status}
+            status["task_id"] = task_id
+
+            if status['status'] == 'completed':
+                return status
+            elif status['status'] in ('failed', 'timeout', 'oom', 'cancelled'):
+                if 'error' not in status:
+                    progress_response = await self.client.get(f"/task_progress/{task_id}")
+                    if progress_response.status_code == 200:
+                        status['error'] = progress_response.json().get('error')
+                raise Exception(f"Analysis {status['status']}: {status.get('error')}")
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"Analysis timed out after {max_wait_time} seconds")
+            if time.monotonic() - requested < wait / 2:
+                # The server did not hold the request, fall back to polling
+                await asyncio.sleep(min(delay, remaining))
+                delay = min(delay * 2, self.max_poll_interval)
+
+    async def download_report(self, task_id: str, pdb_id: str) -> Path:
+        """Download the TXT report of a completed task to the output directory"""
+        report_path = self.output_dir / f"{pdb_id}_{task_id}.txt"
+        async with self.client.stream("GET", f"/download/{task_id}") as response:
+            if response.status_code != 200:
+                await response.aread()
+                raise Exception(f"Failed to download report: {response.text}")
+            with open(report_path, "wb") as f:
+                async for chunk in response.aiter_bytes():
+                    f.write(chunk)
+        return report_path
 
     async def analyze_structure(
-        self, 
-        input_structure: Union[str, Path], 
+        self,
+        input_structure: Union[str, Path],
         pdb_id: Optional[str] = None,
         wait_for_result: bool = True,
-        max_wait_time: int = 300  # 5 minutes timeout
+        max_wait_time: int = 300,  # 5 minutes timeout
+        download: bool = True
     ) -> dict:
         """
         Analyze a protein structure using PLIP and save the report
-        
+
         Args:
             input_structure: Path to PDB file or PDB ID
             pdb_id: Optional PDB ID for naming the output file
             wait_for_result: Whether to wait for analysis completion
             max_wait_time: Maximum time to wait for results in seconds
-        
+            download: Whether to download the report after completion
+
         Returns:
             dict: Analysis results
         """
         try:
-            #print(f"[AGENT] Starting analysis for structure: {input_structure}")
-            
-            # Determine if input is a file path or PDB ID
-            if isinstance(input_structure, (str, Path)) and os.path.exists(input_structure):
-                #print(f"[AGENT] Processing local file")
-                with open(input_structure, 'r') as f:
-                    pdb_content = f.read()
-                payload = {
-                    "file_content": pdb_content,
-                    "output_format": ["txt"],
-                    "outpath": str(self.output_dir)
-                }
-                files = None
-                body = json.dumps(payload)
-                if not pdb_id:
-                    pdb_id = Path(input_structure).stem
-            else:
-                #print(f"[AGENT] Processing PDB ID")
-                pdb_id = input_structure
-                payload = {
-                    "pdb_id": pdb_id,
-                    "output_format": ["txt"],
-                    "outpath": str(self.output_dir)
-                }
-                files = None
-                body = json.dumps(payload)
-
-            # Submit analysis request
-            #print(f"[AGENT] Submitting analysis request to {self.api_url}/inference")
-            response = requests.post(
-                f"{self.api_url}/inference",
-                data={"body": body},
-                files=files
-            )
-            #print(f"[AGENT] Response status code: {response.status_code}")
-            
-            if response.status_code != 202:
-                raise Exception(f"Failed to submit analysis: {response.text}")
-
-            task_id = response.json()['task_id']
-            #print(f"[AGENT] Analysis submitted for {pdb_id} (Task ID: {task_id})")
-
+            task = await self.submit(input_structure, pdb_id)
+            pdb_id = task["pdb_id"]
             if not wait_for_result:
-                return {"task_id": task_id}
-
-            # Wait for results
-            #print(f"[AGENT] Waiting for results (timeout: {max_wait_time}s)")
-            start_time = time.time()
-            check_count = 0
-            
-            while time.time() - start_time < max_wait_time:
-                check_count += 1
-                #print(f"[AGENT] Checking status (attempt {check_count})")
-                
-                status_response = requests.get(f"{self.api_url}/task_status/{task_id}")
-                status = status_response.json()
-                #print(f"[AGENT] Current status: {status['status']}")
-
-                if status['status'] == 'completed':
-                    #print(f"[AGENT] Analysis completed successfully")
-                    return status
-                elif status['status'] == 'failed':
-                    #print(f"[AGENT] Analysis failed with error: {status.get('error')}")
-                    raise Exception(f"Analysis failed: {status.get('error')}")
-
-                #print(f"[AGENT] Waiting 2 seconds before next check")
-                time.sleep(2)
-
-
-            raise TimeoutError(f"Analysis timed out after {max_wait_time} seconds")
+                return {"task_id": task["task_id"]}
+
+            status = await self.wait_for_task(task["task_id"], max_wait_time)
+            if download:
+                status["report"] = str(await self.download_report(task["task_id"], pdb_id))
+            return status
 
         except Exception as e:
 
-            logger.error(f"Error analyzing structure {pdb_id}: {str(e)}")
+            logger.error(f"Error analyzing structure {pdb_id or input_structure}: {str(e)}")
             raise
 
+    async def analyze_many(
+        self,
+        input_structures: Iterable[Union[str, Path]],
+        concurrency: int = 8,
+        max_wait_time: int = 300,
+        download: bool = True,
+        return_exceptions: bool = True
+    ) -> List[Union[dict, Exception]]:
+        """
+        Analyze many structures while keeping at most `concurrency` of them in flight
+
+        Args:
+            input_structures: Paths to PDB files and/or PDB IDs
+            concurrency: Maximum number of structures submitted but not yet finished
+            max_wait_time: Maximum time to wait for each result in seconds
+            download: Whether to download the reports after completion
+            return_exceptions: Return failures in place of results instead of raising the first one
+
+        Returns:
+            list: Analysis results in the order of the input structures
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def analyze(input_structure):
+            async with semaphore:
+                return await self.analyze_structure(
+                    input_structure,
+                    wait_for_result=True,
+                    max_wait_time=max_wait_time,
+                    download=download
+                )
+
+        return await asyncio.gather(
+            *(analyze(input_structure) for input_structure in input_structures),
+            return_exceptions=return_exceptions
+        )
+
 
 
 async def main():
     # Initialize the agent
-    agent = PLIPAgent()
-
-    # Analyze a local PDB file
-    result = await agent.analyze_structure(
-        input_structure="/Users/atabeyunlu/plip/4gv1.pdb",
-        wait_for_result=True
-    )
+    async with PLIPAgent() as agent:
+        # Analyze a local PDB file
+        result = await agent.analyze_structure(
+            input_structure="/Users/atabeyunlu/plip/4gv1.pdb",
+            wait_for_result=True
+        )
     #print(f"Analysis completed: {result}")
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
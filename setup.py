@@ -97,7 +97,8 @@ setup(name='plip',
         ],
     entry_points={
         "console_scripts": [
-            "plip = plip.plipcmd:main"
+            "plip = plip.plipcmd:main",
+            "plipindex = plip.exchange.index:main"
             ]
         },
     zip_safe=False)